@@ -0,0 +1,77 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+import instrument
+from config import Config
+from dtm import POINT_BATCH_SIZE, fetch_dtm_raster, fetch_point_batch
+from osm import PackedWays, buildings_from_ways, load_osm_layers, roads_from_ways
+from raster import open_dtm
+
+
+@dataclass
+class SceneData:
+    dtm: np.ndarray
+    transform: Any
+    viewpoint_terrain_z: float
+    buildings: list[dict]
+    roads: list[dict]
+    water: PackedWays
+    vegetation: PackedWays
+
+
+async def fetch_point_elevation_async(
+    points: list[tuple[float, float]],
+    koordsys: int = 25833,
+    max_in_flight: int = 4,
+) -> list[float]:
+    """Like ``dtm.fetch_point_elevation`` but with up to ``max_in_flight`` batches in parallel."""
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def fetch(batch: list[tuple[float, float]]) -> list[float]:
+        async with semaphore:
+            return await asyncio.to_thread(fetch_point_batch, batch, koordsys)
+
+    batches = [points[i : i + POINT_BATCH_SIZE] for i in range(0, len(points), POINT_BATCH_SIZE)]
+    results = await asyncio.gather(*(fetch(batch) for batch in batches))
+    return [z for batch in results for z in batch]
+
+
+def _timed(name: str, fn, *args):
+    # Worker threads have their own stage stack, so fetches run as top-level stages.
+    with instrument.stage(name):
+        return fn(*args)
+
+
+async def load_scene(cfg: Config, bbox: tuple[float, float, float, float]) -> SceneData:
+    """Fetch terrain, viewpoint elevation and OSM layers for ``bbox`` concurrently.
+
+    The blocking fetchers run on worker threads and share the pooled, retrying
+    session from ``net.get_session``, so a cold start costs roughly the
+    slowest single fetch rather than their sum.
+    """
+    if cfg.dtm_path:
+        dtm_job = asyncio.to_thread(_timed, "dtm", open_dtm, cfg.dtm_path)
+    else:
+        dtm_job = asyncio.to_thread(_timed, "dtm", fetch_dtm_raster, bbox, cfg.dtm_resolution)
+    with instrument.stage("load_scene"):
+        (dtm, transform), [viewpoint_z], osm_layers = await asyncio.gather(
+            dtm_job,
+            fetch_point_elevation_async([cfg.viewpoint], cfg.koordsys),
+            asyncio.to_thread(
+                _timed, "osm", load_osm_layers, ("buildings", "roads", "water", "vegetation"), bbox
+            ),
+        )
+        scene = SceneData(
+            dtm,
+            transform,
+            viewpoint_z,
+            buildings_from_ways(osm_layers["buildings"]),
+            roads_from_ways(osm_layers["roads"]),
+            osm_layers["water"],
+            osm_layers["vegetation"],
+        )
+        instrument.note(dtm=dtm, buildings=scene.buildings, roads=scene.roads)
+    return scene
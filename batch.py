@@ -0,0 +1,159 @@
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import shared_memory, util
+from typing import Any
+
+import numpy as np
+
+from horizon import build_max_pyramid, compute_horizon_profile
+
+_worker_shms: list[shared_memory.SharedMemory] = []
+_worker_context: Any = None
+
+
+def _init_worker(
+    names: list[str],
+    layouts: list[tuple[tuple[int, ...], str]],
+    setup: Callable[..., Any] | None,
+) -> None:
+    global _worker_shms, _worker_context
+    _worker_shms = [shared_memory.SharedMemory(name=name) for name in names]
+    views = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm, (shape, dtype) in zip(_worker_shms, layouts)]
+    _worker_context = setup(*views) if setup is not None else views
+    # atexit hooks do not run in forked pool workers; multiprocessing
+    # finalizers do, whatever the start method.
+    util.Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker() -> None:
+    global _worker_shms, _worker_context
+    # Views into the buffers must go before they can be closed. Only the
+    # parent unlinks the blocks.
+    _worker_context = None
+    for shm in _worker_shms:
+        shm.close()
+    _worker_shms = []
+
+
+def _run_task(task: Callable[[Any, Any], Any], index: int, item: Any) -> tuple[int, Any]:
+    return index, task(_worker_context, item)
+
+
+def map_shared(
+    task: Callable[[Any, Any], Any],
+    items: Sequence[Any],
+    arrays: Sequence[np.ndarray],
+    setup: Callable[..., Any] | None = None,
+    max_workers: int | None = None,
+) -> Iterator[tuple[int, Any]]:
+    """Yield ``(index, task(context, items[index]))`` as each item finishes.
+
+    ``arrays`` are copied once into shared memory and mapped by every pool
+    worker, so they are never pickled per task. Each worker builds its
+    ``context`` once with ``setup(*arrays)`` (the list of arrays without a
+    ``setup``), e.g. to derive a max pyramid. ``task`` and ``setup`` must be
+    picklable (module-level functions or ``functools.partial`` of them).
+    With ``max_workers=1`` everything runs in this process. Results arrive in
+    completion order.
+    """
+    if max_workers == 1 or len(items) <= 1:
+        context = setup(*arrays) if setup is not None else list(arrays)
+        for i, item in enumerate(items):
+            yield i, task(context, item)
+        return
+
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    shms: list[shared_memory.SharedMemory] = []
+    pool = None
+    try:
+        for a in arrays:
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            shms.append(shm)
+            np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+        pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=([shm.name for shm in shms], [(a.shape, a.dtype.str) for a in arrays], setup),
+        )
+        futures = [pool.submit(_run_task, task, i, item) for i, item in enumerate(items)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def _profile_context(dtm: np.ndarray, transform: Any, options: dict[str, Any]) -> tuple:
+    return dtm, transform, build_max_pyramid(dtm), options
+
+
+def _profile_task(context: tuple, viewpoint_xyz: tuple[float, float, float]) -> np.ndarray:
+    dtm, transform, pyramid, options = context
+    return compute_horizon_profile(dtm, transform, viewpoint_xyz, pyramid=pyramid, **options)[:, 1]
+
+
+def iter_horizon_profiles(
+    dtm: np.ndarray,
+    transform: Any,
+    viewpoints_xyz: Sequence[tuple[float, float, float]] | np.ndarray,
+    azimuth_step: float,
+    max_distance: float,
+    house_polygon: list[tuple[float, float]] | None = None,
+    house_base: float | None = None,
+    house_height: float | None = None,
+    max_workers: int | None = None,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yield ``(viewpoint_index, elevation_angles)`` as each viewpoint finishes.
+
+    The DTM is shared with the pool workers through :func:`map_shared`, and
+    each worker builds its max pyramid once. Results arrive in completion
+    order.
+    """
+    viewpoints = [tuple(float(v) for v in vp) for vp in viewpoints_xyz]
+    options = {
+        "azimuth_step": azimuth_step,
+        "max_distance": max_distance,
+        "house_polygon": house_polygon,
+        "house_base": house_base,
+        "house_height": house_height,
+    }
+    yield from map_shared(
+        _profile_task,
+        viewpoints,
+        [dtm],
+        setup=partial(_profile_context, transform=transform, options=options),
+        max_workers=max_workers,
+    )
+
+
+def compute_horizon_profiles(
+    dtm: np.ndarray,
+    transform: Any,
+    viewpoints_xyz: Sequence[tuple[float, float, float]] | np.ndarray,
+    azimuth_step: float,
+    max_distance: float,
+    house_polygon: list[tuple[float, float]] | None = None,
+    house_base: float | None = None,
+    house_height: float | None = None,
+    max_workers: int | None = None,
+) -> np.ndarray:
+    """Return an ``(N, n_azimuths)`` array of horizon elevation angles in degrees."""
+    n_azimuths = len(np.arange(0, 360, azimuth_step))
+    result = np.full((len(viewpoints_xyz), n_azimuths), np.nan)
+    for i, angles in iter_horizon_profiles(
+        dtm,
+        transform,
+        viewpoints_xyz,
+        azimuth_step,
+        max_distance,
+        house_polygon=house_polygon,
+        house_base=house_base,
+        house_height=house_height,
+        max_workers=max_workers,
+    ):
+        result[i] = angles
+    return result
@@ -0,0 +1,182 @@
+"""Benchmark the analysis and meshing stages on synthetic, offline inputs.
+
+    python benchmarks/run.py                         # full grid
+    python benchmarks/run.py --quick                 # small grid
+    python benchmarks/run.py --quick --compare benchmarks/baseline-quick.json
+
+Each stage is timed (best of ``--repeat`` runs) and then run once more under
+tracemalloc for its peak Python/NumPy allocation. ``--compare`` exits with
+status 1 if any stage is slower or hungrier than the baseline by more than
+``--threshold``.
+
+``baseline-quick.json`` is the committed quick-grid baseline. Peak memory is
+comparable across machines, timings only on the one that recorded them, so
+regenerate it on your machine before comparing timings, and commit the
+regenerated file with any change that moves a stage on purpose:
+
+    python benchmarks/run.py --quick --repeat 5 --save benchmarks/baseline-quick.json
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import itertools
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import acquire  # noqa: E402
+import dtm  # noqa: E402
+import osm  # noqa: E402
+from config import tranoy_example  # noqa: E402
+from horizon import build_max_pyramid, compute_horizon_profile, sample_terrain, sample_terrain_many  # noqa: E402
+from raster import quantize_heights  # noqa: E402
+from viz import build_osm_buildings_mesh, build_osm_roads_mesh, build_terrain_tin  # noqa: E402
+
+import synthetic  # noqa: E402
+
+FULL_GRID = {
+    "terrain": synthetic.TERRAINS,
+    "analysis_radius": (100.0, 500.0, 2000.0),
+    "azimuth_step": (0.5, 1.0),
+    "dtm_resolution": (1.0, 2.0),
+}
+QUICK_GRID = {
+    "terrain": ("hills",),
+    "analysis_radius": (100.0, 500.0),
+    "azimuth_step": (1.0,),
+    "dtm_resolution": (1.0,),
+}
+# Changes smaller than this are timer / allocator noise, whatever the ratio.
+NOISE_FLOOR = {"seconds": 0.005, "peak_mb": 1.0}
+MESH_MAX_PIXELS = 1100 * 1100
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 1e6}
+
+
+def scene_stages(terrain: str, radius: float, resolution: float, steps: tuple[float, ...]):
+    """Yield ``(name, fn)`` for every stage of one synthetic scene."""
+    grid, transform = synthetic.scene_grid(terrain, radius, resolution)
+    x0, y0 = synthetic.ORIGIN
+    viewpoint = (x0, y0, sample_terrain(grid, transform, x0, y0) + 1.6)
+    buildings = synthetic.buildings(int(radius), radius)
+    roads = synthetic.roads(max(10, int(radius / 20)), radius)
+    rng = np.random.default_rng(0)
+    xs = x0 + rng.uniform(-radius, radius, 100_000)
+    ys = y0 + rng.uniform(-radius, radius, 100_000)
+
+    yield "sample_terrain", lambda: [sample_terrain(grid, transform, x, y) for x, y in zip(xs[:1000], ys[:1000])]
+    yield "sample_terrain_many", lambda: sample_terrain_many(grid, transform, xs, ys)
+    yield "quantize_heights", lambda: quantize_heights(grid)
+    # Whole-grid meshes of large areas are what the tiled viewer avoids, and
+    # they need gigabytes; only benchmark them at viewer-tile-like sizes.
+    if grid.size <= MESH_MAX_PIXELS:
+        yield "build_terrain_tin", lambda: build_terrain_tin(grid, transform, 0.5)
+    yield "build_osm_buildings_mesh", lambda: build_osm_buildings_mesh(buildings, grid, transform)
+    yield "build_osm_roads_mesh", lambda: build_osm_roads_mesh(roads, grid, transform)
+    yield "build_max_pyramid", lambda: build_max_pyramid(grid)
+    pyramid = build_max_pyramid(grid)
+    for step in steps:
+        yield f"compute_horizon_profile[step={step:g}]", lambda step=step: compute_horizon_profile(
+            grid, transform, viewpoint, step, radius, pyramid=pyramid
+        )
+        yield f"compute_horizon_profile_buildings[step={step:g}]", lambda step=step: compute_horizon_profile(
+            grid, transform, viewpoint, step, radius, buildings=buildings, pyramid=pyramid
+        )
+
+
+def load_scene_stage(terrain: str, radius: float, resolution: float) -> Callable[[], Any]:
+    """End-to-end acquisition through the stubbed fetchers, with a cold cache each run."""
+    cfg = dataclasses.replace(tranoy_example(), analysis_radius=radius, dtm_resolution=resolution)
+    x0, y0 = cfg.viewpoint
+    bbox = (x0 - radius, y0 - radius, x0 + radius, y0 + radius)
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            dtm.DTM_CACHE_DIR = Path(tmp) / "dtm"
+            osm.DATA_DIR = Path(tmp) / "osm"
+            with synthetic.offline_fetchers(terrain):
+                asyncio.run(acquire.load_scene(cfg, bbox))
+
+    return run
+
+
+def run_grid(grid: dict[str, tuple], repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    saved_dirs = (dtm.DTM_CACHE_DIR, osm.DATA_DIR)
+    try:
+        for terrain, resolution, radius in itertools.product(
+            grid["terrain"], grid["dtm_resolution"], grid["analysis_radius"]
+        ):
+            params = f"terrain={terrain},radius={radius:g},res={resolution:g}"
+            stages = list(scene_stages(terrain, radius, resolution, grid["azimuth_step"]))
+            stages.append(("load_scene", load_scene_stage(terrain, radius, resolution)))
+            for name, fn in stages:
+                key = f"{name}[{params}]"
+                results[key] = measure(fn, repeat)
+                print(f"{key:<90} {results[key]['seconds']:9.4f} s {results[key]['peak_mb']:9.1f} MB", flush=True)
+    finally:
+        dtm.DTM_CACHE_DIR, osm.DATA_DIR = saved_dirs
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the stages that moved against ``baseline``; return whether any regressed."""
+    regressed = False
+    for key, now in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            if abs(now[metric] - before[metric]) < floor:
+                continue
+            ratio = now[metric] / before[metric] if before[metric] > 0 else float("inf")
+            if ratio > threshold:
+                regressed = True
+                print(f"REGRESSION {key} {metric}: {before[metric]:.4g} -> {now[metric]:.4g} ({ratio:.2f}x)")
+            elif ratio < 1 / threshold:
+                print(f"improved   {key} {metric}: {before[metric]:.4g} -> {now[metric]:.4g} ({ratio:.2f}x)")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="run the small parameter grid")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="compare against a saved JSON baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown ratio")
+    args = parser.parse_args()
+
+    results = run_grid(QUICK_GRID if args.quick else FULL_GRID, args.repeat)
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True))
+    if args.compare:
+        return int(compare(results, json.loads(args.compare.read_text()), args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
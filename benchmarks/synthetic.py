@@ -0,0 +1,126 @@
+"""Offline synthetic inputs for the benchmarks: terrains, OSM ways and fetcher stubs."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import numpy as np
+from rasterio.transform import Affine, from_origin
+
+import acquire
+import dtm
+import osm
+
+ORIGIN = (527000.0, 7563000.0)
+TERRAINS = ("plane", "hills", "fractal")
+
+
+def terrain(kind: str, size: int, resolution: float, seed: int = 0) -> np.ndarray:
+    """Return a ``size`` x ``size`` float32 DTM of the given ``kind`` in metres."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float64) * resolution
+    if kind == "plane":
+        z = 20.0 + 0.05 * xx + 0.02 * yy
+    elif kind == "hills":
+        z = np.full((size, size), 20.0)
+        extent = size * resolution
+        for cx, cy, height, width in zip(
+            rng.uniform(0, extent, 40),
+            rng.uniform(0, extent, 40),
+            rng.uniform(20, 300, 40),
+            rng.uniform(50, 600, 40),
+        ):
+            z += height * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * width**2))
+    elif kind == "fractal":
+        # Spectral synthesis: random phases under a 1/f**beta power spectrum.
+        fy = np.fft.fftfreq(size)[:, None]
+        fx = np.fft.rfftfreq(size)[None, :]
+        f = np.hypot(fx, fy)
+        f[0, 0] = 1.0
+        spectrum = f**-1.2 * np.exp(2j * np.pi * rng.random(f.shape))
+        spectrum[0, 0] = 0.0
+        z = np.fft.irfft2(spectrum, s=(size, size))
+        z = 20.0 + 200.0 * (z - z.min()) / np.ptp(z)
+    else:
+        raise ValueError(f"unknown terrain kind {kind!r}")
+    return z.astype(np.float32)
+
+
+def scene_grid(kind: str, radius: float, resolution: float) -> tuple[np.ndarray, Affine]:
+    """DTM covering ``radius`` (plus a margin) around ``ORIGIN``, with its transform."""
+    half = radius + 50.0
+    size = int(np.ceil(2 * half / resolution))
+    x0, y0 = ORIGIN
+    return terrain(kind, size, resolution), from_origin(x0 - half, y0 + half, resolution, resolution)
+
+
+def buildings(n: int, radius: float, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    x0, y0 = ORIGIN
+    cx = x0 + rng.uniform(-radius, radius, n)
+    cy = y0 + rng.uniform(-radius, radius, n)
+    w, h = rng.uniform(6, 20, n), rng.uniform(6, 14, n)
+    result = []
+    for i in range(n):
+        ring = [
+            (cx[i], cy[i]),
+            (cx[i] + w[i], cy[i]),
+            (cx[i] + w[i], cy[i] + h[i]),
+            (cx[i] + 0.5 * w[i], cy[i] + 1.5 * h[i]),
+            (cx[i], cy[i] + h[i]),
+            (cx[i], cy[i]),
+        ]
+        result.append({"id": i, "polygon": np.array(ring), "height": float(rng.uniform(3, 15))})
+    return result
+
+
+def roads(n: int, radius: float, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    x0, y0 = ORIGIN
+    kinds = ["primary", "residential", "service", "track", "footway"]
+    result = []
+    for i in range(n):
+        heading = np.cumsum(rng.normal(0, 0.2, 40)) + rng.uniform(0, 2 * np.pi)
+        steps = rng.uniform(5, 25, 40)
+        x = x0 + rng.uniform(-radius, radius) + np.cumsum(steps * np.cos(heading))
+        y = y0 + rng.uniform(-radius, radius) + np.cumsum(steps * np.sin(heading))
+        result.append({"id": i, "coords": np.column_stack([x, y]), "highway": kinds[i % len(kinds)]})
+    return result
+
+
+def _overpass_elements(ways: list[dict], key: str, tags: dict[str, str]) -> Iterator[dict]:
+    for w in ways:
+        lon, lat = osm.UTM_TO_WGS84.transform(w[key][:, 0], w[key][:, 1])
+        geometry = [{"lat": a, "lon": o} for o, a in zip(lon, lat)]
+        yield {"type": "way", "id": int(w["id"]), "tags": dict(tags, **w.get("tags", {})), "geometry": geometry}
+
+
+@contextmanager
+def offline_fetchers(kind: str, n_buildings: int = 500, n_roads: int = 100):
+    """Replace the network fetchers in ``dtm``, ``acquire`` and ``osm`` with synthetic data.
+
+    Terrain comes from :func:`terrain` sampled at the requested bbox; OSM
+    layers are synthetic buildings and roads around ``ORIGIN``.
+    """
+    radius = 1000.0
+    b = buildings(n_buildings, radius)
+    r = [dict(road, tags={"highway": road["highway"]}) for road in roads(n_roads, radius)]
+
+    def fetch_image(bbox, width, height):
+        resolution = (bbox[2] - bbox[0]) / width
+        return terrain(kind, max(width, height), resolution)[:height, :width]
+
+    def fetch_points(points, koordsys=25833):
+        return [20.0 for _ in points]
+
+    def overpass_ways(selectors, bbox_25833):
+        if any("building" in s for s in selectors):
+            yield from _overpass_elements(b, "polygon", {"building": "yes"})
+        if any("highway" in s for s in selectors):
+            yield from _overpass_elements(r, "coords", {})
+
+    saved = (dtm._fetch_dtm_image, acquire.fetch_point_batch, osm._overpass_ways)
+    dtm._fetch_dtm_image, acquire.fetch_point_batch, osm._overpass_ways = fetch_image, fetch_points, overpass_ways
+    try:
+        yield
+    finally:
+        dtm._fetch_dtm_image, acquire.fetch_point_batch, osm._overpass_ways = saved
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pyvista as pv
+from rasterio.transform import Affine
+
+import instrument
+from acquire import load_scene
+from config import Config
+from raster import QuantizedRaster, quantize_heights, read_window
+from viz import build_house_mesh, build_osm_buildings_mesh, build_osm_roads_mesh
+
+BUNDLE_DIR = Path(os.environ.get("BUNDLE_DIR", "data/bundle"))
+# Bump when mesh generation or the stored layout changes so stale bundles are rebuilt.
+BUNDLE_VERSION = 2
+# Keep this many versions of each part, least recently used evicted first.
+BUNDLE_KEEP = int(os.environ.get("BUNDLE_KEEP", 4))
+
+
+@dataclass
+class SceneBundle:
+    dtm: QuantizedRaster
+    transform: Affine
+    viewpoint_terrain_z: float
+    house_mesh: pv.PolyData | None
+    buildings_mesh: pv.PolyData | None
+    roads_mesh: pv.PolyData | None
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps([BUNDLE_VERSION, *parts], default=list).encode()).hexdigest()[:16]
+
+
+def _scene_key(cfg: Config, bbox: tuple[float, float, float, float]) -> str:
+    """Hash of the scene inputs.
+
+    A local ``dtm_path`` is keyed by its size and mtime, but fetched DTM and
+    OSM content is not hashed: a changed remote source is only picked up
+    after ``python bundle.py --rebuild`` (or removing ``BUNDLE_DIR``).
+    """
+    source: Any = None
+    if cfg.dtm_path:
+        st = os.stat(cfg.dtm_path)
+        source = [os.path.abspath(cfg.dtm_path), st.st_size, st.st_mtime_ns]
+    return _digest("scene", bbox, cfg.viewpoint, cfg.koordsys, cfg.dtm_resolution, source)
+
+
+def _part_dir(part: str, key: str) -> Path:
+    return BUNDLE_DIR / f"{part}-{key}"
+
+
+def _write_part(part: str, key: str, arrays: dict[str, np.ndarray], meta: dict[str, Any]) -> None:
+    path = _part_dir(part, key)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+    (tmp / "meta.json").write_text(json.dumps(meta))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    _evict_parts(part, BUNDLE_KEEP)
+
+
+def _evict_parts(part: str, keep: int) -> None:
+    # Several keys stay warm (e.g. a few houses or viewpoints being compared);
+    # the directory mtime doubles as the LRU timestamp, as in the tile cache.
+    entries = [p for p in BUNDLE_DIR.glob(f"{part}-*") if not p.name.endswith(".tmp")]
+    entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in entries[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def _read_part(part: str, key: str) -> tuple[dict[str, np.ndarray], dict[str, Any]] | None:
+    path = _part_dir(part, key)
+    if not (path / "meta.json").exists():
+        return None
+    meta = json.loads((path / "meta.json").read_text())
+    arrays = {p.stem: np.load(p, mmap_mode="r") for p in path.glob("*.npy")}
+    os.utime(path)
+    return arrays, meta
+
+
+def _write_mesh(part: str, key: str, mesh: pv.PolyData | None) -> None:
+    if mesh is None:
+        _write_part(part, key, {}, {"empty": True})
+        return
+    arrays = {"points": mesh.points, "faces": mesh.faces}
+    arrays.update({f"cell_{name}": mesh.cell_data[name] for name in mesh.cell_data.keys()})
+    arrays.update({f"point_{name}": mesh.point_data[name] for name in mesh.point_data.keys()})
+    _write_part(part, key, arrays, {"empty": False})
+
+
+def _read_mesh(part: str, key: str) -> tuple[bool, pv.PolyData | None]:
+    """Return ``(found, mesh)``; a part stored as empty loads as ``(True, None)``."""
+    stored = _read_part(part, key)
+    if stored is None:
+        return False, None
+    arrays, meta = stored
+    if meta["empty"]:
+        return True, None
+    mesh = pv.PolyData(arrays["points"], arrays["faces"])
+    for name, array in arrays.items():
+        if name.startswith("cell_"):
+            mesh.cell_data[name[5:]] = array
+        elif name.startswith("point_"):
+            mesh.point_data[name[6:]] = array
+    return True, mesh
+
+
+async def load_bundle(cfg: Config, bbox: tuple[float, float, float, float]) -> SceneBundle:
+    """Load the scene for ``cfg`` from the on-disk bundle, building stale parts.
+
+    The bundle holds the DTM window over ``bbox``, the viewpoint elevation and
+    the house, OSM building and road meshes, each under ``BUNDLE_DIR`` keyed by
+    a hash of the inputs it was built from (see :func:`_scene_key`). Arrays are
+    memory-mapped on load, and only parts whose key changed are rebuilt, so
+    editing the house does not refetch terrain or OSM data. The
+    ``BUNDLE_KEEP`` most recently used versions of each part are kept. The DTM
+    is stored as :func:`raster.quantize_heights` ``uint16`` steps, half the
+    size of float32, and returned as a :class:`raster.QuantizedRaster`.
+    """
+    scene_key = _scene_key(cfg, bbox)
+    house_key = _digest("house", cfg.house_polygon, cfg.house_base_elevation, cfg.house_height)
+
+    with instrument.stage("bundle_read"):
+        scene = _read_part("scene", scene_key)
+        has_buildings, buildings_mesh = _read_mesh("buildings", scene_key)
+        has_roads, roads_mesh = _read_mesh("roads", scene_key)
+    if scene is None or not has_buildings or not has_roads:
+        fetched = await load_scene(cfg, bbox)
+        with instrument.stage("bundle_build"):
+            dtm, transform = read_window(fetched.dtm, fetched.transform, bbox)
+            quantized = quantize_heights(dtm)
+            _write_part(
+                "scene",
+                scene_key,
+                {"dtm": quantized.values},
+                {
+                    "transform": list(transform)[:6],
+                    "viewpoint_terrain_z": fetched.viewpoint_terrain_z,
+                    "dtm_scale": quantized.scale,
+                    "dtm_offset": quantized.offset,
+                },
+            )
+            buildings_mesh = build_osm_buildings_mesh(fetched.buildings, dtm, transform)
+            roads_mesh = build_osm_roads_mesh(fetched.roads, dtm, transform)
+            _write_mesh("buildings", scene_key, buildings_mesh)
+            _write_mesh("roads", scene_key, roads_mesh)
+            instrument.note(dtm=dtm, buildings_mesh=buildings_mesh, roads_mesh=roads_mesh)
+        scene = _read_part("scene", scene_key)
+    arrays, meta = scene
+
+    has_house, house_mesh = _read_mesh("house", house_key)
+    if not has_house:
+        house_mesh = build_house_mesh(cfg.house_polygon, cfg.house_base_elevation, cfg.house_height)
+        _write_mesh("house", house_key, house_mesh)
+
+    return SceneBundle(
+        QuantizedRaster(arrays["dtm"], meta["dtm_scale"], meta["dtm_offset"]),
+        Affine(*meta["transform"]),
+        meta["viewpoint_terrain_z"],
+        house_mesh,
+        buildings_mesh,
+        roads_mesh,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    from config import tranoy_example
+    from main import _bbox_from_config
+
+    parser = argparse.ArgumentParser(description="Build the scene bundle used by the web viewer.")
+    parser.add_argument("--rebuild", action="store_true", help="discard existing bundle parts first")
+    args = parser.parse_args()
+
+    cfg = tranoy_example()
+    if args.rebuild:
+        shutil.rmtree(BUNDLE_DIR, ignore_errors=True)
+    bundle = asyncio.run(load_bundle(cfg, _bbox_from_config(cfg)))
+    print(f"Bundle in {BUNDLE_DIR}: DTM {bundle.dtm.shape}")
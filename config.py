@@ -11,8 +11,14 @@ class Config:
     eye_height: float = 1.6
     analysis_radius: float = 100
     azimuth_step: float = 0.5
+    # When set, trace a non-uniform profile refined until neighbouring rays
+    # differ by at most this many degrees (and at the house edges) instead of
+    # a ray every azimuth_step.
+    azimuth_tolerance: float | None = None
     dtm_resolution: float = 1.0
     koordsys: int = 25833
+    dtm_path: str | None = None
+    terrain_max_error: float = 0.5
 
 
 def tranoy_example() -> Config:
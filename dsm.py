@@ -0,0 +1,134 @@
+import math
+from typing import Any
+
+import numpy as np
+from rasterio.features import rasterize
+from rasterio.transform import Affine
+from shapely.geometry import Polygon
+
+from horizon import building_tops, buildings_containing
+
+
+def _burn_heights(
+    polygons: list[list[tuple[float, float]]],
+    tops: np.ndarray,
+    out_shape: tuple[int, int],
+    transform: Affine,
+) -> np.ndarray:
+    # Later shapes overwrite earlier ones, so burn in ascending height order
+    # to keep the tallest roof where footprints overlap.
+    order = np.argsort(tops)
+    shapes = [(Polygon(polygons[i]), float(tops[i])) for i in order if len(polygons[i]) >= 3]
+    if not shapes or out_shape[0] == 0 or out_shape[1] == 0:
+        return np.full(out_shape, np.nan, dtype=np.float32)
+    return rasterize(shapes, out_shape=out_shape, transform=transform, fill=np.nan, dtype="float32")
+
+
+def _polygon_window(
+    polygon: list[tuple[float, float]],
+    transform: Affine,
+    shape: tuple[int, int],
+) -> tuple[slice, slice]:
+    pts = np.asarray(polygon, dtype=np.float64)[:, :2]
+    cols, rows = ~transform * (pts[:, 0], pts[:, 1])
+    r0 = min(max(math.floor(rows.min()), 0), shape[0])
+    r1 = min(max(math.ceil(rows.max()) + 1, 0), shape[0])
+    c0 = min(max(math.floor(cols.min()), 0), shape[1])
+    c1 = min(max(math.ceil(cols.max()) + 1, 0), shape[1])
+    return slice(r0, r1), slice(c0, c1)
+
+
+def _burn_roofs(
+    surface: np.ndarray,
+    transform: Affine,
+    polygons: list[list[tuple[float, float]]],
+    tops: np.ndarray,
+    strip_rows: int,
+) -> None:
+    # Burn strip by strip, each with only the footprints reaching into it, so
+    # no full-size roof raster is ever allocated.
+    row_ranges = []
+    for polygon in polygons:
+        pts = np.asarray(polygon, dtype=np.float64)[:, :2]
+        _, rows = ~transform * (pts[:, 0], pts[:, 1])
+        row_ranges.append((rows.min(), rows.max()))
+    lo, hi = np.array(row_ranges).T
+    for r0 in range(0, surface.shape[0], strip_rows):
+        r1 = min(r0 + strip_rows, surface.shape[0])
+        inside = np.flatnonzero((hi >= r0) & (lo <= r1))
+        if not len(inside):
+            continue
+        roofs = _burn_heights(
+            [polygons[i] for i in inside],
+            tops[inside],
+            (r1 - r0, surface.shape[1]),
+            transform * Affine.translation(0, r0),
+        )
+        np.fmax(surface[r0:r1], roofs, out=surface[r0:r1])
+
+
+class SurfaceModel:
+    """DTM with building roofs burned in, usable anywhere a DTM is.
+
+    ``dsm`` holds terrain plus the OSM buildings, and the proposed house once
+    :meth:`set_house` is called; only the pixels under the house window are
+    kept aside to restore, so the model is a single raster. Buildings whose
+    footprint contains ``exclude_xy`` (the observer's own building) are left
+    out, as in the vector occluders of ``compute_horizon_profile``.
+    """
+
+    def __init__(
+        self,
+        dtm: np.ndarray,
+        transform: Any,
+        buildings: list[dict] | None = None,
+        exclude_xy: tuple[float, float] | None = None,
+        strip_rows: int = 256,
+    ):
+        self.transform = transform
+        self.dsm = np.array(dtm, dtype=np.float32)
+        if buildings and exclude_xy is not None:
+            buildings = [b for b, inside in zip(buildings, buildings_containing(buildings, exclude_xy)) if not inside]
+        buildings = [b for b in buildings or [] if len(b["polygon"]) >= 3]
+        if buildings:
+            _burn_roofs(
+                self.dsm,
+                transform,
+                [b["polygon"] for b in buildings],
+                building_tops(self.dsm, transform, buildings),
+                strip_rows,
+            )
+        self._house_window: tuple[slice, slice] | None = None
+        self._under_house: np.ndarray | None = None
+
+    def without_house(self, out: np.ndarray | None = None) -> np.ndarray:
+        """Return the surface without the proposed house, written into ``out`` if given."""
+        out = self.dsm.copy() if out is None else out
+        if out is not self.dsm:
+            out[...] = self.dsm
+        if self._house_window is not None:
+            out[self._house_window] = self._under_house
+        return out
+
+    def set_house(
+        self,
+        polygon: list[tuple[float, float]] | None,
+        base_elevation: float | None = None,
+        height: float | None = None,
+    ) -> None:
+        if self._house_window is not None:
+            self.dsm[self._house_window] = self._under_house
+            self._house_window = self._under_house = None
+        if not polygon or base_elevation is None or height is None:
+            return
+        rows, cols = _polygon_window(polygon, self.transform, self.dsm.shape)
+        window_transform = self.transform * Affine.translation(cols.start, rows.start)
+        roof = _burn_heights(
+            [polygon],
+            np.array([base_elevation + height]),
+            (rows.stop - rows.start, cols.stop - cols.start),
+            window_transform,
+        )
+        self._under_house = self.dsm[rows, cols].copy()
+        np.fmax(self.dsm[rows, cols], roof, out=self.dsm[rows, cols])
+        self._house_window = (rows, cols)
@@ -1,25 +1,34 @@
 import json
+import math
+import os
+from pathlib import Path
 from typing import Any
 
 import numpy as np
 import rasterio
-import requests
-from rasterio.transform import from_bounds
+from rasterio.transform import from_origin
 
-DTM_IMAGE_SERVER = "https://hoydedata.no/arcgis/rest/services/DTM/ImageServer/exportImage"
-POINT_API = "https://ws.geonorge.no/hoydedata/v1/punkt"
+from net import get_session
 
+DTM_IMAGE_SERVER = os.environ.get(
+    "DTM_IMAGE_SERVER", "https://hoydedata.no/arcgis/rest/services/DTM/ImageServer/exportImage"
+)
+POINT_API = os.environ.get("POINT_API", "https://ws.geonorge.no/hoydedata/v1/punkt")
 
-def fetch_dtm_raster(
+DTM_CACHE_DIR = Path(os.environ.get("DTM_CACHE_DIR", "data/dtm"))
+DTM_CACHE_MAX_BYTES = int(os.environ.get("DTM_CACHE_MAX_BYTES", 2 * 1024**3))
+DTM_OFFLINE = os.environ.get("DTM_OFFLINE", "0").lower() not in ("", "0", "false", "no")
+DTM_TILE_SIZE = 500
+MAX_REQUEST_PIXELS = 15000
+POINT_BATCH_SIZE = 50
+
+
+def _fetch_dtm_image(
     bbox: tuple[float, float, float, float],
-    resolution: float,
-) -> tuple[np.ndarray, Any]:
+    width: int,
+    height: int,
+) -> np.ndarray:
     xmin, ymin, xmax, ymax = bbox
-    width = int((xmax - xmin) / resolution)
-    height = int((ymax - ymin) / resolution)
-    width = max(1, min(width, 15000))
-    height = max(1, min(height, 15000))
-
     params = {
         "bbox": f"{xmin},{ymin},{xmax},{ymax}",
         "bboxSR": 25833,
@@ -30,31 +39,180 @@ def fetch_dtm_raster(
         "f": "image",
         "adjustAspectRatio": "false",
     }
-    r = requests.get(DTM_IMAGE_SERVER, params=params, timeout=120)
+    r = get_session().get(DTM_IMAGE_SERVER, params=params, timeout=120)
     r.raise_for_status()
 
     with rasterio.MemoryFile(r.content) as mem:
         with mem.open() as src:
             data = src.read()
-            transform = src.transform
 
     if data.ndim == 3:
         data = data[0]
+    return data.astype(np.float32, copy=False)
+
+
+def _tile_path(resolution: float, tx: int, ty: int) -> Path:
+    return DTM_CACHE_DIR / f"{resolution:g}m" / f"{tx}_{ty}.npy"
+
+
+def _load_tile(resolution: float, tx: int, ty: int) -> np.ndarray | None:
+    path = _tile_path(resolution, tx, ty)
+    if not path.exists():
+        return None
+    tile = np.load(path)
+    # The mtime doubles as the LRU timestamp, so bump it on every hit.
+    os.utime(path)
+    return tile
+
+
+def _save_tile(resolution: float, tx: int, ty: int, tile: np.ndarray) -> None:
+    path = _tile_path(resolution, tx, ty)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, tile)
+    os.replace(tmp_path, path)
+
+
+def _evict_tiles(max_bytes: int) -> None:
+    if not DTM_CACHE_DIR.exists():
+        return
+    entries = []
+    for path in DTM_CACHE_DIR.glob("*/*.npy"):
+        st = path.stat()
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def _fetch_tile_block(
+    resolution: float,
+    tx0: int,
+    ty0: int,
+    tx1: int,
+    ty1: int,
+) -> dict[tuple[int, int], np.ndarray]:
+    t = DTM_TILE_SIZE
+    span = t * resolution
+    bbox = (tx0 * span, ty0 * span, (tx1 + 1) * span, (ty1 + 1) * span)
+    data = _fetch_dtm_image(bbox, (tx1 - tx0 + 1) * t, (ty1 - ty0 + 1) * t)
+    tiles = {}
+    for ty in range(ty0, ty1 + 1):
+        r0 = (ty1 - ty) * t
+        for tx in range(tx0, tx1 + 1):
+            c0 = (tx - tx0) * t
+            tiles[(tx, ty)] = np.ascontiguousarray(data[r0 : r0 + t, c0 : c0 + t])
+    return tiles
+
+
+def _tile_rectangles(
+    missing: list[tuple[int, int]],
+    max_tiles: int,
+) -> list[tuple[int, int, int, int]]:
+    """Cover ``missing`` with ``(tx0, ty0, tx1, ty1)`` blocks of missing tiles only.
+
+    Greedy: each uncovered tile grows east along its row, then north while
+    every tile of the next row span is missing too, up to ``max_tiles`` a side.
+    """
+    todo = set(missing)
+    rects = []
+    for tx0, ty0 in sorted(missing, key=lambda k: (k[1], k[0])):
+        if (tx0, ty0) not in todo:
+            continue
+        tx1 = tx0
+        while tx1 - tx0 + 1 < max_tiles and (tx1 + 1, ty0) in todo:
+            tx1 += 1
+        ty1 = ty0
+        while ty1 - ty0 + 1 < max_tiles and all((tx, ty1 + 1) in todo for tx in range(tx0, tx1 + 1)):
+            ty1 += 1
+        todo.difference_update((tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1))
+        rects.append((tx0, ty0, tx1, ty1))
+    return rects
+
+
+def _fetch_missing_tiles(
+    resolution: float,
+    missing: list[tuple[int, int]],
+) -> dict[tuple[int, int], np.ndarray]:
+    # Only missing tiles are requested: cached tiles between them are not
+    # downloaded again as part of one bounding block.
+    tiles = {}
+    for rect in _tile_rectangles(missing, MAX_REQUEST_PIXELS // DTM_TILE_SIZE):
+        tiles.update(_fetch_tile_block(resolution, *rect))
+    return tiles
+
+
+def fetch_dtm_raster(
+    bbox: tuple[float, float, float, float],
+    resolution: float,
+    offline: bool | None = None,
+) -> tuple[np.ndarray, Any]:
+    """Return the DTM covering ``bbox`` assembled from the on-disk tile cache.
+
+    Tiles are ``DTM_TILE_SIZE`` pixels square on a grid aligned to
+    ``resolution``; only tiles missing from the cache are downloaded. The
+    returned raster is snapped outwards to that grid. With ``offline`` (or
+    ``DTM_OFFLINE=1``) a missing tile raises instead of hitting the network.
+    """
+    offline = DTM_OFFLINE if offline is None else offline
+    xmin, ymin, xmax, ymax = bbox
+    c0 = math.floor(xmin / resolution)
+    c1 = max(math.ceil(xmax / resolution), c0 + 1)
+    r0 = math.floor(ymin / resolution)
+    r1 = max(math.ceil(ymax / resolution), r0 + 1)
+
+    t = DTM_TILE_SIZE
+    keys = [
+        (tx, ty)
+        for ty in range(r0 // t, (r1 - 1) // t + 1)
+        for tx in range(c0 // t, (c1 - 1) // t + 1)
+    ]
+    tiles = {key: _load_tile(resolution, *key) for key in keys}
+    missing = [key for key, tile in tiles.items() if tile is None]
+    if missing:
+        if offline:
+            raise RuntimeError(
+                f"{len(missing)} DTM tile(s) for bbox {bbox} are not cached and offline mode is enabled"
+            )
+        fetched = _fetch_missing_tiles(resolution, missing)
+        for key, tile in fetched.items():
+            _save_tile(resolution, *key, tile)
+        tiles.update(fetched)
+        _evict_tiles(DTM_CACHE_MAX_BYTES)
+
+    data = np.empty((r1 - r0, c1 - c0), dtype=np.float32)
+    for (tx, ty), tile in tiles.items():
+        # Tile rows run north to south; grid rows r run south to north.
+        gc0, gr0 = max(c0, tx * t), max(r0, ty * t)
+        gc1, gr1 = min(c1, (tx + 1) * t), min(r1, (ty + 1) * t)
+        data[r1 - gr1 : r1 - gr0, gc0 - c0 : gc1 - c0] = tile[
+            (ty + 1) * t - gr1 : (ty + 1) * t - gr0, gc0 - tx * t : gc1 - tx * t
+        ]
+
+    transform = from_origin(c0 * resolution, r1 * resolution, resolution, resolution)
     return data, transform
 
 
+def fetch_point_batch(
+    points: list[tuple[float, float]],
+    koordsys: int = 25833,
+) -> list[float]:
+    punkter = [[float(x), float(y)] for x, y in points]
+    params = {"koordsys": koordsys, "punkter": json.dumps(punkter)}
+    r = get_session().get(POINT_API, params=params, timeout=30)
+    r.raise_for_status()
+    return [p["z"] for p in r.json()["punkter"]]
+
+
 def fetch_point_elevation(
     points: list[tuple[float, float]],
     koordsys: int = 25833,
 ) -> list[float]:
     result: list[float] = []
-    for i in range(0, len(points), 50):
-        batch = points[i : i + 50]
-        punkter = [[float(x), float(y)] for x, y in batch]
-        params = {"koordsys": koordsys, "punkter": json.dumps(punkter)}
-        r = requests.get(POINT_API, params=params, timeout=30)
-        r.raise_for_status()
-        js = r.json()
-        for p in js["punkter"]:
-            result.append(p["z"])
+    for i in range(0, len(points), POINT_BATCH_SIZE):
+        result.extend(fetch_point_batch(points[i : i + POINT_BATCH_SIZE], koordsys))
     return result
@@ -3,7 +3,7 @@ from typing import Any
 
 import numpy as np
 import scipy.ndimage
-from shapely.geometry import LineString, Polygon
+import shapely
 
 
 def sample_terrain(
@@ -12,39 +12,282 @@ def sample_terrain(
     x: float,
     y: float,
 ) -> float:
-    col, row = ~transform * (x, y)
-    if row < -0.5 or row >= dtm.shape[0] - 0.5 or col < -0.5 or col >= dtm.shape[1] - 0.5:
-        return np.nan
-    return float(scipy.ndimage.map_coordinates(dtm, [[row], [col]], order=1, mode="constant", cval=np.nan)[0])
-
-
-def _ray_intersects_house(
-    viewpoint_x: float,
-    viewpoint_y: float,
-    azimuth_deg: float,
-    house_poly: Polygon,
-) -> float | None:
-    azimuth_rad = math.radians(azimuth_deg)
-    dx = math.sin(azimuth_rad)
-    dy = math.cos(azimuth_rad)
-    far_x = viewpoint_x + 100000 * dx
-    far_y = viewpoint_y + 100000 * dy
-    ray = LineString([(viewpoint_x, viewpoint_y), (far_x, far_y)])
-    inter = house_poly.exterior.intersection(ray)
-    if inter.is_empty:
-        return None
-    pts = []
-    if hasattr(inter, "geoms"):
-        for g in inter.geoms:
-            pts.append((g.x, g.y))
-    elif hasattr(inter, "coords"):
-        pts = list(inter.coords)
-    else:
-        pts = [(inter.x, inter.y)]
-    if not pts:
-        return None
-    closest = min(pts, key=lambda p: (p[0] - viewpoint_x) ** 2 + (p[1] - viewpoint_y) ** 2)
-    return math.sqrt((closest[0] - viewpoint_x) ** 2 + (closest[1] - viewpoint_y) ** 2)
+    return float(sample_terrain_many(dtm, transform, np.array([x]), np.array([y]))[0])
+
+
+def sample_terrain_many(
+    dtm: np.ndarray,
+    transform: Any,
+    xs: np.ndarray,
+    ys: np.ndarray,
+) -> np.ndarray:
+    cols, rows = ~transform * (np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+    inside = (rows >= -0.5) & (rows < dtm.shape[0] - 0.5) & (cols >= -0.5) & (cols < dtm.shape[1] - 0.5)
+    result = np.full(np.shape(rows), np.nan)
+    if not np.any(inside):
+        return result
+    rows = rows[inside]
+    cols = cols[inside]
+    # Only the window around the samples is materialised, which keeps
+    # memory-mapped or windowed rasters from being read in full.
+    r0 = max(int(math.floor(rows.min())), 0)
+    r1 = min(int(math.floor(rows.max())) + 2, dtm.shape[0])
+    c0 = max(int(math.floor(cols.min())), 0)
+    c1 = min(int(math.floor(cols.max())) + 2, dtm.shape[1])
+    window = np.asarray(dtm[r0:r1, c0:c1])
+    result[inside] = scipy.ndimage.map_coordinates(
+        window, [rows - r0, cols - c0], order=1, mode="constant", cval=np.nan
+    )
+    return result
+
+
+def _polygon_edges(
+    polygons: list[list[tuple[float, float]]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    starts = []
+    ends = []
+    owners = []
+    for i, poly in enumerate(polygons):
+        pts = np.asarray(poly, dtype=np.float64)[:, :2]
+        if len(pts) < 3:
+            continue
+        if not np.array_equal(pts[0], pts[-1]):
+            pts = np.vstack([pts, pts[:1]])
+        starts.append(pts[:-1])
+        ends.append(pts[1:])
+        owners.append(np.full(len(pts) - 1, i))
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    return np.concatenate(starts), np.concatenate(ends), np.concatenate(owners)
+
+
+def occluder_angles(
+    viewpoint_xyz: tuple[float, float, float],
+    azimuths: np.ndarray,
+    polygons: list[list[tuple[float, float]]],
+    tops: np.ndarray,
+    max_distance: float,
+    chunk_size: int = 1_000_000,
+) -> np.ndarray:
+    """Highest elevation angle at which each azimuth ray crosses an occluder wall.
+
+    Every ray is intersected with every polygon edge in closed form. An edge
+    crossed at distance ``t`` contributes ``atan2(top - vz, t)`` for its
+    polygon's top elevation; azimuths that hit nothing get -90.
+    """
+    vx, vy, vz = viewpoint_xyz
+    result = np.full(len(azimuths), -90.0)
+    starts, ends, owners = _polygon_edges(polygons)
+    if len(starts) == 0:
+        return result
+
+    # Drop edges that cannot come within max_distance of the viewpoint.
+    edge = ends - starts
+    rel = starts - (vx, vy)
+    length_sq = np.maximum(np.einsum("ij,ij->i", edge, edge), 1e-18)
+    u = np.clip(-np.einsum("ij,ij->i", rel, edge) / length_sq, 0.0, 1.0)
+    closest = rel + u[:, None] * edge
+    near = np.hypot(closest[:, 0], closest[:, 1]) < max_distance
+    rel, edge, edge_tops = rel[near], edge[near], np.asarray(tops, dtype=np.float64)[owners[near]]
+    if len(rel) == 0:
+        return result
+
+    az_rad = np.radians(azimuths)
+    dx = np.sin(az_rad)[:, None]
+    dy = np.cos(az_rad)[:, None]
+    per_chunk = max(1, chunk_size // len(azimuths))
+    for start in range(0, len(rel), per_chunk):
+        chunk = slice(start, start + per_chunk)
+        wx, wy = rel[chunk, 0], rel[chunk, 1]
+        ex, ey = edge[chunk, 0], edge[chunk, 1]
+        denom = dx * ey - dy * ex
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (wx * ey - wy * ex) / denom
+            u = (wx * dy - wy * dx) / denom
+        hit = (denom != 0) & (t >= 0) & (t < max_distance) & (u >= 0) & (u <= 1)
+        angles = np.where(hit, np.degrees(np.arctan2(edge_tops[chunk] - vz, np.where(hit, t, 1.0))), -90.0)
+        result = np.maximum(result, angles.max(axis=1))
+    return result
+
+
+def building_tops(
+    dtm: np.ndarray,
+    transform: Any,
+    buildings: list[dict],
+) -> np.ndarray:
+    heights = np.array([b["height"] for b in buildings], dtype=np.float64)
+    bases = np.array([b.get("base", np.nan) for b in buildings], dtype=np.float64)
+    missing = np.isnan(bases)
+    if np.any(missing):
+        centroids = np.array([np.mean(np.asarray(buildings[i]["polygon"])[:, :2], axis=0) for i in np.flatnonzero(missing)])
+        sampled = sample_terrain_many(dtm, transform, centroids[:, 0], centroids[:, 1])
+        bases[missing] = np.where(np.isnan(sampled), 0.0, sampled)
+    return bases + heights
+
+
+def buildings_containing(buildings: list[dict], xy: tuple[float, float]) -> np.ndarray:
+    """Boolean mask of the ``buildings`` whose footprint contains the point ``xy``."""
+    if not buildings:
+        return np.zeros(0, dtype=bool)
+    footprints = np.array([shapely.Polygon(b["polygon"]) for b in buildings])
+    return np.asarray(shapely.contains_xy(footprints, *xy), dtype=bool)
+
+
+def _building_occluders(
+    dtm: np.ndarray,
+    transform: Any,
+    buildings: list[dict],
+    viewpoint_xy: tuple[float, float],
+) -> tuple[list[list[tuple[float, float]]], np.ndarray]:
+    # The observer's own building would otherwise wall in every azimuth.
+    buildings = [b for b, inside in zip(buildings, buildings_containing(buildings, viewpoint_xy)) if not inside]
+    if not buildings:
+        return [], np.empty(0)
+    return [b["polygon"] for b in buildings], building_tops(dtm, transform, buildings)
+
+
+def _sample_distances(max_distance: float, sample_step: float) -> np.ndarray:
+    # Accumulate the step the same way a scalar ``d += sample_step`` loop would,
+    # so the sample positions do not drift from the reference implementation.
+    n = int(max_distance / sample_step) + 2
+    distances = np.cumsum(np.full(n, sample_step, dtype=np.float64))
+    return distances[distances <= max_distance]
+
+
+def _reduce_max_2x2(a: np.ndarray) -> np.ndarray:
+    a = np.where(np.isnan(a), -np.inf, a)
+    rows, cols = a.shape
+    if rows % 2 or cols % 2:
+        a = np.pad(a, ((0, rows % 2), (0, cols % 2)), constant_values=-np.inf)
+    return a.reshape(a.shape[0] // 2, 2, a.shape[1] // 2, 2).max(axis=(1, 3))
+
+
+def build_max_pyramid(dtm: np.ndarray, strip_rows: int = 4096) -> list[np.ndarray]:
+    """Max-elevation mipmaps of ``dtm`` for early ray termination.
+
+    ``levels[k]`` holds the maximum over ``2 ** (k + 1)`` pixel squares, down
+    to a single cell; NaN counts as -inf. The first level is reduced in row
+    strips so memory-mapped rasters are streamed rather than loaded.
+    """
+    dtype = np.result_type(dtm.dtype, np.float32)
+    rows, cols = dtm.shape
+    level = np.empty(((rows + 1) // 2, (cols + 1) // 2), dtype=dtype)
+    strip_rows += strip_rows % 2
+    for r in range(0, rows, strip_rows):
+        level[r // 2 : (r + strip_rows) // 2] = _reduce_max_2x2(np.asarray(dtm[r : r + strip_rows], dtype=dtype))
+    levels = [level]
+    while level.shape[0] > 1 or level.shape[1] > 1:
+        level = _reduce_max_2x2(level)
+        levels.append(level)
+    return levels
+
+
+def _pyramid_max(
+    pyramid: list[np.ndarray],
+    shape: tuple[int, int],
+    r0: np.ndarray,
+    r1: np.ndarray,
+    c0: np.ndarray,
+    c1: np.ndarray,
+) -> np.ndarray:
+    # Maximum over the inclusive pixel rectangles [r0, r1] x [c0, c1]. The
+    # level is picked so each rectangle spans at most 2 x 2 cells.
+    result = np.full(len(r0), -np.inf)
+    valid = (r1 >= 0) & (r0 < shape[0]) & (c1 >= 0) & (c0 < shape[1])
+    r0 = np.clip(r0, 0, shape[0] - 1)
+    r1 = np.clip(r1, 0, shape[0] - 1)
+    c0 = np.clip(c0, 0, shape[1] - 1)
+    c1 = np.clip(c1, 0, shape[1] - 1)
+    span = np.maximum(r1 - r0, c1 - c0) + 1
+    levels = np.clip(np.ceil(np.log2(span)).astype(np.int64), 1, len(pyramid))
+    for level in np.unique(levels[valid]):
+        sel = valid & (levels == level)
+        grid = pyramid[level - 1]
+        lr0, lr1 = r0[sel] >> level, np.minimum(r1[sel] >> level, grid.shape[0] - 1)
+        lc0, lc1 = c0[sel] >> level, np.minimum(c1[sel] >> level, grid.shape[1] - 1)
+        result[sel] = np.maximum.reduce([grid[lr0, lc0], grid[lr0, lc1], grid[lr1, lc0], grid[lr1, lc1]])
+    return result
+
+
+def _trace_terrain(
+    dtm: np.ndarray,
+    transform: Any,
+    viewpoint_xyz: tuple[float, float, float],
+    azimuths: np.ndarray,
+    distances: np.ndarray,
+    max_angles: np.ndarray,
+    pyramid: list[np.ndarray] | None,
+    chunk_size: int,
+    window_pixels: int,
+    segment_samples: int = 16,
+) -> None:
+    vx, vy, vz = viewpoint_xyz
+    az_rad = np.radians(azimuths)
+    dx = np.sin(az_rad)
+    dy = np.cos(az_rad)
+    pixel_size = math.hypot(transform.a, transform.d)
+    inv = ~transform
+
+    d_start = 0
+    while d_start < len(distances):
+        if pyramid is None:
+            n = window_pixels
+        else:
+            # Blocks grow with distance so far rays take larger steps; the
+            # angles are refreshed between blocks to tighten later pruning.
+            n = min(max(64, d_start // 4), window_pixels)
+        block_distances = distances[d_start : d_start + n]
+        d_start += n
+
+        # Split the block into fixed-length segments, padding the last one
+        # with NaN distances (which sample as NaN and are ignored).
+        seg_len = len(block_distances) if pyramid is None else min(segment_samples, len(block_distances))
+        n_seg = -(-len(block_distances) // seg_len)
+        seg_distances = np.full(n_seg * seg_len, np.nan)
+        seg_distances[: len(block_distances)] = block_distances
+        seg_distances = seg_distances.reshape(n_seg, seg_len)
+
+        if pyramid is None:
+            pair_az = np.arange(len(azimuths))
+            pair_seg = np.zeros(len(azimuths), dtype=np.int64)
+        else:
+            first = seg_distances[:, 0]
+            last = block_distances[np.minimum(np.arange(1, n_seg + 1) * seg_len, len(block_distances)) - 1]
+            cols0, rows0 = inv * (vx + np.outer(dx, first), vy + np.outer(dy, first))
+            cols1, rows1 = inv * (vx + np.outer(dx, last), vy + np.outer(dy, last))
+            heights = _pyramid_max(
+                pyramid,
+                dtm.shape,
+                np.floor(np.minimum(rows0, rows1)).astype(np.int64).ravel() - 1,
+                np.floor(np.maximum(rows0, rows1)).astype(np.int64).ravel() + 2,
+                np.floor(np.minimum(cols0, cols1)).astype(np.int64).ravel() - 1,
+                np.floor(np.maximum(cols0, cols1)).astype(np.int64).ravel() + 2,
+            ).reshape(len(azimuths), n_seg)
+            # No sample in a segment can beat this angle: heights above the
+            # eye are steepest at the near end, those below at the far end.
+            nearest = np.where(heights >= vz, first, last)
+            with np.errstate(invalid="ignore"):
+                bound = np.degrees(np.arctan2(heights - vz, nearest))
+            pair_az, pair_seg = np.nonzero(bound > max_angles[:, None])
+            if pair_az.size == 0:
+                continue
+
+        # Group pairs into angular bins whose arc at the block's far end is
+        # about window_pixels wide, so each raster window read stays small.
+        bin_width = window_pixels * pixel_size / block_distances[-1]
+        bins = np.floor(az_rad[pair_az] / bin_width).astype(np.int64)
+        per_group = max(1, chunk_size // seg_len)
+        splits = np.flatnonzero(np.diff(bins)) + 1
+        for group in np.split(np.arange(len(pair_az)), splits):
+            for start in range(0, len(group), per_group):
+                idx = group[start : start + per_group]
+                ai = pair_az[idx]
+                d = seg_distances[pair_seg[idx]]
+                xs = vx + dx[ai, None] * d
+                ys = vy + dy[ai, None] * d
+                z = sample_terrain_many(dtm, transform, xs, ys)
+                angles = np.degrees(np.arctan2(z - vz, d))
+                np.fmax.at(max_angles, ai, np.fmax.reduce(angles, axis=1))
 
 
 def compute_horizon_profile(
@@ -56,54 +299,166 @@ def compute_horizon_profile(
     house_polygon: list[tuple[float, float]] | None = None,
     house_base: float | None = None,
     house_height: float | None = None,
+    buildings: list[dict] | None = None,
     sample_step: float = 1.0,
+    chunk_size: int = 1_000_000,
+    window_pixels: int = 2048,
+    pyramid: list[np.ndarray] | None = None,
+    azimuths: np.ndarray | None = None,
 ) -> np.ndarray:
+    """Return ``(N, 2)`` rows of azimuth (degrees clockwise from grid north) and horizon angle.
+
+    Rays are cast every ``azimuth_step`` degrees, or along ``azimuths`` when
+    given (``azimuth_step`` is then ignored).
+    """
     vx, vy, vz = viewpoint_xyz
-    house_poly = Polygon(house_polygon) if house_polygon and house_base is not None and house_height is not None else None
-    house_top = (house_base or 0) + (house_height or 0) if house_poly else None
 
-    azimuths = np.arange(0, 360, azimuth_step)
+    azimuths = np.arange(0, 360, azimuth_step) if azimuths is None else np.asarray(azimuths, dtype=np.float64)
     result = np.zeros((len(azimuths), 2))
     result[:, 0] = azimuths
 
-    for i, az in enumerate(azimuths):
-        max_angle = -90.0
-        az_rad = math.radians(az)
-        dx = math.sin(az_rad)
-        dy = math.cos(az_rad)
-
-        if house_poly is not None and house_top is not None:
-            dist_to_house = _ray_intersects_house(vx, vy, az, house_poly)
-            if dist_to_house is not None and dist_to_house < max_distance:
-                dz = house_top - vz
-                angle = math.degrees(math.atan2(dz, dist_to_house))
-                max_angle = max(max_angle, angle)
-
-        d = sample_step
-        while d <= max_distance:
-            x = vx + d * dx
-            y = vy + d * dy
-            z = sample_terrain(dtm, transform, x, y)
-            if not np.isnan(z):
-                angle = math.degrees(math.atan2(z - vz, d))
-                max_angle = max(max_angle, angle)
-            d += sample_step
-
-        result[i, 1] = max_angle
+    polygons: list[list[tuple[float, float]]] = []
+    tops: list[float] = []
+    if house_polygon and house_base is not None and house_height is not None:
+        polygons.append(house_polygon)
+        tops.append(house_base + house_height)
+    if buildings:
+        building_polygons, building_tops = _building_occluders(dtm, transform, buildings, (vx, vy))
+        polygons.extend(building_polygons)
+        tops.extend(building_tops)
+    max_angles = occluder_angles(viewpoint_xyz, azimuths, polygons, np.array(tops), max_distance, chunk_size)
 
+    distances = _sample_distances(max_distance, sample_step)
+    _trace_terrain(dtm, transform, viewpoint_xyz, azimuths, distances, max_angles, pyramid, chunk_size, window_pixels)
+
+    result[:, 1] = max_angles
     return result
 
 
+def footprint_azimuth_mask(
+    viewpoint_xy: tuple[float, float],
+    polygon: list[tuple[float, float]] | None,
+    azimuths: np.ndarray,
+) -> np.ndarray:
+    """Return which ``azimuths`` cast from ``viewpoint_xy`` cross ``polygon``."""
+    if not polygon:
+        return np.zeros(len(azimuths), dtype=bool)
+    vx, vy = viewpoint_xy
+    if shapely.Polygon(polygon).covers(shapely.Point(vx, vy)):
+        return np.ones(len(azimuths), dtype=bool)
+    pts = np.asarray(polygon, dtype=np.float64)[:, :2]
+    vertex_az = np.degrees(np.arctan2(pts[:, 0] - vx, pts[:, 1] - vy)) % 360
+    if shapely.Polygon(polygon).convex_hull.covers(shapely.Point(vx, vy)):
+        # In a notch of a concave footprint the crossed azimuths need not be
+        # one interval, so take the union of what each edge subtends.
+        turn = (np.roll(vertex_az, -1) - vertex_az + 180) % 360 - 180
+        start = np.where(turn >= 0, vertex_az, vertex_az + turn)
+        return np.any((azimuths[:, None] - start + 1e-9) % 360 <= np.abs(turn) + 2e-9, axis=1)
+    vertex_az = np.sort(vertex_az)
+    # Outside the convex hull the footprint spans the circle minus its largest
+    # gap between vertex azimuths; pad by a hair so rays grazing a corner are
+    # included.
+    gaps = np.diff(np.append(vertex_az, vertex_az[0] + 360))
+    widest = int(np.argmax(gaps))
+    start = vertex_az[(widest + 1) % len(vertex_az)]
+    span = 360 - gaps[widest]
+    return (azimuths - start + 1e-9) % 360 <= span + 2e-9
+
+
+def compute_adaptive_horizon_profile(
+    dtm: np.ndarray,
+    transform: Any,
+    viewpoint_xyz: tuple[float, float, float],
+    max_distance: float,
+    tolerance_deg: float = 0.25,
+    coarse_step: float = 4.0,
+    min_step: float = 0.0625,
+    footprint: list[tuple[float, float]] | None = None,
+    footprint_top: float | None = None,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Horizon profile on a non-uniform azimuth set refined where it matters.
+
+    Starts from rays every ``coarse_step`` degrees plus the azimuths of the
+    ``footprint`` corners, then repeatedly bisects each interval whose end
+    angles differ by more than ``tolerance_deg`` or which crosses the
+    footprint boundary, until intervals reach ``min_step``. Only the new
+    rays are traced in each round. ``footprint`` defaults to the house
+    polygon. With ``footprint_top`` the footprint is also refined as a
+    flat-roofed occluder of that elevation without being included in the
+    result, so a house added later (as ``AnalysisSession`` does) is sampled
+    finely too. Remaining keyword arguments go to
+    :func:`compute_horizon_profile`. The result is sorted by azimuth.
+    """
+    if footprint is None:
+        footprint = kwargs.get("house_polygon")
+    vx, vy, _ = viewpoint_xyz
+    azimuths = np.arange(0, 360, coarse_step)
+    if footprint:
+        pts = np.asarray(footprint, dtype=np.float64)[:, :2]
+        azimuths = np.append(azimuths, np.degrees(np.arctan2(pts[:, 0] - vx, pts[:, 1] - vy)) % 360)
+    azimuths = np.unique(azimuths)
+
+    def trace(azimuths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        angles = compute_horizon_profile(
+            dtm, transform, viewpoint_xyz, coarse_step, max_distance, azimuths=azimuths, **kwargs
+        )[:, 1]
+        if footprint and footprint_top is not None:
+            top = occluder_angles(viewpoint_xyz, azimuths, [footprint], np.array([footprint_top]), max_distance)
+            return angles, np.maximum(angles, top)
+        return angles, angles
+
+    angles, refined = trace(azimuths)
+    while True:
+        # Interval i runs from azimuths[i] to the next azimuth, wrapping at 360.
+        nxt = np.roll(np.arange(len(azimuths)), -1)
+        gaps = (azimuths[nxt] - azimuths) % 360
+        inside = footprint_azimuth_mask((vx, vy), footprint, azimuths)
+        split = (gaps >= 2 * min_step) & (
+            (np.abs(refined[nxt] - refined) > tolerance_deg) | (inside != inside[nxt])
+        )
+        if not split.any():
+            break
+        new = (azimuths[split] + gaps[split] / 2) % 360
+        new_angles, new_refined = trace(new)
+        azimuths = np.concatenate([azimuths, new])
+        order = np.argsort(azimuths)
+        azimuths = azimuths[order]
+        angles = np.concatenate([angles, new_angles])[order]
+        refined = np.concatenate([refined, new_refined])[order]
+    return np.column_stack([azimuths, angles])
+
+
+def azimuth_weights(azimuths: np.ndarray) -> np.ndarray:
+    """Trapezoid-rule widths in degrees of sorted ``azimuths`` around the full circle.
+
+    Each azimuth gets half of the gap to either neighbour, so the weights sum
+    to 360 and equal the step for a uniform set.
+    """
+    gaps = np.diff(np.append(azimuths, azimuths[0] + 360))
+    return 0.5 * (gaps + np.roll(gaps, 1))
+
+
 def compute_obstruction(
     profile_without: np.ndarray,
     profile_with: np.ndarray,
-    azimuth_step_deg: float,
+    azimuth_step_deg: float | None = None,
 ) -> dict[str, Any]:
+    """Compare two profiles on the same azimuths.
+
+    With ``azimuth_step_deg`` the profiles are taken as uniform; otherwise
+    they may be non-uniform (sorted by azimuth) and are integrated with
+    :func:`azimuth_weights`.
+    """
     delta = np.maximum(0, profile_with[:, 1] - profile_without[:, 1])
-    solid_angle = (np.pi / 180) ** 2 * np.sum(delta) * azimuth_step_deg
+    if azimuth_step_deg is None:
+        weights = azimuth_weights(profile_without[:, 0])
+    else:
+        weights = np.full(len(delta), azimuth_step_deg)
+    solid_angle = (np.pi / 180) ** 2 * np.sum(delta * weights)
     return {
         "delta_per_azimuth": delta,
         "max_delta_deg": float(np.max(delta)),
-        "mean_delta_deg": float(np.mean(delta)),
+        "mean_delta_deg": float(np.sum(delta * weights) / np.sum(weights)),
         "blocked_solid_angle_sr": float(solid_angle),
     }
@@ -0,0 +1,185 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Instrumentation is off unless PIPELINE_METRICS is set; stage() then returns a
+# shared no-op context and note() / count_bytes() return immediately.
+ENABLED = bool(os.environ.get("PIPELINE_METRICS"))
+# Append one JSON object per finished stage to this file ("-" for stderr).
+METRICS_LOG = os.environ.get("PIPELINE_METRICS_LOG")
+# Dump a cProfile .prof file per stage into this directory.
+PROFILE_DIR = Path(os.environ["PIPELINE_PROFILE_DIR"]) if os.environ.get("PIPELINE_PROFILE_DIR") else None
+# Keep only the latest records in memory, so long-running servers stay bounded;
+# the log above still gets every stage.
+MAX_RECORDS = int(os.environ.get("PIPELINE_METRICS_MAX_RECORDS", 10_000))
+
+_records: deque[dict[str, Any]] = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_local = threading.local()
+_bytes_downloaded = 0
+
+
+def enable(log: str | None = None, profile_dir: str | Path | None = None) -> None:
+    """Turn instrumentation on at runtime, optionally logging and profiling as with the env vars."""
+    global ENABLED, METRICS_LOG, PROFILE_DIR
+    ENABLED = True
+    if log is not None:
+        METRICS_LOG = log
+    if profile_dir is not None:
+        PROFILE_DIR = Path(profile_dir)
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1e6 if sys.platform == "darwin" else 1e3)
+
+
+def count_bytes(n: int) -> None:
+    """Add ``n`` downloaded bytes to the running total seen by open stages."""
+    global _bytes_downloaded
+    if not ENABLED:
+        return
+    with _lock:
+        _bytes_downloaded += n
+
+
+def _describe(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "dtype": str(value.dtype), "mb": value.nbytes / 1e6}
+    if hasattr(value, "n_points") and hasattr(value, "n_cells"):
+        return {"points": int(value.n_points), "cells": int(value.n_cells)}
+    if isinstance(value, (list, tuple, dict)) and not isinstance(value, str):
+        return len(value)
+    return value
+
+
+def note(**values: Any) -> None:
+    """Attach ``values`` to the innermost open stage of this thread.
+
+    Arrays are recorded by shape, dtype and size, meshes by point and cell
+    counts and other sequences by length.
+    """
+    if not ENABLED:
+        return
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].info.update({k: _describe(v) for k, v in values.items()})
+
+
+class _Stage:
+    def __init__(self, name: str, info: dict[str, Any]):
+        self.name = name
+        self.info = {k: _describe(v) for k, v in info.items()}
+        self._profile: cProfile.Profile | None = None
+
+    def __enter__(self) -> "_Stage":
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._bytes0 = _bytes_downloaded
+        if PROFILE_DIR is not None:
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another profiler (an enclosing stage) is already active.
+                self._profile = None
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        seconds = time.perf_counter() - self._t0
+        if self._profile is not None:
+            self._profile.disable()
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            self._profile.dump_stats(PROFILE_DIR / f"{self.name}.prof")
+        _local.stack.pop()
+        record = {
+            "stage": self.name,
+            "parent": self.parent,
+            "seconds": seconds,
+            "downloaded_mb": (_bytes_downloaded - self._bytes0) / 1e6,
+            "peak_rss_mb": _peak_rss_mb(),
+            "failed": exc[0] is not None,
+            **self.info,
+        }
+        with _lock:
+            _records.append(record)
+            if METRICS_LOG:
+                line = json.dumps({"time": time.time(), **record}, default=str)
+                if METRICS_LOG == "-":
+                    print(line, file=sys.stderr)
+                else:
+                    with open(METRICS_LOG, "a") as f:
+                        f.write(line + "\n")
+
+
+class _NullStage:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, **info: Any) -> _Stage | _NullStage:
+    """Context manager timing the pipeline stage ``name``.
+
+    Records wall time, bytes downloaded while it ran (across all threads),
+    the process peak RSS when it finished and ``info`` plus anything added
+    with :func:`note`. Stages nest per thread. When instrumentation is
+    disabled this returns a shared no-op context.
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, info)
+
+
+def records() -> list[dict[str, Any]]:
+    """The last ``MAX_RECORDS`` finished stages, oldest first."""
+    with _lock:
+        return list(_records)
+
+
+def reset() -> None:
+    global _bytes_downloaded
+    with _lock:
+        _records.clear()
+        _bytes_downloaded = 0
+
+
+_COLUMNS = ("stage", "parent", "seconds", "downloaded_mb", "peak_rss_mb", "failed")
+
+
+def _details(record: dict[str, Any]) -> str:
+    return ", ".join(f"{k}={v}" for k, v in record.items() if k not in _COLUMNS)
+
+
+def summary() -> str:
+    """Return the recorded stages as a plain-text table."""
+    rows = records()
+    lines = [f"{'stage':<28} {'seconds':>9} {'download MB':>12} {'peak RSS MB':>12}  details"]
+    for r in rows:
+        name = ("  " if r["parent"] else "") + r["stage"] + (" (failed)" if r["failed"] else "")
+        rss = f"{r['peak_rss_mb']:12.1f}" if r["peak_rss_mb"] is not None else f"{'-':>12}"
+        lines.append(f"{name:<28} {r['seconds']:9.3f} {r['downloaded_mb']:12.2f} {rss}  {_details(r)}")
+    return "\n".join(lines)
@@ -1,12 +1,24 @@
+import argparse
+import asyncio
+import calendar
+import datetime
+from typing import Any
+
+import numpy as np
+
+import instrument
+from acquire import load_scene
 from config import Config, tranoy_example
-from dtm import fetch_dtm_raster, fetch_point_elevation
-from horizon import compute_horizon_profile, compute_obstruction
-from osm import fetch_osm_buildings, fetch_osm_roads
+from dsm import SurfaceModel
+from horizon import build_max_pyramid, compute_adaptive_horizon_profile
+from raster import read_window
+from session import AnalysisSession
+from solar import compute_sun_hours
 from viz import (
     build_house_mesh,
     build_osm_buildings_mesh,
     build_osm_roads_mesh,
-    build_terrain_mesh,
+    build_terrain_tin,
     plot_horizon_profiles,
     show_3d_scene,
 )
@@ -24,42 +36,127 @@ def _bbox_from_config(cfg: Config) -> tuple[float, float, float, float]:
     return (xmin, ymin, xmax, ymax)
 
 
-def run(cfg: Config | None = None) -> None:
+def horizon_session(
+    dsm: np.ndarray,
+    transform: Any,
+    viewpoint_xyz: tuple[float, float, float],
+    cfg: Config,
+    pyramid: list[np.ndarray] | None = None,
+) -> AnalysisSession:
+    """Terrain-only horizon of ``cfg``'s viewpoint, ready for :func:`house_results`."""
+    with instrument.stage("horizon"):
+        profile = None
+        if cfg.azimuth_tolerance is not None:
+            profile = compute_adaptive_horizon_profile(
+                dsm,
+                transform,
+                viewpoint_xyz,
+                cfg.analysis_radius,
+                cfg.azimuth_tolerance,
+                footprint=cfg.house_polygon,
+                footprint_top=cfg.house_base_elevation + cfg.house_height,
+                pyramid=pyramid,
+            )
+        session = AnalysisSession(
+            dsm,
+            transform,
+            viewpoint_xyz,
+            cfg.azimuth_step,
+            cfg.analysis_radius,
+            pyramid=pyramid,
+            profile=profile,
+        )
+        instrument.note(rays=len(session.azimuths))
+    return session
+
+
+def house_results(session: AnalysisSession, cfg: Config, year: int | None = None) -> dict[str, Any]:
+    """Set ``cfg``'s house on ``session`` and return the obstruction metrics and lost sun-hours.
+
+    Only the azimuths crossing the previous or the new footprint are
+    updated, so a reused session answers house edits without retracing.
+    ``year`` defaults to the current one.
+    """
+    with instrument.stage("house_obstruction"):
+        obst = session.set_house(cfg.house_polygon, cfg.house_base_elevation, cfg.house_height)
+    with instrument.stage("sun_hours"):
+        year = year or datetime.date.today().year
+        sun = compute_sun_hours(session.profile_without, session.profile_with, cfg.viewpoint, year, cfg.koordsys)
+    return {
+        "profile_without": session.profile_without,
+        # A later set_house updates the session in place.
+        "profile_with": session.profile_with.copy(),
+        "obstruction": obst,
+        "sun": sun,
+        "year": year,
+    }
+
+
+def analyse(
+    dsm: np.ndarray,
+    transform: Any,
+    viewpoint_xyz: tuple[float, float, float],
+    cfg: Config,
+    pyramid: list[np.ndarray] | None = None,
+    year: int | None = None,
+) -> dict[str, Any]:
+    """Horizon profiles, obstruction metrics and lost sun-hours of ``cfg``'s house.
+
+    ``dsm`` is the surface without the house; it is added analytically.
+    ``year`` defaults to the current one.
+    """
+    return house_results(horizon_session(dsm, transform, viewpoint_xyz, cfg, pyramid), cfg, year)
+
+
+def run(cfg: Config | None = None, show: bool = True) -> dict[str, Any]:
+    """Analyse ``cfg`` (the Tranøy example by default) and print the results.
+
+    With ``show`` the 3D scene and the horizon plot are opened as well; pass
+    ``show=False`` to run headless. Returns the :func:`analyse` results.
+    """
     cfg = cfg or tranoy_example()
     bbox = _bbox_from_config(cfg)
 
-    dtm, transform = fetch_dtm_raster(bbox, cfg.dtm_resolution)
-    [viewpoint_terrain_z] = fetch_point_elevation([cfg.viewpoint], cfg.koordsys)
-    eye_z = viewpoint_terrain_z + cfg.eye_height
+    scene = asyncio.run(load_scene(cfg, bbox))
+    dtm, transform = scene.dtm, scene.transform
+    buildings, roads = scene.buildings, scene.roads
+    eye_z = scene.viewpoint_terrain_z + cfg.eye_height
     viewpoint_xyz = (cfg.viewpoint[0], cfg.viewpoint[1], eye_z)
 
-    profile_without = compute_horizon_profile(
-        dtm, transform, viewpoint_xyz, cfg.azimuth_step, cfg.analysis_radius
-    )
-    profile_with = compute_horizon_profile(
-        dtm,
-        transform,
-        viewpoint_xyz,
-        cfg.azimuth_step,
-        cfg.analysis_radius,
-        house_polygon=cfg.house_polygon,
-        house_base=cfg.house_base_elevation,
-        house_height=cfg.house_height,
-    )
+    with instrument.stage("surface_model"):
+        surface = SurfaceModel(*read_window(dtm, transform, bbox), buildings, exclude_xy=cfg.viewpoint)
+        instrument.note(dsm=surface.dsm)
+    with instrument.stage("max_pyramid"):
+        pyramid = build_max_pyramid(surface.dsm)
+        instrument.note(levels=len(pyramid), mb=sum(level.nbytes for level in pyramid) / 1e6)
+    results = analyse(surface.dsm, surface.transform, viewpoint_xyz, cfg, pyramid)
+    obst, sun = results["obstruction"], results["sun"]
 
-    obst = compute_obstruction(profile_without, profile_with, cfg.azimuth_step)
     print(f"Max horizon angle increase: {obst['max_delta_deg']:.2f}°")
     print(f"Mean horizon angle increase: {obst['mean_delta_deg']:.2f}°")
     print(f"Approximate blocked solid angle: {obst['blocked_solid_angle_sr']:.6f} sr")
+    print(f"Direct sun lost to the house in {results['year']}: {sun['lost_hours']:.1f} h")
+    for month, (without, lost) in enumerate(zip(sun["month_without"], sun["month_lost"]), start=1):
+        print(f"  {calendar.month_abbr[month]}: {lost:6.1f} h of {without:6.1f} h")
 
-    terrain_mesh = build_terrain_mesh(dtm, transform)
+    if not show:
+        if instrument.ENABLED:
+            print(instrument.summary())
+        return results
+
+    with instrument.stage("terrain_mesh"):
+        terrain_mesh = build_terrain_tin(*read_window(dtm, transform, bbox), cfg.terrain_max_error)
+        instrument.note(mesh=terrain_mesh)
     house_mesh = build_house_mesh(
         cfg.house_polygon, cfg.house_base_elevation, cfg.house_height
     )
-    buildings = fetch_osm_buildings(bbox)
-    roads = fetch_osm_roads(bbox)
-    osm_buildings_mesh = build_osm_buildings_mesh(buildings, dtm, transform)
-    osm_roads_mesh = build_osm_roads_mesh(roads, dtm, transform)
+    with instrument.stage("osm_meshes"):
+        osm_buildings_mesh = build_osm_buildings_mesh(buildings, dtm, transform)
+        osm_roads_mesh = build_osm_roads_mesh(roads, dtm, transform)
+        instrument.note(buildings_mesh=osm_buildings_mesh, roads_mesh=osm_roads_mesh)
+
+    if instrument.ENABLED:
+        print(instrument.summary())
 
     show_3d_scene(
         terrain_mesh,
@@ -68,8 +165,23 @@ def run(cfg: Config | None = None) -> None:
         osm_buildings_mesh=osm_buildings_mesh,
         osm_roads_mesh=osm_roads_mesh,
     )
-    plot_horizon_profiles(profile_without, profile_with)
+    plot_horizon_profiles(results["profile_without"], results["profile_with"])
+    return results
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Analyse the Tranøy example, or many scenarios headlessly.")
+    parser.add_argument(
+        "scenarios",
+        nargs="?",
+        help="JSON or JSON-lines file of Config fields, analysed on a process pool into the results store",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for scenarios")
+    parser.add_argument("--no-show", action="store_true", help="skip the 3D scene and horizon plot")
+    opts = parser.parse_args()
+    if opts.scenarios:
+        from scenarios import load_scenarios, run_scenarios
+
+        run_scenarios(load_scenarios(opts.scenarios), max_workers=opts.workers)
+    else:
+        run(show=not opts.no_show)
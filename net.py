@@ -0,0 +1,41 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrument
+
+_session: requests.Session | None = None
+_lock = threading.Lock()
+
+
+def _count_download(response: requests.Response, *args, **kwargs) -> None:
+    # Streamed responses are not read yet here, so rely on Content-Length;
+    # chunked responses without it are not counted.
+    instrument.count_bytes(int(response.headers.get("Content-Length", 0)))
+
+
+def get_session() -> requests.Session:
+    """Process-wide HTTP session with pooled keep-alive connections.
+
+    Transient failures (connection errors, 429 and 5xx) are retried with
+    exponential backoff, honouring ``Retry-After`` when the server sends it.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=4,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=None,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.hooks["response"].append(_count_download)
+            _session = session
+        return _session
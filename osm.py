@@ -1,13 +1,25 @@
-import json
+import math
+import os
 import re
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+import ijson
+import numpy as np
 import pyproj
-import requests
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-DATA_DIR = Path("data/osm")
+from dtm import _tile_rectangles
+from net import get_session
+
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+DATA_DIR = Path(os.environ.get("OSM_CACHE_DIR", "data/osm"))
+OSM_CELL_SIZE = 1000.0
+# Side, in cells, of the largest block fetched by one Overpass query.
+OSM_MAX_QUERY_CELLS = int(os.environ.get("OSM_MAX_QUERY_CELLS", 4))
+REPROJECT_CHUNK = 65536
 WGS84 = pyproj.CRS.from_epsg(4326)
 UTM33 = pyproj.CRS.from_epsg(25833)
 WGS84_TO_UTM = pyproj.Transformer.from_crs(WGS84, UTM33, always_xy=True)
@@ -16,9 +28,10 @@ UTM_TO_WGS84 = pyproj.Transformer.from_crs(UTM33, WGS84, always_xy=True)
 
 def _bbox_25833_to_wgs84(bbox: tuple[float, float, float, float]) -> tuple[float, float, float, float]:
     xmin, ymin, xmax, ymax = bbox
-    sw_lon, sw_lat = UTM_TO_WGS84.transform(xmin, ymin)
-    ne_lon, ne_lat = UTM_TO_WGS84.transform(xmax, ymax)
-    return (sw_lat, sw_lon, ne_lat, ne_lon)
+    # Use all four corners: grid north is not true north, so the lat/lon box
+    # spanned by just SW and NE would clip the UTM box at its other corners.
+    lon, lat = UTM_TO_WGS84.transform([xmin, xmax, xmin, xmax], [ymin, ymin, ymax, ymax])
+    return (min(lat), min(lon), max(lat), max(lon))
 
 
 def _parse_height(tags: dict[str, Any]) -> float:
@@ -34,90 +47,304 @@ def _parse_height(tags: dict[str, Any]) -> float:
     return 5.0
 
 
-def _lonlat_to_utm(geom: list[dict]) -> list[tuple[float, float]]:
-    return [WGS84_TO_UTM.transform(p["lon"], p["lat"])[:2] for p in geom]
+@dataclass
+class PackedWays:
+    """OSM ways as flat arrays: way ``i`` has ``coords[offsets[i]:offsets[i + 1]]``.
+
+    ``attrs`` holds one per-way array per layer attribute, e.g. ``height``.
+    """
 
+    ids: np.ndarray
+    offsets: np.ndarray
+    coords: np.ndarray
+    attrs: dict[str, np.ndarray]
 
-def _get_data_path(data_key: str) -> Path:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    return DATA_DIR / f"{data_key}.json"
+    def __len__(self) -> int:
+        return len(self.ids)
 
+    def way_coords(self, i: int) -> np.ndarray:
+        return self.coords[self.offsets[i] : self.offsets[i + 1]]
 
-def _load_from_file(data_key: str) -> dict | None:
-    data_path = _get_data_path(data_key)
-    if data_path.exists():
-        return json.loads(data_path.read_text())
-    return None
+    def bboxes(self) -> np.ndarray:
+        """Return an ``(n, 4)`` array of ``xmin, ymin, xmax, ymax`` per way."""
+        if not len(self):
+            return np.empty((0, 4))
+        starts = self.offsets[:-1]
+        x, y = self.coords[:, 0], self.coords[:, 1]
+        return np.column_stack(
+            [
+                np.minimum.reduceat(x, starts),
+                np.minimum.reduceat(y, starts),
+                np.maximum.reduceat(x, starts),
+                np.maximum.reduceat(y, starts),
+            ]
+        )
 
+    def select(self, mask: np.ndarray) -> "PackedWays":
+        counts = np.diff(self.offsets)
+        keep_coords = np.repeat(mask, counts)
+        offsets = np.concatenate([[0], np.cumsum(counts[mask])])
+        attrs = {name: values[mask] for name, values in self.attrs.items()}
+        return PackedWays(self.ids[mask], offsets, self.coords[keep_coords], attrs)
 
-def _save_to_file(data_key: str, data: dict) -> None:
-    data_path = _get_data_path(data_key)
-    data_path.write_text(json.dumps(data, indent=2))
 
+def _concat_ways(parts: list[PackedWays], attr_names: tuple[str, ...]) -> PackedWays:
+    """Concatenate ``parts``, keeping the first copy of ways present in several."""
+    offsets = [parts[0].offsets[:1]]
+    base = 0
+    for p in parts:
+        offsets.append(p.offsets[1:] + base)
+        base += p.offsets[-1]
+    merged = PackedWays(
+        np.concatenate([p.ids for p in parts]),
+        np.concatenate(offsets),
+        np.concatenate([p.coords for p in parts]),
+        {name: np.concatenate([p.attrs[name] for p in parts]) for name in attr_names},
+    )
+    _, first = np.unique(merged.ids, return_index=True)
+    keep = np.zeros(len(merged), dtype=bool)
+    keep[first] = True
+    return merged if keep.all() else merged.select(keep)
 
-def fetch_osm_buildings(bbox_25833: tuple[float, float, float, float]) -> list[dict]:
+
+def _cell_path(layer: str, cell: tuple[int, int]) -> Path:
+    return DATA_DIR / layer / f"{cell[0]}_{cell[1]}.npz"
+
+
+def _cell_bbox(cell: tuple[int, int]) -> tuple[float, float, float, float]:
+    cx, cy = cell
+    return (cx * OSM_CELL_SIZE, cy * OSM_CELL_SIZE, (cx + 1) * OSM_CELL_SIZE, (cy + 1) * OSM_CELL_SIZE)
+
+
+def _cells_for_bbox(bbox: tuple[float, float, float, float]) -> list[tuple[int, int]]:
+    xmin, ymin, xmax, ymax = bbox
+    cx0, cy0 = math.floor(xmin / OSM_CELL_SIZE), math.floor(ymin / OSM_CELL_SIZE)
+    cx1, cy1 = math.floor(xmax / OSM_CELL_SIZE), math.floor(ymax / OSM_CELL_SIZE)
+    return [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+
+
+def _load_cell(layer: str, cell: tuple[int, int]) -> PackedWays | None:
+    path = _cell_path(layer, cell)
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        attrs = {name[5:]: data[name] for name in data.files if name.startswith("attr_")}
+        return PackedWays(data["ids"], data["offsets"], data["coords"], attrs)
+
+
+def _save_cell(layer: str, cell: tuple[int, int], ways: PackedWays) -> None:
+    path = _cell_path(layer, cell)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            ids=ways.ids,
+            offsets=ways.offsets,
+            coords=ways.coords,
+            **{f"attr_{name}": values for name, values in ways.attrs.items()},
+        )
+    os.replace(tmp_path, path)
+
+
+def _overpass_ways(selectors: list[str], bbox_25833: tuple[float, float, float, float]) -> Iterator[dict]:
+    """Stream the elements of one Overpass union query over ``selectors``."""
     south, west, north, east = _bbox_25833_to_wgs84(bbox_25833)
-    data_key = f"buildings_{south:.6f}_{west:.6f}_{north:.6f}_{east:.6f}"
-    
-    saved = _load_from_file(data_key)
-    if saved is not None:
-        return saved
-    
+    statements = "\n".join(f"      {selector};" for selector in selectors)
     query = f"""
-    [out:json][timeout:60];
+    [out:json][timeout:90][bbox:{south},{west},{north},{east}];
     (
-      way["building"]({south},{west},{north},{east});
+{statements}
     );
     out geom;
     """
-    r = requests.post(OVERPASS_URL, data={"data": query}, timeout=90)
-    r.raise_for_status()
-    data = r.json()
-    result = []
-    for el in data.get("elements", []):
-        if el.get("type") != "way":
-            continue
+    with get_session().post(OVERPASS_URL, data={"data": query}, timeout=120, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        yield from ijson.items(r.raw, "elements.item", use_float=True)
+
+
+def _lonlat_to_utm(lon: array, lat: array) -> np.ndarray:
+    x, y = WGS84_TO_UTM.transform(np.frombuffer(lon), np.frombuffer(lat))
+    return np.column_stack([x, y])
+
+
+@dataclass(frozen=True)
+class _Layer:
+    selectors: tuple[str, ...]
+    matches: Callable[[dict[str, Any]], bool]
+    min_nodes: int
+    close_rings: bool
+    # Attribute name -> (value from tags, dtype).
+    attrs: dict[str, tuple[Callable[[dict[str, Any]], Any], type]]
+
+
+class _WayPacker:
+    """Packs the ways of one layer into flat arrays as they stream past.
+
+    Node coordinates collect in growing buffers that are reprojected with one
+    pyproj call per ``REPROJECT_CHUNK`` nodes, so no element outlives its
+    iteration.
+    """
+
+    def __init__(self, layer: _Layer):
+        self.layer = layer
+        self.ids: list[int] = []
+        self.counts: list[int] = []
+        self.values: dict[str, list] = {name: [] for name in layer.attrs}
+        self.lon, self.lat = array("d"), array("d")
+        self.chunks: list[np.ndarray] = []
+
+    def add(self, el: dict) -> None:
         geom = el.get("geometry")
-        if not geom or len(geom) < 3:
-            continue
-        coords = _lonlat_to_utm(geom)
-        if coords[0] != coords[-1]:
-            coords.append(coords[0])
+        if not geom or len(geom) < self.layer.min_nodes:
+            return
+        lon, lat = self.lon, self.lat
+        for p in geom:
+            lon.append(p["lon"])
+            lat.append(p["lat"])
+        n = len(geom)
+        if self.layer.close_rings and (geom[0]["lon"], geom[0]["lat"]) != (geom[-1]["lon"], geom[-1]["lat"]):
+            lon.append(geom[0]["lon"])
+            lat.append(geom[0]["lat"])
+            n += 1
+        self.ids.append(el["id"])
+        self.counts.append(n)
         tags = el.get("tags", {})
-        result.append({"polygon": coords, "height": _parse_height(tags)})
-    
-    _save_to_file(data_key, result)
-    return result
+        for name, (from_tags, _) in self.layer.attrs.items():
+            self.values[name].append(from_tags(tags))
+        if len(lon) >= REPROJECT_CHUNK:
+            self.chunks.append(_lonlat_to_utm(lon, lat))
+            self.lon, self.lat = array("d"), array("d")
 
+    def finish(self) -> PackedWays:
+        self.chunks.append(_lonlat_to_utm(self.lon, self.lat))
+        return PackedWays(
+            np.array(self.ids, dtype=np.int64),
+            np.concatenate([[0], np.cumsum(self.counts, dtype=np.int64)]),
+            np.concatenate(self.chunks),
+            {name: np.array(self.values[name], dtype=dtype) for name, (_, dtype) in self.layer.attrs.items()},
+        )
 
-def fetch_osm_roads(bbox_25833: tuple[float, float, float, float]) -> list[dict]:
-    south, west, north, east = _bbox_25833_to_wgs84(bbox_25833)
-    data_key = f"roads_{south:.6f}_{west:.6f}_{north:.6f}_{east:.6f}"
-    
-    saved = _load_from_file(data_key)
-    if saved is not None:
-        return saved
-    
-    query = f"""
-    [out:json][timeout:60];
-    (
-      way["highway"]({south},{west},{north},{east});
-    );
-    out geom;
-    """
-    r = requests.post(OVERPASS_URL, data={"data": query}, timeout=90)
-    r.raise_for_status()
-    data = r.json()
-    result = []
-    for el in data.get("elements", []):
+
+_WATER = {"water", "bay", "wetland"}
+_VEGETATION = {"wood", "scrub", "heath", "grassland"}
+_VEGETATION_LANDUSE = {"forest", "meadow", "grass"}
+
+LAYERS = {
+    "buildings": _Layer(
+        ('way["building"]',),
+        lambda tags: "building" in tags,
+        3,
+        True,
+        {"height": (_parse_height, np.float64)},
+    ),
+    "roads": _Layer(
+        ('way["highway"]',),
+        lambda tags: "highway" in tags,
+        2,
+        False,
+        {"highway": (lambda tags: tags.get("highway", "unknown"), str)},
+    ),
+    "water": _Layer(
+        ('way["natural"~"^(water|bay|wetland)$"]', 'way["waterway"="riverbank"]'),
+        lambda tags: tags.get("natural") in _WATER or tags.get("waterway") == "riverbank",
+        3,
+        True,
+        {"kind": (lambda tags: tags.get("water") or tags.get("natural") or "riverbank", str)},
+    ),
+    "vegetation": _Layer(
+        ('way["natural"~"^(wood|scrub|heath|grassland)$"]', 'way["landuse"~"^(forest|meadow|grass)$"]'),
+        lambda tags: tags.get("natural") in _VEGETATION or tags.get("landuse") in _VEGETATION_LANDUSE,
+        3,
+        True,
+        {"kind": (lambda tags: tags.get("natural") if tags.get("natural") in _VEGETATION else tags["landuse"], str)},
+    ),
+}
+
+
+def _fetch_layers(layers: list[str], bbox_25833: tuple[float, float, float, float]) -> dict[str, PackedWays]:
+    specs = [LAYERS[name] for name in layers]
+    packers = [_WayPacker(spec) for spec in specs]
+    for el in _overpass_ways([sel for spec in specs for sel in spec.selectors], bbox_25833):
         if el.get("type") != "way":
             continue
-        geom = el.get("geometry")
-        if not geom or len(geom) < 2:
-            continue
-        coords = _lonlat_to_utm(geom)
         tags = el.get("tags", {})
-        result.append({"coords": coords, "highway": tags.get("highway", "unknown")})
-    
-    _save_to_file(data_key, result)
+        # A way can belong to several layers, e.g. a building on a riverbank.
+        for spec, packer in zip(specs, packers):
+            if spec.matches(tags):
+                packer.add(el)
+    return {name: packer.finish() for name, packer in zip(layers, packers)}
+
+
+def load_osm_layers(
+    layers: Iterable[str],
+    bbox_25833: tuple[float, float, float, float],
+) -> dict[str, PackedWays]:
+    """Return the ways of each of ``layers`` whose bounding box intersects ``bbox_25833``.
+
+    Ways are cached per ``OSM_CELL_SIZE`` grid cell (EPSG:25833) and layer as
+    packed ``.npz`` arrays under ``DATA_DIR/<layer>/``, so any bbox is
+    answered from the cells already on disk. Missing cells are grouped into
+    rectangles of at most ``OSM_MAX_QUERY_CELLS`` a side, and each rectangle
+    is fetched for the layers it lacks in one Overpass union query that is
+    split into layers while it streams. Ways crossing cell borders are stored
+    in every cell they touch and de-duplicated by OSM id on load.
+    """
+    layers = list(layers)
+    cells = _cells_for_bbox(bbox_25833)
+    cached = {(layer, cell): _load_cell(layer, cell) for layer in layers for cell in cells}
+    # Cells missing the same layers are covered with rectangles of missing
+    # cells only, so cached cells between them are not downloaded again.
+    by_layers: dict[tuple[str, ...], list[tuple[int, int]]] = {}
+    for cell in cells:
+        missing = tuple(layer for layer in layers if cached[layer, cell] is None)
+        if missing:
+            by_layers.setdefault(missing, []).append(cell)
+    for fetch_layers, missing_cells in by_layers.items():
+        for cx0, cy0, cx1, cy1 in _tile_rectangles(missing_cells, OSM_MAX_QUERY_CELLS):
+            fetch_bbox = (*_cell_bbox((cx0, cy0))[:2], *_cell_bbox((cx1, cy1))[2:])
+            fetched = _fetch_layers(list(fetch_layers), fetch_bbox)
+            for layer, ways in fetched.items():
+                b = ways.bboxes()
+                for cell in [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]:
+                    xmin, ymin, xmax, ymax = _cell_bbox(cell)
+                    touches = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+                    cached[layer, cell] = ways.select(touches)
+                    _save_cell(layer, cell, cached[layer, cell])
+
+    xmin, ymin, xmax, ymax = bbox_25833
+    result = {}
+    for layer in layers:
+        ways = _concat_ways([cached[layer, cell] for cell in cells], tuple(LAYERS[layer].attrs))
+        b = ways.bboxes()
+        result[layer] = ways.select((b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin))
     return result
+
+
+def load_osm_layer(layer: str, bbox_25833: tuple[float, float, float, float]) -> PackedWays:
+    return load_osm_layers([layer], bbox_25833)[layer]
+
+
+def buildings_from_ways(ways: PackedWays) -> list[dict]:
+    heights = ways.attrs["height"]
+    return [
+        {"id": int(ways.ids[i]), "polygon": ways.way_coords(i), "height": float(heights[i])}
+        for i in range(len(ways))
+    ]
+
+
+def roads_from_ways(ways: PackedWays) -> list[dict]:
+    highways = ways.attrs["highway"]
+    return [
+        {"id": int(ways.ids[i]), "coords": ways.way_coords(i), "highway": str(highways[i])}
+        for i in range(len(ways))
+    ]
+
+
+def fetch_osm_buildings(bbox_25833: tuple[float, float, float, float]) -> list[dict]:
+    return buildings_from_ways(load_osm_layer("buildings", bbox_25833))
+
+
+def fetch_osm_roads(bbox_25833: tuple[float, float, float, float]) -> list[dict]:
+    return roads_from_ways(load_osm_layer("roads", bbox_25833))
@@ -0,0 +1,165 @@
+import json
+import math
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import rasterio
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+
+class WindowedRaster:
+    """Read-only, array-like view of band 1 of a raster file.
+
+    Slicing reads just that window from disk, so a county or national mosaic
+    can be passed wherever a DTM array is expected without loading it.
+    """
+
+    def __init__(self, path: str | Path):
+        self._src = rasterio.open(path)
+        self.shape = (self._src.height, self._src.width)
+        self.dtype = np.dtype(self._src.dtypes[0])
+        self.ndim = 2
+        self.transform = self._src.transform
+        self.nodata = self._src.nodata
+
+    def __getitem__(self, key: tuple[slice, slice]) -> np.ndarray:
+        rows, cols = key
+        r0, r1, row_step = rows.indices(self.shape[0])
+        c0, c1, col_step = cols.indices(self.shape[1])
+        if row_step == col_step == 1:
+            window = Window.from_slices((r0, max(r0, r1)), (c0, max(c0, c1)))
+            data = self._src.read(1, window=window)
+        else:
+            # Strided slices become a decimated nearest-neighbour read. GDAL
+            # samples the centre of each output cell, so shift the window back
+            # by half a step to land on rows r0, r0 + step, ...
+            n_rows, n_cols = len(range(r0, r1, row_step)), len(range(c0, c1, col_step))
+            window = Window(
+                c0 - col_step // 2, r0 - row_step // 2, n_cols * col_step, n_rows * row_step
+            )
+            data = self._src.read(1, window=window, out_shape=(n_rows, n_cols), boundless=True)
+        if self.nodata is not None and np.issubdtype(data.dtype, np.floating):
+            data[data == self.nodata] = np.nan
+        return data
+
+    def __array__(self, dtype: Any = None, copy: bool | None = None) -> np.ndarray:
+        data = self[:, :]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def close(self) -> None:
+        self._src.close()
+
+
+class QuantizedRaster:
+    """Array-like DTM stored as ``uint16`` steps of ``scale`` metres above ``offset``.
+
+    Half the size of float32 heights (at centimetre precision for a 650 m
+    relief); ``NODATA`` marks missing cells. Slicing decodes just that window
+    to float32 with NaN for no-data, so it can stand in for a DTM array.
+    """
+
+    NODATA = np.iinfo(np.uint16).max
+
+    def __init__(self, values: np.ndarray, scale: float, offset: float):
+        self.values = values
+        self.scale = scale
+        self.offset = offset
+        self.shape = values.shape
+        self.dtype = np.dtype(np.float32)
+        self.ndim = values.ndim
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def _decode(self, values: np.ndarray) -> np.ndarray:
+        heights = values.astype(np.float32)
+        heights *= np.float32(self.scale)
+        heights += np.float32(self.offset)
+        heights[values == self.NODATA] = np.nan
+        return heights
+
+    def __getitem__(self, key: Any) -> np.ndarray:
+        return self._decode(np.asarray(self.values[key]))
+
+    def __array__(self, dtype: Any = None, copy: bool | None = None) -> np.ndarray:
+        data = self._decode(self.values)
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+
+def quantize_heights(
+    heights: np.ndarray,
+    scale: float | None = None,
+    strip_rows: int = 4096,
+) -> QuantizedRaster:
+    """Encode ``heights`` (NaN for no-data) as a :class:`QuantizedRaster`.
+
+    ``scale`` defaults to the finest step that fits the valid range into
+    ``uint16``. Rows are scanned for the range and then converted in strips
+    of ``strip_rows``, so no full-size temporaries are made.
+    """
+    rows = np.shape(heights)[0]
+    lo, hi = np.inf, -np.inf
+    for r in range(0, rows, strip_rows):
+        strip = np.asarray(heights[r : r + strip_rows])
+        if strip.size:
+            # fmin/fmax skip NaN, and an all-NaN strip yields NaN without a warning.
+            lo = np.fmin(lo, np.fmin.reduce(strip, axis=None))
+            hi = np.fmax(hi, np.fmax.reduce(strip, axis=None))
+    lo, hi = (float(lo), float(hi)) if lo <= hi else (0.0, 0.0)
+    if scale is None:
+        scale = max((hi - lo) / (QuantizedRaster.NODATA - 1), 1e-3)
+    elif (hi - lo) / scale > QuantizedRaster.NODATA - 1:
+        raise ValueError(f"a {hi - lo:.1f} m range does not fit uint16 at {scale} m steps")
+    values = np.empty(np.shape(heights), dtype=np.uint16)
+    for r in range(0, rows, strip_rows):
+        strip = np.asarray(heights[r : r + strip_rows], dtype=np.float64)
+        encoded = np.rint((strip - lo) / scale)
+        values[r : r + strip_rows] = np.where(np.isnan(strip), QuantizedRaster.NODATA, encoded)
+    return QuantizedRaster(values, scale, lo)
+
+
+def _sidecar_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+def save_npy_mosaic(path: str | Path, dtm: np.ndarray, transform: Affine) -> None:
+    """Write ``dtm`` as a ``.npy`` file plus a JSON sidecar holding its transform."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, np.asarray(dtm, dtype=np.float32))
+    _sidecar_path(path).write_text(json.dumps({"transform": list(transform)[:6]}))
+
+
+def open_dtm(path: str | Path) -> tuple[np.ndarray | WindowedRaster, Affine]:
+    """Open a local DTM without reading it into memory.
+
+    ``.npy`` mosaics are memory-mapped and need the sidecar written by
+    :func:`save_npy_mosaic`; anything else is opened through rasterio and
+    read window by window.
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        meta = json.loads(_sidecar_path(path).read_text())
+        return np.load(path, mmap_mode="r"), Affine(*meta["transform"])
+    raster = WindowedRaster(path)
+    return raster, raster.transform
+
+
+def read_window(
+    dtm: np.ndarray | WindowedRaster,
+    transform: Affine,
+    bbox: tuple[float, float, float, float],
+) -> tuple[np.ndarray, Affine]:
+    """Read the part of ``dtm`` covering ``bbox`` and return it with its own transform."""
+    xmin, ymin, xmax, ymax = bbox
+    inv = ~transform
+    cols, rows = inv * (np.array([xmin, xmax, xmin, xmax]), np.array([ymin, ymin, ymax, ymax]))
+    r0 = min(max(math.floor(rows.min()), 0), dtm.shape[0])
+    r1 = min(max(math.ceil(rows.max()), 0), dtm.shape[0])
+    c0 = min(max(math.floor(cols.min()), 0), dtm.shape[1])
+    c1 = min(max(math.ceil(cols.max()), 0), dtm.shape[1])
+    data = np.asarray(dtm[r0:r1, c0:c1], dtype=np.float32)
+    return data, transform * Affine.translation(c0, r0)
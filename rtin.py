@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+
+
+def _pad_to_grid(heights: np.ndarray) -> np.ndarray:
+    # Square blocks sized to the short side, so a long strip becomes a row of
+    # blocks instead of being padded to one square as long as the strip.
+    rows, cols = heights.shape
+    block = 2 ** max(1, math.ceil(math.log2(max(min(rows, cols) - 1, 1))))
+    shape = tuple(max(1, -(-(n - 1) // block)) * block + 1 for n in (rows, cols))
+    grid = np.full(shape, np.nan, dtype=np.float32)
+    grid[:rows, :cols] = heights
+    return grid
+
+
+def _block_size(shape: tuple[int, int]) -> int:
+    # Largest power of two dividing both spans: the side of the top-level
+    # squares the grid is tiled with.
+    span = math.gcd(shape[0] - 1, shape[1] - 1)
+    return span & -span
+
+
+def _hypotenuse_error(grid: np.ndarray, a: tuple, b: tuple, m: tuple) -> np.ndarray:
+    za, zb, zm = grid[a], grid[b], grid[m]
+    err = np.abs(0.5 * (za + zb) - zm)
+    # Split wherever data meets no-data; stretches of pure no-data (such as
+    # the padding) stay coarse and are dropped whole.
+    all_nan = np.isnan(za) & np.isnan(zb) & np.isnan(zm)
+    return np.where(all_nan, 0.0, np.where(np.isnan(err), np.inf, err))
+
+
+def rtin_errors(grid: np.ndarray) -> np.ndarray:
+    """Return the RTIN approximation error at every split vertex of ``grid``.
+
+    ``grid`` must be ``(a * 2**k + 1, b * 2**k + 1)``, i.e. tiled with
+    ``2**k`` squares sharing their edges; errors on a shared edge include
+    the triangles on both sides, so neighbouring squares refine it alike. The error stored at a vertex is
+    the largest height error of the triangles that are split there and of all
+    their descendants, so a single threshold test decides whether to refine.
+    A split mixing NaN and valid heights gets an infinite error, which forces
+    refinement down to the pixel along the edge of no-data areas. Each level
+    is one vectorized pass, so the total cost is linear in the number of
+    pixels.
+    """
+    nr, nc = grid.shape[0] - 1, grid.shape[1] - 1
+    block = _block_size(grid.shape)
+    errors = np.zeros(grid.shape, dtype=np.float32)
+    s = 2
+    while s <= block:
+        h = s // 2
+        q = h // 2
+        # Midpoints of the sides of s-sized squares; their children (when
+        # splittable) are the centres of the (s/2)-sized squares around them.
+        for horizontal in (True, False):
+            if horizontal:
+                r, c = np.ix_(np.arange(0, nr + 1, s), np.arange(h, nc, s))
+            else:
+                r, c = np.ix_(np.arange(h, nr, s), np.arange(0, nc + 1, s))
+            if horizontal:
+                err = _hypotenuse_error(grid, (r, c - h), (r, c + h), (r, c))
+            else:
+                err = _hypotenuse_error(grid, (r - h, c), (r + h, c), (r, c))
+            if q:
+                # Children past the grid edge do not exist; clip to index and
+                # mask them out rather than padding a copy of the grid.
+                for dr in (-q, q):
+                    rr = r + dr
+                    inside_r = (rr >= 0) & (rr <= nr)
+                    rr = np.clip(rr, 0, nr)
+                    for dc in (-q, q):
+                        cc = c + dc
+                        inside = inside_r & (cc >= 0) & (cc <= nc)
+                        err = np.maximum(err, np.where(inside, errors[rr, np.clip(cc, 0, nc)], 0.0))
+            errors[r, c] = err
+        # Centres of s-sized squares, split along alternating diagonals.
+        r, c = np.ix_(np.arange(h, nr, s), np.arange(h, nc, s))
+        main = ((r // s + c // s) % 2 == 0)
+        err = np.where(
+            main,
+            _hypotenuse_error(grid, (r - h, c - h), (r + h, c + h), (r, c)),
+            _hypotenuse_error(grid, (r - h, c + h), (r + h, c - h), (r, c)),
+        )
+        for dr, dc in ((-h, 0), (h, 0), (0, -h), (0, h)):
+            err = np.maximum(err, errors[r + dr, c + dc])
+        errors[r, c] = err
+        s *= 2
+    return errors
+
+
+def rtin_triangles(errors: np.ndarray, max_error: float) -> np.ndarray:
+    """Return ``(T, 3, 2)`` ``(row, col)`` triangle corners meeting ``max_error``."""
+    # Start from two triangles per top-level square, split along the same
+    # alternating diagonals as rtin_errors.
+    block = _block_size(errors.shape)
+    r0, c0 = [g.ravel() for g in np.mgrid[0 : errors.shape[0] - 1 : block, 0 : errors.shape[1] - 1 : block]]
+    r1, c1 = r0 + block, c0 + block
+    main = (r0 // block + c0 // block) % 2 == 0
+    # The main diagonal runs (r0, c0)-(r1, c1), the other (r0, c1)-(r1, c0).
+    a = np.concatenate([np.where(main, [r0, c0], [r0, c1]), np.where(main, [r1, c1], [r1, c0])], axis=1).T
+    b = np.concatenate([np.where(main, [r1, c1], [r1, c0]), np.where(main, [r0, c0], [r0, c1])], axis=1).T
+    c = np.concatenate([np.where(main, [r0, c1], [r1, c1]), np.where(main, [r1, c0], [r0, c0])], axis=1).T
+    emitted = []
+    while len(a):
+        m = (a + b) // 2
+        split = (np.abs(a - c).sum(axis=1) > 1) & (errors[m[:, 0], m[:, 1]] > max_error)
+        emitted.append(np.stack([a[~split], b[~split], c[~split]], axis=1))
+        a, b, c, m = a[split], b[split], c[split], m[split]
+        a, b, c = np.concatenate([c, b]), np.concatenate([a, c]), np.concatenate([m, m])
+    return np.concatenate(emitted)
+
+
+def rtin_mesh(heights: np.ndarray, max_error: float) -> tuple[np.ndarray, np.ndarray]:
+    """Triangulate ``heights`` to within ``max_error`` (same units as the heights).
+
+    Any shape is accepted; it is padded with no-data to a row or column of
+    ``2**k`` squares sized to its short side internally. Triangles touching NaN cells are
+    dropped, leaving holes instead of zero-height pits. Returns ``(V, 2)``
+    vertex ``(row, col)`` indices into ``heights`` and ``(T, 3)`` triangles
+    indexing those vertices, wound counter-clockwise in map view for a
+    north-up raster.
+    """
+    grid = _pad_to_grid(np.asarray(heights))
+    tris = rtin_triangles(rtin_errors(grid), max_error)
+    z = grid[tris[..., 0], tris[..., 1]]
+    tris = tris[~np.isnan(z).any(axis=1)]
+    if not len(tris):
+        return np.empty((0, 2), dtype=np.int64), np.empty((0, 3), dtype=np.int64)
+
+    # With x along columns and y against rows, this is the map-view cross product.
+    d1 = tris[:, 1] - tris[:, 0]
+    d2 = tris[:, 2] - tris[:, 0]
+    flip = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0] < 0
+    tris[flip] = tris[flip][:, ::-1]
+
+    size = grid.shape[1]
+    flat, inverse = np.unique(tris[..., 0] * size + tris[..., 1], return_inverse=True)
+    vertices = np.column_stack([flat // size, flat % size])
+    return vertices, inverse.reshape(-1, 3)
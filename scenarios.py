@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+import instrument
+from acquire import load_scene
+from batch import map_shared
+from config import Config
+from dsm import SurfaceModel
+from horizon import build_max_pyramid, buildings_containing, sample_terrain
+from main import _bbox_from_config, analyse
+from raster import read_window
+
+RESULTS_PATH = Path(os.environ.get("RESULTS_PATH", "data/results.npz"))
+# Bump when the analysis changes so stored results are recomputed.
+RESULTS_VERSION = 1
+# Overlapping scenarios share one DTM/OSM load unless the union gets wider than this (metres).
+MAX_GROUP_SPAN = 5000.0
+
+_METRICS = ("max_delta_deg", "mean_delta_deg", "blocked_solid_angle_sr")
+
+def load_scenarios(path: str | Path) -> list[Config]:
+    """Read scenarios from a JSON list or a JSON-lines file of ``Config`` fields.
+
+    ``center_xyz`` is only used by the viewer and defaults to the viewpoint
+    at the house base elevation.
+    """
+    text = Path(path).read_text()
+    stripped = text.lstrip()
+    rows = json.loads(text) if stripped.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    scenarios = []
+    for row in rows:
+        row = dict(row)
+        row["viewpoint"] = tuple(row["viewpoint"])
+        row["house_polygon"] = [tuple(p) for p in row["house_polygon"]]
+        row.setdefault("center_xyz", (*row["viewpoint"], row["house_base_elevation"]))
+        row["center_xyz"] = tuple(row["center_xyz"])
+        scenarios.append(Config(**row))
+    return scenarios
+
+
+def scenario_key(cfg: Config, year: int) -> str:
+    """Hash of everything the result of ``cfg`` depends on."""
+    fields = dataclasses.asdict(cfg)
+    # Display-only settings do not change the analysis.
+    del fields["center_xyz"], fields["terrain_max_error"]
+    source: Any = None
+    if cfg.dtm_path:
+        st = os.stat(cfg.dtm_path)
+        source = [os.path.abspath(cfg.dtm_path), st.st_size, st.st_mtime_ns]
+    payload = json.dumps([RESULTS_VERSION, fields, year, source], default=list, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _group_scenarios(scenarios: list[Config]) -> list[tuple[tuple[float, float, float, float], list[int]]]:
+    """Return ``(union_bbox, indices)`` for scenarios that can share one scene load."""
+    by_source: dict[tuple, list[int]] = {}
+    for i, cfg in enumerate(scenarios):
+        by_source.setdefault((cfg.dtm_path, cfg.dtm_resolution, cfg.koordsys), []).append(i)
+
+    groups = []
+    for indices in by_source.values():
+        bboxes = {i: _bbox_from_config(scenarios[i]) for i in indices}
+        current: list[int] = []
+        union: list[float] = []
+        # Sweep along x, growing a group while each bbox overlaps its union.
+        for i in sorted(indices, key=lambda i: bboxes[i][0]):
+            xmin, ymin, xmax, ymax = bboxes[i]
+            if current:
+                merged = [min(union[0], xmin), min(union[1], ymin), max(union[2], xmax), max(union[3], ymax)]
+                overlaps = xmin <= union[2] and ymin <= union[3] and ymax >= union[1]
+                small = max(merged[2] - merged[0], merged[3] - merged[1]) <= MAX_GROUP_SPAN
+                if overlaps and small:
+                    current.append(i)
+                    union = merged
+                    continue
+                groups.append((tuple(union), current))
+            current, union = [i], [xmin, ymin, xmax, ymax]
+        if current:
+            groups.append((tuple(union), current))
+    return groups
+
+
+def _scenario_context(dsm: np.ndarray, transform: Any) -> tuple:
+    return dsm, transform, build_max_pyramid(dsm)
+
+
+def _scenario_task(context: tuple, item: tuple[Config, tuple[float, float, float], int]) -> dict[str, Any]:
+    dsm, transform, pyramid = context
+    cfg, viewpoint_xyz, year = item
+    return analyse(dsm, transform, viewpoint_xyz, cfg, pyramid, year)
+
+
+def _analyse_group(
+    scenarios: list[Config],
+    bbox: tuple[float, float, float, float],
+    year: int,
+    max_workers: int | None,
+) -> Iterator[tuple[int, dict[str, Any]]]:
+    with instrument.stage("scenario_scene", scenarios=scenarios):
+        scene = asyncio.run(load_scene(scenarios[0], bbox))
+        dtm, transform = read_window(scene.dtm, scene.transform, bbox)
+    # The eye sits on the shared DTM rather than on a per-scenario point
+    # lookup, so a group needs no further requests.
+    viewpoints = [
+        (cfg.viewpoint[0], cfg.viewpoint[1], sample_terrain(dtm, transform, *cfg.viewpoint) + cfg.eye_height)
+        for cfg in scenarios
+    ]
+
+    # The observer's own building is left out of the DSM, so scenarios share
+    # a surface model only when their viewpoints lie in the same buildings
+    # (usually none).
+    by_excluded: dict[tuple[int, ...], list[int]] = {}
+    for i, cfg in enumerate(scenarios):
+        excluded = tuple(np.flatnonzero(buildings_containing(scene.buildings, cfg.viewpoint)).tolist())
+        by_excluded.setdefault(excluded, []).append(i)
+
+    for members in by_excluded.values():
+        with instrument.stage("surface_model", scenarios=members):
+            dsm = SurfaceModel(dtm, transform, scene.buildings, exclude_xy=scenarios[members[0]].viewpoint).dsm
+        items = [(scenarios[i], viewpoints[i], year) for i in members]
+        setup = partial(_scenario_context, transform=transform)
+        for i, result in map_shared(_scenario_task, items, [dsm], setup=setup, max_workers=max_workers):
+            yield members[i], result
+
+
+def read_results(path: str | Path = RESULTS_PATH) -> dict[str, np.ndarray]:
+    """Load the result columns, one row per scenario.
+
+    Per-scenario columns are ``key``, ``year``, ``viewpoint``, the
+    obstruction metrics, ``lost_sun_hours`` and ``month_lost_hours``.
+    Profiles are packed: rows ``offsets[i]:offsets[i + 1]`` of ``azimuth``,
+    ``angle_without`` and ``angle_with`` belong to scenario ``i``.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _result_columns(keys: list[str], scenarios: list[Config], results: list[dict[str, Any]]) -> dict[str, np.ndarray]:
+    lengths = [len(r["profile_without"]) for r in results]
+    columns = {
+        "key": np.array(keys, dtype="U16"),
+        "year": np.array([r["year"] for r in results], dtype=np.int32),
+        "viewpoint": np.array([cfg.viewpoint for cfg in scenarios], dtype=np.float64).reshape(-1, 2),
+        "lost_sun_hours": np.array([r["sun"]["lost_hours"] for r in results]),
+        "month_lost_hours": np.array([r["sun"]["month_lost"] for r in results]).reshape(-1, 12),
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        "azimuth": np.concatenate([r["profile_without"][:, 0] for r in results] or [[]]),
+        "angle_without": np.concatenate([r["profile_without"][:, 1] for r in results] or [[]]).astype(np.float32),
+        "angle_with": np.concatenate([r["profile_with"][:, 1] for r in results] or [[]]).astype(np.float32),
+    }
+    for name in _METRICS:
+        columns[name] = np.array([r["obstruction"][name] for r in results])
+    return columns
+
+
+def _append_results(path: Path, existing: dict[str, np.ndarray], new: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    if existing:
+        merged = {}
+        for name, column in new.items():
+            if name == "offsets":
+                merged[name] = np.concatenate([existing[name], existing[name][-1] + column[1:]])
+            else:
+                merged[name] = np.concatenate([existing[name], column])
+    else:
+        merged = new
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **merged)
+    os.replace(tmp, path)
+    return merged
+
+
+def run_scenarios(
+    scenarios: list[Config],
+    path: str | Path = RESULTS_PATH,
+    year: int | None = None,
+    max_workers: int | None = None,
+) -> dict[str, np.ndarray]:
+    """Analyse ``scenarios`` headlessly and store the results in ``path``.
+
+    Scenarios whose :func:`scenario_key` is already in the store are
+    skipped, so reruns only compute new or changed ones. Overlapping
+    scenarios share one DTM/OSM load (and surface model, unless their
+    viewpoints lie in different buildings) and run in parallel on a
+    process pool; the store is updated after each group.
+    """
+    path = Path(path)
+    year = year or datetime.date.today().year
+    results = read_results(path)
+    done = set(results.get("key", np.array([], dtype="U16")).tolist())
+    keys = [scenario_key(cfg, year) for cfg in scenarios]
+    todo = [i for i, key in enumerate(keys) if key not in done and key not in keys[:i]]
+    print(f"{len(scenarios) - len(todo)} of {len(scenarios)} scenarios already computed")
+
+    pending = [scenarios[i] for i in todo]
+    for bbox, members in _group_scenarios(pending):
+        group = [pending[m] for m in members]
+        finished: dict[int, dict[str, Any]] = {}
+        for i, result in _analyse_group(group, bbox, year, max_workers):
+            finished[i] = result
+        order = sorted(finished)
+        results = _append_results(
+            path,
+            results,
+            _result_columns(
+                [keys[todo[members[i]]] for i in order], [group[i] for i in order], [finished[i] for i in order]
+            ),
+        )
+        print(f"Stored {len(order)} scenarios around ({bbox[0]:.0f}, {bbox[1]:.0f})")
+    if instrument.ENABLED:
+        print(instrument.summary())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse many scenarios headlessly into a results store.")
+    parser.add_argument("scenarios", help="JSON or JSON-lines file of Config fields")
+    parser.add_argument("--out", type=Path, default=RESULTS_PATH, help="results .npz to create or extend")
+    parser.add_argument("--year", type=int, default=None, help="year of the sun path (default: current)")
+    parser.add_argument("--workers", type=int, default=None)
+    opts = parser.parse_args()
+    run_scenarios(load_scenarios(opts.scenarios), opts.out, opts.year, opts.workers)
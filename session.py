@@ -0,0 +1,73 @@
+from typing import Any
+
+import numpy as np
+
+from horizon import compute_horizon_profile, compute_obstruction, footprint_azimuth_mask, occluder_angles
+
+
+class AnalysisSession:
+    """Horizon analysis for one viewpoint that is cheap to update on house edits.
+
+    The terrain-only profile is traced once. The proposed house is handled
+    analytically on top of it, and :meth:`set_house` only recomputes the
+    azimuths whose rays cross the old or the new footprint.
+
+    ``profile`` may supply a precomputed terrain profile, such as a
+    non-uniform one from ``compute_adaptive_horizon_profile``; its azimuths
+    are then used instead of ``azimuth_step``.
+    """
+
+    def __init__(
+        self,
+        dtm: np.ndarray,
+        transform: Any,
+        viewpoint_xyz: tuple[float, float, float],
+        azimuth_step: float,
+        max_distance: float,
+        pyramid: list[np.ndarray] | None = None,
+        profile: np.ndarray | None = None,
+    ):
+        self.viewpoint_xyz = viewpoint_xyz
+        self.max_distance = max_distance
+        if profile is None:
+            self.azimuth_step = azimuth_step
+            self.profile_without = compute_horizon_profile(
+                dtm, transform, viewpoint_xyz, azimuth_step, max_distance, pyramid=pyramid
+            )
+        else:
+            self.azimuth_step = None
+            self.profile_without = np.array(profile, dtype=np.float64)
+        self.azimuths = self.profile_without[:, 0]
+        self.terrain_angles = self.profile_without[:, 1].copy()
+        self.house_angles = np.full(len(self.azimuths), -90.0)
+        self.profile_with = self.profile_without.copy()
+        self._house_polygon: list[tuple[float, float]] | None = None
+
+    def _azimuth_mask(self, polygon: list[tuple[float, float]] | None) -> np.ndarray:
+        return footprint_azimuth_mask(self.viewpoint_xyz[:2], polygon, self.azimuths)
+
+    def set_house(
+        self,
+        polygon: list[tuple[float, float]] | None,
+        base_elevation: float | None = None,
+        height: float | None = None,
+    ) -> dict[str, Any]:
+        affected = self._azimuth_mask(self._house_polygon)
+        if polygon and base_elevation is not None and height is not None:
+            affected |= self._azimuth_mask(polygon)
+            self.house_angles[affected] = occluder_angles(
+                self.viewpoint_xyz,
+                self.azimuths[affected],
+                [polygon],
+                np.array([base_elevation + height]),
+                self.max_distance,
+            )
+            self._house_polygon = polygon
+        else:
+            self.house_angles[affected] = -90.0
+            self._house_polygon = None
+        self.profile_with[affected, 1] = np.maximum(self.terrain_angles[affected], self.house_angles[affected])
+        return self.obstruction()
+
+    def obstruction(self) -> dict[str, Any]:
+        return compute_obstruction(self.profile_without, self.profile_with, self.azimuth_step)
@@ -0,0 +1,136 @@
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+import pyproj
+
+# Sun positions sampled every this many minutes by default.
+SUN_STEP_MINUTES = 1
+
+
+def _geographic(x: float, y: float, epsg: int) -> tuple[float, float, float]:
+    """Return ``(lon, lat, convergence)`` of projected ``(x, y)``.
+
+    ``convergence`` is the clockwise angle in degrees from true north to grid
+    north, so a true azimuth maps to the grid azimuths of the horizon
+    profiles by subtracting it.
+    """
+    crs = pyproj.CRS.from_epsg(epsg)
+    lon, lat = pyproj.Transformer.from_crs(crs, crs.geodetic_crs, always_xy=True).transform(x, y)
+    # Grid bearing of a short step due north along the meridian.
+    x1, y1 = pyproj.Transformer.from_crs(crs.geodetic_crs, crs, always_xy=True).transform(lon, lat + 1e-4)
+    convergence = -np.degrees(np.arctan2(x1 - x, y1 - y))
+    return float(lon), float(lat), float(convergence)
+
+
+def sun_positions(times: np.ndarray, lat: float, lon: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return sun ``(azimuth, elevation)`` in degrees at UTC ``times``.
+
+    ``times`` is a ``datetime64`` array. Uses NOAA's fractional-year
+    approximation (accurate to a few arc-minutes) with a standard refraction
+    correction near the horizon; azimuth is clockwise from true north.
+    """
+    minutes = (times - times.astype("datetime64[Y]")).astype("timedelta64[m]").astype(np.float64)
+    year = times.astype("datetime64[Y]").astype(np.int64) + 1970
+    days_in_year = np.where((year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0)), 366.0, 365.0)
+    day = minutes // 1440.0
+    minute_of_day = minutes - day * 1440.0
+    gamma = 2.0 * np.pi / days_in_year * (day + (minute_of_day / 60.0 - 12.0) / 24.0)
+
+    eqtime = 229.18 * (
+        0.000075
+        + 0.001868 * np.cos(gamma)
+        - 0.032077 * np.sin(gamma)
+        - 0.014615 * np.cos(2 * gamma)
+        - 0.040849 * np.sin(2 * gamma)
+    )
+    decl = (
+        0.006918
+        - 0.399912 * np.cos(gamma)
+        + 0.070257 * np.sin(gamma)
+        - 0.006758 * np.cos(2 * gamma)
+        + 0.000907 * np.sin(2 * gamma)
+        - 0.002697 * np.cos(3 * gamma)
+        + 0.00148 * np.sin(3 * gamma)
+    )
+    true_solar_minutes = minute_of_day + eqtime + 4.0 * lon
+    hour_angle = np.radians(true_solar_minutes / 4.0 - 180.0)
+
+    phi = np.radians(lat)
+    cos_zenith = np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(hour_angle)
+    zenith = np.arccos(np.clip(cos_zenith, -1.0, 1.0))
+    azimuth = np.degrees(
+        np.arctan2(
+            np.sin(hour_angle),
+            np.cos(hour_angle) * np.sin(phi) - np.tan(decl) * np.cos(phi),
+        )
+    )
+    azimuth = (azimuth + 180.0) % 360.0
+
+    elevation = 90.0 - np.degrees(zenith)
+    # Bennett's refraction formula, in arc-minutes; negligible below -1 degree.
+    refraction = 1.02 / np.tan(np.radians(elevation + 10.3 / (elevation + 5.11))) / 60.0
+    elevation = elevation + np.where(elevation > -1.0, refraction, 0.0)
+    return azimuth, elevation
+
+
+@lru_cache(maxsize=8)
+def _daylight_path(
+    lat: float, lon: float, convergence: float, year: int, step_minutes: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    # The sun path depends only on place and year, so it is shared by every
+    # profile evaluated there; only samples with the sun up are kept.
+    start = np.datetime64(f"{year}-01-01T00:00", "m")
+    end = np.datetime64(f"{year + 1}-01-01T00:00", "m")
+    times = np.arange(start, end, np.timedelta64(step_minutes, "m"))
+    azimuth, elevation = sun_positions(times, lat, lon)
+    up = elevation > 0.0
+    day = ((times[up] - start) // np.timedelta64(1, "D")).astype(np.int64)
+    n_days = int((end - start) // np.timedelta64(1, "D"))
+    grid_azimuth = (azimuth[up] - convergence) % 360.0
+    return grid_azimuth, elevation[up], day, n_days
+
+
+def _horizon_at(profile: np.ndarray, azimuths: np.ndarray) -> np.ndarray:
+    return np.interp(azimuths, profile[:, 0], profile[:, 1], period=360.0)
+
+
+def compute_sun_hours(
+    profile_without: np.ndarray,
+    profile_with: np.ndarray,
+    viewpoint_xy: tuple[float, float],
+    year: int,
+    koordsys: int = 25833,
+    step_minutes: int = SUN_STEP_MINUTES,
+) -> dict[str, Any]:
+    """Direct sun-hours at the viewpoint with and without the house.
+
+    The sun is sampled every ``step_minutes`` over ``year`` (UTC) and counts
+    as visible while it is above the horizon profile interpolated at its
+    azimuth. Returns per-day (``day_*``, one entry per day of the year) and
+    per-month (``month_*``, twelve entries) hours for the ``without`` and
+    ``with`` profiles and the ``lost`` difference.
+    """
+    lon, lat, convergence = _geographic(viewpoint_xy[0], viewpoint_xy[1], koordsys)
+    azimuth, elevation, day, n_days = _daylight_path(
+        round(lat, 6), round(lon, 6), round(convergence, 6), year, step_minutes
+    )
+    hours = step_minutes / 60.0
+    day_without = np.bincount(day, weights=elevation > _horizon_at(profile_without, azimuth), minlength=n_days) * hours
+    day_with = np.bincount(day, weights=elevation > _horizon_at(profile_with, azimuth), minlength=n_days) * hours
+
+    dates = np.datetime64(f"{year}-01-01", "D") + np.arange(n_days)
+    month = (dates.astype("datetime64[M]") - dates[0].astype("datetime64[M]")).astype(np.int64)
+
+    def per_month(values: np.ndarray) -> np.ndarray:
+        return np.bincount(month, weights=values, minlength=12)
+
+    return {
+        "day_without": day_without,
+        "day_with": day_with,
+        "day_lost": day_without - day_with,
+        "month_without": per_month(day_without),
+        "month_with": per_month(day_with),
+        "month_lost": per_month(day_without - day_with),
+        "lost_hours": float(np.sum(day_without - day_with)),
+    }
@@ -0,0 +1,194 @@
+import math
+import heapq
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+import pyvista as pv
+
+from raster import QuantizedRaster, WindowedRaster
+from rtin import rtin_mesh
+
+TileKey = tuple[int, int, int]
+
+
+def _read_strided(
+    dtm: np.ndarray | WindowedRaster | QuantizedRaster,
+    r0: int,
+    r1: int,
+    c0: int,
+    c1: int,
+    step: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rows = np.arange(r0, r1, step)
+    cols = np.arange(c0, c1, step)
+    data = np.asarray(dtm[r0:r1:step, c0:c1:step], dtype=np.float32)
+    # Always include the last row/column so neighbouring tiles share an edge.
+    if rows[-1] != r1 - 1:
+        data = np.vstack([data, np.asarray(dtm[r1 - 1 : r1, c0:c1:step], dtype=np.float32)])
+        rows = np.append(rows, r1 - 1)
+    if cols[-1] != c1 - 1:
+        edge = np.asarray(dtm[r0:r1:step, c1 - 1 : c1], dtype=np.float32)
+        if len(edge) != len(rows):
+            edge = np.vstack([edge, np.asarray(dtm[r1 - 1 : r1, c1 - 1 : c1], dtype=np.float32)])
+        data = np.hstack([data, edge])
+        cols = np.append(cols, c1 - 1)
+    return data, rows, cols
+
+
+class TerrainTileTree:
+    """Quadtree of terrain meshes over ``bbox`` built on demand.
+
+    Level 0 is a single tile covering the region with ``tile_samples`` quads
+    per edge; each level halves the tile span and the sample spacing, down to
+    the native DTM resolution at ``max_level``. Each tile is an RTIN mesh of
+    its samples within ``max_error`` metres, and built tiles are kept in an
+    LRU cache of ``cache_size`` meshes. Tiles carry a vertical skirt along
+    their border so cracks between neighbouring tiles are hidden.
+    """
+
+    def __init__(
+        self,
+        dtm: np.ndarray | WindowedRaster | QuantizedRaster,
+        transform: Any,
+        bbox: tuple[float, float, float, float],
+        tile_samples: int = 128,
+        max_error: float = 0.5,
+        cache_size: int = 256,
+    ):
+        self.dtm = dtm
+        self.transform = transform
+        self.tile_samples = tile_samples
+        self.max_error = max_error
+        self.cache_size = cache_size
+        self._cache: OrderedDict[TileKey, pv.PolyData | None] = OrderedDict()
+
+        xmin, ymin, xmax, ymax = bbox
+        inv = ~transform
+        cols, rows = inv * (np.array([xmin, xmax, xmin, xmax]), np.array([ymin, ymin, ymax, ymax]))
+        self.r0 = min(max(math.floor(rows.min()), 0), dtm.shape[0])
+        self.r1 = min(max(math.ceil(rows.max()), 0), dtm.shape[0])
+        self.c0 = min(max(math.floor(cols.min()), 0), dtm.shape[1])
+        self.c1 = min(max(math.ceil(cols.max()), 0), dtm.shape[1])
+        extent = max(self.r1 - self.r0, self.c1 - self.c0, 1)
+        self.max_level = max(0, math.ceil(math.log2(extent / tile_samples)))
+        self.pixel_size = math.hypot(transform.a, transform.d)
+
+        root = self.tile_mesh((0, 0, 0))
+        z = root["elevation"] if root is not None else np.zeros(1)
+        self.z_range = (float(z.min()), float(z.max()))
+
+    def _tile_window(self, key: TileKey) -> tuple[int, int, int, int, int] | None:
+        level, tx, ty = key
+        step = 2 ** (self.max_level - level)
+        span = self.tile_samples * step
+        r0 = self.r0 + ty * span
+        c0 = self.c0 + tx * span
+        # One extra sample past the span so the tile meets its neighbours.
+        r1 = min(r0 + span + 1, self.r1)
+        c1 = min(c0 + span + 1, self.c1)
+        if r1 - r0 < 2 or c1 - c0 < 2:
+            return None
+        return r0, r1, c0, c1, step
+
+    def tile_bounds(self, key: TileKey) -> tuple[float, float, float, float] | None:
+        window = self._tile_window(key)
+        if window is None:
+            return None
+        r0, r1, c0, c1, _ = window
+        xs, ys = self.transform * (np.array([c0, c1 - 1, c0, c1 - 1]), np.array([r0, r0, r1 - 1, r1 - 1]))
+        return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
+
+    def _build_tile(self, key: TileKey) -> pv.PolyData | None:
+        window = self._tile_window(key)
+        if window is None:
+            return None
+        r0, r1, c0, c1, step = window
+        data, rows, cols = _read_strided(self.dtm, r0, r1, c0, c1, step)
+        vertices, triangles = rtin_mesh(data, self.max_error)
+        if not len(triangles):
+            return None
+        vr, vc = vertices[:, 0], vertices[:, 1]
+        t = self.transform
+        x = t.c + t.a * cols[vc] + t.b * rows[vr]
+        y = t.f + t.d * cols[vc] + t.e * rows[vr]
+        z = data[vr, vc].astype(np.float64)
+
+        # Skirt: hang a vertical strip from every triangle edge on the tile
+        # border, wound to face outwards.
+        edges = triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        er, ec = vr[edges], vc[edges]
+        on_border = (
+            ((er[:, 0] == er[:, 1]) & np.isin(er[:, 0], [0, len(rows) - 1]))
+            | ((ec[:, 0] == ec[:, 1]) & np.isin(ec[:, 0], [0, len(cols) - 1]))
+        )
+        border = edges[on_border]
+        hung = np.unique(border)
+        lowered = np.zeros(len(x), dtype=np.int64)
+        lowered[hung] = len(x) + np.arange(len(hung))
+        skirt = 4.0 * step * self.pixel_size
+        top = np.column_stack([x, y, z])
+        points = np.vstack([top, top[hung] - [0.0, 0.0, skirt]])
+        a, b = border[:, 0], border[:, 1]
+        faces = np.concatenate(
+            [
+                np.column_stack([np.full(len(triangles), 3), triangles]).ravel(),
+                np.column_stack([np.full(len(border), 4), a, lowered[a], lowered[b], b]).ravel(),
+            ]
+        )
+        mesh = pv.PolyData(points, faces)
+        mesh["elevation"] = np.concatenate([z, z[hung]])
+        return mesh
+
+    def tile_mesh(self, key: TileKey) -> pv.PolyData | None:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        mesh = self._build_tile(key)
+        self._cache[key] = mesh
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return mesh
+
+    def _distance(self, key: TileKey, camera_position: tuple[float, float, float]) -> float:
+        xmin, ymin, xmax, ymax = self.tile_bounds(key)
+        x, y, z = camera_position
+        dx = max(xmin - x, 0.0, x - xmax)
+        dy = max(ymin - y, 0.0, y - ymax)
+        dz = max(self.z_range[0] - z, 0.0, z - self.z_range[1])
+        return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+    def select(
+        self,
+        camera_position: tuple[float, float, float],
+        detail: float = 2.0,
+        max_tiles: int = 64,
+    ) -> list[TileKey]:
+        """Return the tiles to show from ``camera_position``.
+
+        A tile is split while the camera is closer than ``detail`` times its
+        span, most urgent (smallest distance to span ratio) first, until the
+        selection would exceed ``max_tiles`` tiles.
+        """
+        def entry(key: TileKey) -> tuple[float, TileKey]:
+            span = self.tile_samples * 2 ** (self.max_level - key[0]) * self.pixel_size
+            return self._distance(key, camera_position) / span, key
+
+        selected: list[TileKey] = []
+        heap = [entry((0, 0, 0))]
+        while heap:
+            ratio, key = heapq.heappop(heap)
+            level, tx, ty = key
+            children = [
+                (level + 1, 2 * tx + i, 2 * ty + j)
+                for j in (0, 1)
+                for i in (0, 1)
+                if self._tile_window((level + 1, 2 * tx + i, 2 * ty + j)) is not None
+            ] if level < self.max_level else []
+            n_shown = len(selected) + len(heap) + len(children)
+            if children and ratio < detail and n_shown <= max_tiles:
+                for child in children:
+                    heapq.heappush(heap, entry(child))
+            else:
+                selected.append(key)
+        return selected
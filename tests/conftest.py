@@ -0,0 +1,115 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_bounds
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def surface(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Elevation of the stand-in server's synthetic terrain."""
+    return (0.01 * x + 0.02 * y + np.sin(x / 37.0)).astype(np.float32)
+
+
+def _tiff(bbox: tuple[float, float, float, float], width: int, height: int) -> bytes:
+    xmin, ymin, xmax, ymax = bbox
+    xs = xmin + (np.arange(width) + 0.5) * (xmax - xmin) / width
+    ys = ymax - (np.arange(height) + 0.5) * (ymax - ymin) / height
+    with rasterio.MemoryFile() as mem:
+        with mem.open(
+            driver="GTiff",
+            width=width,
+            height=height,
+            count=1,
+            dtype="float32",
+            transform=from_bounds(xmin, ymin, xmax, ymax, width, height),
+        ) as dst:
+            dst.write(surface(xs[None, :], ys[:, None]), 1)
+        return mem.read()
+
+
+class StandIn:
+    """Local stand-in for the DTM image server and the point elevation API.
+
+    Records every request's query, fails the first ``failures`` requests with
+    ``failure_status`` and tracks the peak number of concurrent requests.
+    """
+
+    def __init__(self) -> None:
+        self.requests: list[dict[str, list[str]]] = []
+        self.failures = 0
+        self.failure_status = 503
+        self.delay = 0.0
+        self.peak_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.url = ""
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        query = parse_qs(urlparse(handler.path).query)
+        with self._lock:
+            self.requests.append(query)
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+            fail = self.failures > 0
+            self.failures -= fail
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if fail:
+                status, ctype, body = self.failure_status, "text/plain", b"busy"
+            elif "punkter" in query:
+                points = json.loads(query["punkter"][0])
+                z = [float(surface(np.float64(x), np.float64(y))) for x, y in points]
+                status, ctype = 200, "application/json"
+                body = json.dumps({"punkter": [{"x": x, "y": y, "z": h} for (x, y), h in zip(points, z)]}).encode()
+            else:
+                bbox = tuple(map(float, query["bbox"][0].split(",")))
+                width, height = map(int, query["size"][0].split(","))
+                status, ctype, body = 200, "image/tiff", _tiff(bbox, width, height)
+            handler.send_response(status)
+            handler.send_header("Content-Type", ctype)
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    """Point the DTM and elevation endpoints at a fresh :class:`StandIn` server."""
+    import dtm
+    import net
+
+    server = StandIn()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            server.handle(self)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{httpd.server_port}"
+    monkeypatch.setattr(dtm, "DTM_IMAGE_SERVER", f"{server.url}/exportImage")
+    monkeypatch.setattr(dtm, "POINT_API", f"{server.url}/punkt")
+    monkeypatch.setattr(dtm, "DTM_CACHE_DIR", tmp_path / "dtm")
+    monkeypatch.setattr(net, "_session", None)
+    try:
+        yield server
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,33 @@
+import numpy as np
+from rasterio.transform import from_origin
+
+from batch import compute_horizon_profiles, map_shared
+
+TRANSFORM = from_origin(0.0, 400.0, 2.0, 2.0)
+XY = [(50, 50), (150, 300), (320, 200)]
+
+
+def _terrain() -> np.ndarray:
+    yy, xx = np.mgrid[0:200, 0:200] * 2.0
+    return (30 * np.exp(-((xx - 250) ** 2 + (yy - 120) ** 2) / 4000) + 0.02 * xx).astype(np.float32)
+
+
+def _sum_row(arrays, row):
+    return float(arrays[0][row].sum())
+
+
+def test_pool_profiles_equal_serial():
+    dtm = _terrain()
+    viewpoints = [(x, y, float(dtm[int((400 - y) / 2), int(x / 2)]) + 1.6) for x, y in XY]
+    house = [(100, 100), (120, 100), (120, 115), (100, 115)]
+    kwargs = dict(azimuth_step=2.0, max_distance=300.0, house_polygon=house, house_base=0.0, house_height=12.0)
+    serial = compute_horizon_profiles(dtm, TRANSFORM, viewpoints, max_workers=1, **kwargs)
+    pooled = compute_horizon_profiles(dtm, TRANSFORM, viewpoints, max_workers=2, **kwargs)
+    np.testing.assert_array_equal(pooled, serial)
+    assert serial.shape == (3, 180) and not np.isnan(serial).any()
+
+
+def test_map_shared_without_setup():
+    arrays = [np.arange(12.0).reshape(3, 4)]
+    results = dict(map_shared(_sum_row, [2, 0, 1], arrays, max_workers=2))
+    assert results == {0: 38.0, 1: 6.0, 2: 22.0}
@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+import numpy as np
+from rasterio.transform import from_origin
+
+import bundle
+from acquire import SceneData
+from config import tranoy_example
+from raster import QuantizedRaster
+
+
+def test_parts_are_evicted_least_recently_used(monkeypatch, tmp_path):
+    monkeypatch.setattr(bundle, "BUNDLE_DIR", tmp_path)
+    monkeypatch.setattr(bundle, "BUNDLE_KEEP", 2)
+    for t, key in enumerate(["a", "b"]):
+        bundle._write_part("house", key, {"x": np.zeros(3)}, {})
+        os.utime(bundle._part_dir("house", key), (t, t))
+    # Reading "a" makes "b" the least recently used.
+    assert bundle._read_part("house", "a") is not None
+    bundle._write_part("house", "c", {"x": np.ones(3)}, {})
+    bundle._write_part("scene", "a", {}, {})
+
+    assert bundle._read_part("house", "b") is None
+    assert bundle._read_part("house", "a") is not None
+    assert bundle._read_part("house", "c") is not None
+    assert bundle._read_part("scene", "a") is not None
+
+
+def test_scene_dtm_is_stored_quantized(monkeypatch, tmp_path):
+    monkeypatch.setattr(bundle, "BUNDLE_DIR", tmp_path)
+    heights = (np.arange(120.0).reshape(10, 12) * 0.37 + 5).astype(np.float32)
+    heights[2, 3] = np.nan
+    scene = SceneData(heights, from_origin(0.0, 10.0, 1.0, 1.0), 7.0, [], [], None, None)
+    calls = []
+
+    async def load_scene(cfg, bbox):
+        calls.append(bbox)
+        return scene
+
+    monkeypatch.setattr(bundle, "load_scene", load_scene)
+    cfg = tranoy_example()
+    for _ in range(2):
+        loaded = asyncio.run(bundle.load_bundle(cfg, (0.0, 0.0, 12.0, 10.0)))
+    assert len(calls) == 1
+    assert isinstance(loaded.dtm, QuantizedRaster) and loaded.dtm.values.dtype == np.uint16
+    assert loaded.dtm[2:4, 3:5].dtype == np.float32
+    np.testing.assert_allclose(np.asarray(loaded.dtm), heights, atol=loaded.dtm.scale / 2 + 1e-4, equal_nan=True)
@@ -0,0 +1,36 @@
+import numpy as np
+from rasterio.transform import from_origin
+
+from dsm import SurfaceModel
+
+TRANSFORM = from_origin(0.0, 100.0, 1.0, 1.0)
+BUILDINGS = [
+    {"polygon": [(10, 10), (20, 10), (20, 20), (10, 20)], "height": 8.0, "base": 0.0},
+    {"polygon": [(50, 50), (60, 50), (60, 60), (50, 60)], "height": 12.0, "base": 0.0},
+]
+
+
+def test_buildings_are_burned_in():
+    surface = SurfaceModel(np.zeros((100, 100)), TRANSFORM, BUILDINGS)
+    assert surface.dsm[85, 15] == 8.0
+    assert surface.dsm[45, 55] == 12.0
+
+
+def test_building_containing_viewpoint_is_left_out():
+    surface = SurfaceModel(np.zeros((100, 100)), TRANSFORM, BUILDINGS, exclude_xy=(15.0, 15.0))
+    assert surface.dsm[85, 15] == 0.0
+    assert surface.dsm[45, 55] == 12.0
+
+
+def test_set_house_restores_only_its_window():
+    surface = SurfaceModel(np.zeros((100, 100)), TRANSFORM, BUILDINGS, strip_rows=7)
+    before = surface.dsm.copy()
+    house = [(15, 12), (30, 12), (30, 18), (15, 18)]
+    surface.set_house(house, 0.0, 20.0)
+    assert surface.dsm[85, 25] == 20.0
+    np.testing.assert_array_equal(surface.without_house(), before)
+    surface.set_house(house, 0.0, 4.0)
+    # The lower house sits under the taller existing roof where they overlap.
+    assert surface.dsm[85, 25] == 4.0 and surface.dsm[85, 15] == 8.0
+    surface.set_house(None)
+    np.testing.assert_array_equal(surface.dsm, before)
@@ -0,0 +1,47 @@
+import numpy as np
+
+import dtm
+from conftest import surface
+
+
+def _requested_tiles(query: dict[str, list[str]], resolution: float) -> set[tuple[int, int]]:
+    span = dtm.DTM_TILE_SIZE * resolution
+    xmin, ymin, xmax, ymax = map(float, query["bbox"][0].split(","))
+    return {
+        (tx, ty)
+        for ty in range(round(ymin / span), round(ymax / span))
+        for tx in range(round(xmin / span), round(xmax / span))
+    }
+
+
+def test_tile_rectangles_cover_only_missing():
+    # An L shape around a cached tile at (1, 1).
+    missing = [(0, 0), (1, 0), (2, 0), (0, 1), (0, 2), (2, 2)]
+    rects = dtm._tile_rectangles(missing, max_tiles=30)
+    covered = [(tx, ty) for tx0, ty0, tx1, ty1 in rects for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+    assert sorted(covered) == sorted(missing)
+    assert len(rects) == 3
+
+
+def test_tile_rectangles_respect_request_size():
+    missing = [(tx, 0) for tx in range(7)]
+    rects = dtm._tile_rectangles(missing, max_tiles=3)
+    assert rects == [(0, 0, 2, 0), (3, 0, 5, 0), (6, 0, 6, 0)]
+
+
+def test_fetch_skips_cached_tiles(standin):
+    resolution = 1.0
+    span = dtm.DTM_TILE_SIZE * resolution
+    x0, y0 = 527 * span, 7563 * span
+
+    # Warm the cache with the middle tile of a 3 x 1 row.
+    dtm.fetch_dtm_raster((x0 + span, y0, x0 + 2 * span, y0 + span), resolution)
+    assert len(standin.requests) == 1
+
+    data, transform = dtm.fetch_dtm_raster((x0, y0, x0 + 3 * span, y0 + span), resolution)
+    requested = set().union(*(_requested_tiles(q, resolution) for q in standin.requests[1:]))
+    assert requested == {(527, 7563), (529, 7563)}
+
+    rows, cols = np.mgrid[0 : data.shape[0], 0 : data.shape[1]] + 0.5
+    xs, ys = transform @ (cols, rows)
+    np.testing.assert_allclose(data, surface(xs, ys), atol=1e-3)
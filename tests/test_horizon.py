@@ -0,0 +1,168 @@
+import math
+
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+
+from horizon import (
+    azimuth_weights,
+    build_max_pyramid,
+    compute_adaptive_horizon_profile,
+    compute_horizon_profile,
+    compute_obstruction,
+    footprint_azimuth_mask,
+    occluder_angles,
+    sample_terrain,
+)
+
+AZIMUTHS = np.arange(0.25, 360.0, 0.5)
+# U-shaped footprint opening to the north, 30 m wide with a 10 m notch.
+U_SHAPE = [(0, 0), (30, 0), (30, 30), (20, 30), (20, 10), (10, 10), (10, 30), (0, 30)]
+TERRAIN_TRANSFORM = from_origin(1000.0, 1300.0, 2.0, 2.0)
+RAY_AZIMUTHS = np.array([0.0, 37.5, 90.0, 181.3, 226.0, 270.0, 333.3])
+
+
+def _crossed(viewpoint_xy, polygon):
+    return occluder_angles((*viewpoint_xy, 0.0), AZIMUTHS, [polygon], np.array([10.0]), 1e4) > -90
+
+
+@pytest.mark.parametrize(
+    "viewpoint_xy",
+    [
+        (15.0, 20.0),  # in the notch
+        (15.0, 29.0),  # at the mouth of the notch
+        (25.0, 35.0),  # north of one arm
+        (15.0, -20.0),  # outside the convex hull
+        (45.0, 15.0),
+    ],
+)
+def test_mask_matches_ray_crossings(viewpoint_xy):
+    mask = footprint_azimuth_mask(viewpoint_xy, U_SHAPE, AZIMUTHS)
+    np.testing.assert_array_equal(mask, _crossed(viewpoint_xy, U_SHAPE))
+
+
+def test_mask_inside_footprint_is_full():
+    assert footprint_azimuth_mask((5.0, 5.0), U_SHAPE, AZIMUTHS).all()
+
+
+def test_mask_without_footprint_is_empty():
+    assert not footprint_azimuth_mask((5.0, 5.0), None, AZIMUTHS).any()
+
+
+def _rugged_terrain() -> np.ndarray:
+    yy, xx = np.mgrid[0:150, 0:230] * 2.0
+    ridge = 40 * np.exp(-((xx - 300) ** 2) / 800 - ((yy - 120) ** 2) / 20000)
+    return (ridge + 8 * np.sin(xx / 23.0) * np.cos(yy / 17.0) + 0.03 * yy).astype(np.float32)
+
+
+def _reference_profile(dtm, transform, viewpoint_xyz, azimuths, max_distance, sample_step):
+    # One ray at a time, one sample at a time, as the profile was first written.
+    vx, vy, vz = viewpoint_xyz
+    angles = []
+    for azimuth in azimuths:
+        dx, dy = math.sin(math.radians(azimuth)), math.cos(math.radians(azimuth))
+        best = -90.0
+        d = sample_step
+        while d <= max_distance:
+            z = sample_terrain(dtm, transform, vx + dx * d, vy + dy * d)
+            if not math.isnan(z):
+                best = max(best, math.degrees(math.atan2(z - vz, d)))
+            d += sample_step
+        angles.append(best)
+    return np.array(angles)
+
+
+@pytest.mark.parametrize(
+    "viewpoint_xy, chunk_size",
+    [
+        ((1200.0, 1150.0), 1_000_000),
+        ((1200.0, 1150.0), 97),  # many small chunks per angular bin
+        ((1003.0, 1010.0), 1_000_000),  # near the corner, most rays leave the raster
+    ],
+)
+def test_profile_matches_per_ray_reference(viewpoint_xy, chunk_size):
+    dtm = _rugged_terrain()
+    viewpoint = (*viewpoint_xy, sample_terrain(dtm, TERRAIN_TRANSFORM, *viewpoint_xy) + 1.6)
+    profile = compute_horizon_profile(
+        dtm,
+        TERRAIN_TRANSFORM,
+        viewpoint,
+        1.0,
+        400.0,
+        sample_step=1.5,
+        chunk_size=chunk_size,
+        window_pixels=64,
+        azimuths=RAY_AZIMUTHS,
+    )
+    expected = _reference_profile(dtm, TERRAIN_TRANSFORM, viewpoint, RAY_AZIMUTHS, 400.0, 1.5)
+    np.testing.assert_array_equal(profile[:, 0], RAY_AZIMUTHS)
+    np.testing.assert_allclose(profile[:, 1], expected, rtol=0, atol=1e-9)
+
+
+def test_max_pyramid_levels_match_block_maxima():
+    dtm = _rugged_terrain()
+    dtm[77, 100] = np.nan
+    levels = build_max_pyramid(dtm, strip_rows=33)
+    for k, level in enumerate(levels, start=1):
+        size = 2**k
+        assert level.shape == (-(-dtm.shape[0] // size), -(-dtm.shape[1] // size))
+        r, c = 37 % level.shape[0], 51 % level.shape[1]
+        block = dtm[r * size : (r + 1) * size, c * size : (c + 1) * size]
+        assert level[r, c] == np.nanmax(block)
+    assert levels[-1].shape == (1, 1) and levels[-1][0, 0] == np.nanmax(dtm)
+
+
+@pytest.mark.parametrize("peak", [(63, 64), (64, 127), (128, 128), (149, 63)])
+def test_pyramid_pruning_matches_full_trace(peak):
+    # 150 x 230 is not a power of two, and each visible spike sits on the edge
+    # of a pyramid block (row 149 in the padded last one) where a bounding box
+    # off by one pixel would miss it.
+    dtm = _rugged_terrain()
+    dtm[peak] += 60.0
+    viewpoint_xy = (1210.0, 1140.0)
+    viewpoint = (*viewpoint_xy, sample_terrain(dtm, TERRAIN_TRANSFORM, *viewpoint_xy) + 1.6)
+    kwargs = dict(sample_step=0.7, window_pixels=256)
+    pruned = compute_horizon_profile(
+        dtm, TERRAIN_TRANSFORM, viewpoint, 0.25, 600.0, pyramid=build_max_pyramid(dtm), **kwargs
+    )
+    full = compute_horizon_profile(dtm, TERRAIN_TRANSFORM, viewpoint, 0.25, 600.0, **kwargs)
+    np.testing.assert_array_equal(pruned, full)
+
+
+def test_adaptive_refinement_only_near_edges():
+    # A gentle slope with a 20 m block east of the viewpoint; the block's
+    # silhouette edges are the only sharp changes in the horizon.
+    transform = from_origin(0.0, 400.0, 2.0, 2.0)
+    rows, cols = np.mgrid[0:200, 0:200]
+    xs, ys = transform * (cols, rows)
+    dtm = (0.02 * xs + 0.01 * ys).astype(np.float32)
+    dtm[(xs >= 260) & (xs <= 300) & (ys >= 190) & (ys <= 230)] += 20
+    viewpoint = (200.0, 200.0, 0.02 * 200 + 0.01 * 200 + 1.6)
+    footprint = [(170.0, 160.0), (180.0, 160.0), (180.0, 170.0), (170.0, 170.0)]
+
+    profile = compute_adaptive_horizon_profile(
+        dtm, transform, viewpoint, 180.0, 0.25, 4.0, 0.0625, footprint=footprint, footprint_top=15.0
+    )
+    azimuths = profile[:, 0]
+    block_edges = np.degrees(np.arctan2([60, 100, 60, 100], [30, 30, -10, -10]))
+    corners = np.degrees(np.arctan2(*(np.array(footprint) - viewpoint[:2]).T)) % 360
+    extra = azimuths[azimuths % 4 != 0]
+    near = np.abs((extra[:, None] - np.concatenate([block_edges, corners]) + 180) % 360 - 180).min(axis=1)
+    assert len(extra) > 10 and (near <= 4.0).all()
+    assert np.diff(azimuths).min() >= 0.0625
+    # The footprint is only refined around, never added to the terrain profile.
+    direct = compute_horizon_profile(dtm, transform, viewpoint, 4.0, 180.0, azimuths=azimuths)
+    np.testing.assert_array_equal(profile, direct)
+
+
+def test_trapezoid_obstruction_matches_uniform_step():
+    rng = np.random.default_rng(3)
+    azimuths = np.arange(0, 360, 0.5)
+    without = np.column_stack([azimuths, rng.normal(2, 1, len(azimuths))])
+    with_house = np.column_stack([azimuths, without[:, 1] + np.clip(rng.normal(0, 3, len(azimuths)), 0, None)])
+    uniform = compute_obstruction(without, with_house, 0.5)
+    weighted = compute_obstruction(without, with_house)
+    np.testing.assert_array_equal(azimuth_weights(azimuths), 0.5)
+    np.testing.assert_array_equal(weighted["delta_per_azimuth"], uniform["delta_per_azimuth"])
+    for key in ("max_delta_deg", "mean_delta_deg", "blocked_solid_angle_sr"):
+        assert weighted[key] == pytest.approx(uniform[key], rel=1e-12)
@@ -0,0 +1,14 @@
+import collections
+
+import instrument
+
+
+def test_records_are_bounded(monkeypatch):
+    monkeypatch.setattr(instrument, "ENABLED", True)
+    monkeypatch.setattr(instrument, "METRICS_LOG", None)
+    monkeypatch.setattr(instrument, "_records", collections.deque(maxlen=3))
+    for i in range(5):
+        with instrument.stage(f"stage{i}"):
+            instrument.note(i=i)
+    assert [r["stage"] for r in instrument.records()] == ["stage2", "stage3", "stage4"]
+    assert "stage4" in instrument.summary()
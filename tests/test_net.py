@@ -0,0 +1,48 @@
+import asyncio
+
+import numpy as np
+import pytest
+import requests
+import urllib3.util.retry
+
+import acquire
+import dtm
+from conftest import surface
+
+POINTS = [(527000.0 + 3 * i, 7563000.0 + 2 * i) for i in range(1000)]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays urllib3 would have slept, without sleeping.
+
+    This replaces ``time.sleep`` for the whole process, so the stand-in's
+    ``delay`` is not honoured while it is active.
+    """
+    slept: list[float] = []
+    monkeypatch.setattr(urllib3.util.retry.time, "sleep", slept.append)
+    return slept
+
+
+def test_transient_errors_are_retried(standin, sleeps):
+    standin.failures = 2
+    assert dtm.fetch_point_batch(POINTS[:5]) == pytest.approx([surface(x, y) for x, y in POINTS[:5]], abs=1e-4)
+    assert len(standin.requests) == 3
+
+
+def test_retries_give_up_with_exponential_backoff(standin, sleeps):
+    standin.failures = 100
+    with pytest.raises(requests.HTTPError):
+        dtm.fetch_point_batch(POINTS[:5])
+    # One attempt plus four retries; the first retry is immediate.
+    assert len(standin.requests) == 5
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_point_batches_are_bounded_in_flight(standin):
+    standin.delay = 0.05
+    z = asyncio.run(acquire.fetch_point_elevation_async(POINTS, max_in_flight=3))
+    assert len(standin.requests) == len(POINTS) // dtm.POINT_BATCH_SIZE
+    assert 1 < standin.peak_in_flight <= 3
+    xs, ys = np.array(POINTS).T
+    np.testing.assert_allclose(z, surface(xs, ys), atol=1e-4)
@@ -0,0 +1,58 @@
+import numpy as np
+
+import osm
+
+# Building squares on a 250 m lattice over cells (527, 7563) to (529, 7565),
+# plus one straddling the corner shared by four cells.
+SQUARES = [(x, y) for x in range(527_050, 530_000, 250) for y in range(7_563_050, 7_566_000, 250)] + [
+    (528_000 - 5, 7_564_000 - 5)
+]
+
+
+def _square(i, x, y):
+    ring = np.array([(x, y), (x + 10, y), (x + 10, y + 10), (x, y + 10), (x, y)], dtype=np.float64)
+    lon, lat = osm.UTM_TO_WGS84.transform(ring[:, 0], ring[:, 1])
+    return {
+        "type": "way",
+        "id": i,
+        "tags": {"building": "yes", "highway": "service"},
+        "geometry": [{"lat": a, "lon": o} for o, a in zip(lon, lat)],
+    }
+
+
+def _fake_overpass(queries):
+    ways = [_square(i, x, y) for i, (x, y) in enumerate(SQUARES)]
+
+    def overpass_ways(selectors, bbox_25833):
+        queries.append((tuple(s.split("[")[1].split("]")[0].strip('"') for s in selectors), bbox_25833))
+        xmin, ymin, xmax, ymax = bbox_25833
+        for way, (x, y) in zip(ways, SQUARES):
+            if x <= xmax and x + 10 >= xmin and y <= ymax and y + 10 >= ymin:
+                yield way
+
+    return overpass_ways
+
+
+def test_missing_cells_are_fetched_in_rectangles(monkeypatch, tmp_path):
+    queries = []
+    monkeypatch.setattr(osm, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(osm, "_overpass_ways", _fake_overpass(queries))
+    centre = (528_100.0, 7_564_100.0, 528_900.0, 7_564_900.0)
+    osm.load_osm_layers(["buildings"], centre)
+    assert queries == [(("building",), (528_000.0, 7_564_000.0, 529_000.0, 7_565_000.0))]
+
+    queries.clear()
+    bbox = (527_000.0, 7_563_000.0, 529_999.0, 7_565_999.0)
+    layers = osm.load_osm_layers(["buildings", "roads"], bbox)
+    # The cached centre cell is only asked for roads; no other query covers it.
+    assert (("highway",), (528_000.0, 7_564_000.0, 529_000.0, 7_565_000.0)) in queries
+    for selectors, (xmin, ymin, xmax, ymax) in queries:
+        if selectors != ("highway",):
+            assert xmax <= 528_000 or xmin >= 529_000 or ymax <= 7_564_000 or ymin >= 7_565_000
+    assert len(queries) == 5
+    for ways in layers.values():
+        assert sorted(ways.ids.tolist()) == list(range(len(SQUARES)))
+
+    queries.clear()
+    osm.load_osm_layers(["buildings", "roads"], bbox)
+    assert queries == []
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from raster import QuantizedRaster, quantize_heights
+
+
+@pytest.mark.parametrize("strip_rows", [1, 3, 64])
+def test_quantize_round_trip(strip_rows):
+    rng = np.random.default_rng(0)
+    heights = (rng.random((40, 30)) * 800 - 5).astype(np.float32)
+    heights[:5] = np.nan  # an all-NaN strip must not disturb the range
+    heights[rng.random(heights.shape) < 0.1] = np.nan
+    q = quantize_heights(heights, strip_rows=strip_rows)
+    assert q.offset == pytest.approx(np.nanmin(heights))
+    decoded = np.asarray(q)
+    np.testing.assert_array_equal(np.isnan(decoded), np.isnan(heights))
+    np.testing.assert_allclose(decoded, heights, atol=q.scale / 2 + 1e-4, equal_nan=True)
+
+
+def test_quantize_all_no_data():
+    q = quantize_heights(np.full((4, 4), np.nan, dtype=np.float32), strip_rows=2)
+    assert (q.values == QuantizedRaster.NODATA).all()
+
+
+def test_quantize_range_too_wide():
+    with pytest.raises(ValueError):
+        quantize_heights(np.array([[0.0, 1000.0]]), scale=0.001)
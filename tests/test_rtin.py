@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from rtin import _pad_to_grid, rtin_errors, rtin_mesh, rtin_triangles
+
+
+def _reference_errors(grid: np.ndarray) -> np.ndarray:
+    # Martini's scalar loop: every triangle by id, smallest first.
+    n = grid.shape[0] - 1
+    errors = np.zeros(grid.shape)
+    n_smallest = n * n
+    n_triangles = 2 * n_smallest - 2
+    n_parents = n_triangles - n_smallest
+    for i in range(n_triangles - 1, -1, -1):
+        tid = i + 2
+        a, b, c = ((0, 0), (n, n), (0, n)) if tid & 1 else ((n, n), (0, 0), (n, 0))
+        tid >>= 1
+        while tid > 1:
+            m = ((a[0] + b[0]) // 2, (a[1] + b[1]) // 2)
+            a, b = (c, a) if tid & 1 else (b, c)
+            c = m
+            tid >>= 1
+        m = ((a[0] + b[0]) // 2, (a[1] + b[1]) // 2)
+        za, zb, zm = grid[a], grid[b], grid[m]
+        if np.isnan(za) and np.isnan(zb) and np.isnan(zm):
+            err = 0.0
+        else:
+            err = abs(0.5 * (za + zb) - zm)
+            err = np.inf if np.isnan(err) else err
+        errors[m] = max(errors[m], err)
+        if i < n_parents:
+            left = ((a[0] + c[0]) // 2, (a[1] + c[1]) // 2)
+            right = ((b[0] + c[0]) // 2, (b[1] + c[1]) // 2)
+            errors[m] = max(errors[m], errors[left], errors[right])
+    return errors
+
+
+@pytest.mark.parametrize("size", [3, 5, 17, 33])
+def test_errors_match_recursive_reference(size):
+    rng = np.random.default_rng(size)
+    grid = (rng.random((size, size)) * 20).astype(np.float32)
+    grid[rng.random(grid.shape) < 0.05] = np.nan
+    np.testing.assert_allclose(rtin_errors(grid), _reference_errors(grid), rtol=1e-6)
+
+
+def test_plane_needs_two_triangles():
+    rows, cols = np.mgrid[0:17, 0:17]
+    grid = (0.5 * rows + 0.25 * cols).astype(np.float32)
+    assert len(rtin_triangles(rtin_errors(grid), 1e-3)) == 2
+
+
+@pytest.mark.parametrize("shape", [(17, 65), (33, 200), (40, 17)])
+def test_strip_is_meshed_in_blocks_without_cracks(shape):
+    rng = np.random.default_rng(shape[1])
+    heights = np.cumsum(np.cumsum(rng.normal(size=shape), axis=0), axis=1).astype(np.float32)
+    grid = _pad_to_grid(heights)
+    # Padded to a row of squares of the short side, not to one big square.
+    assert min(grid.shape) - 1 == 2 ** int(np.ceil(np.log2(min(shape) - 1)))
+    assert max(grid.shape) - max(shape) < min(grid.shape)
+
+    vertices, triangles = rtin_mesh(heights, 4.0)
+    corners = vertices[triangles].astype(np.float64)
+    d1, d2 = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    area = 0.5 * np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]).sum()
+    assert area == (shape[0] - 1) * (shape[1] - 1)
+    # Every edge inside the raster is shared by two triangles: no T-junctions
+    # where neighbouring blocks meet.
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique, counts = np.unique(edges, axis=0, return_counts=True)
+    ends = vertices[unique[counts == 1]]
+    on_border = ((ends[..., 0] == 0) | (ends[..., 0] == shape[0] - 1)).all(axis=1) | (
+        (ends[..., 1] == 0) | (ends[..., 1] == shape[1] - 1)
+    ).all(axis=1)
+    assert on_border.all() and counts.max() == 2
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import scenarios
+from config import Config
+
+
+def _cfg(x: float, y: float, height: float = 6.0, radius: float = 100.0) -> Config:
+    house = [(x + 10, y + 10), (x + 20, y + 10), (x + 20, y + 20), (x + 10, y + 20)]
+    return Config((x, y), house, (x, y, 0.0), 0.0, height, analysis_radius=radius)
+
+
+def _fake_result(cfg: Config, n_azimuths: int) -> dict:
+    azimuths = np.arange(n_azimuths) * (360.0 / n_azimuths)
+    profile = np.column_stack([azimuths, np.full(n_azimuths, cfg.house_height)])
+    return {
+        "profile_without": profile,
+        "profile_with": profile + [0.0, 1.0],
+        "obstruction": {name: cfg.viewpoint[0] for name in scenarios._METRICS},
+        "sun": {"lost_hours": cfg.house_height, "month_lost": np.arange(12.0)},
+        "year": 2025,
+    }
+
+
+@pytest.fixture
+def analysed(monkeypatch):
+    """Replace the group analysis with a fake and record which scenarios it saw."""
+    seen: list[Config] = []
+
+    def fake_group(group, bbox, year, max_workers):
+        for i, cfg in enumerate(group):
+            seen.append(cfg)
+            yield i, _fake_result(cfg, 4 + i)
+
+    monkeypatch.setattr(scenarios, "_analyse_group", fake_group)
+    return seen
+
+
+def test_rerun_skips_computed_scenarios(tmp_path, analysed):
+    path = tmp_path / "results.npz"
+    first = [_cfg(0, 0), _cfg(50, 0)]
+    scenarios.run_scenarios(first, path, year=2025)
+    assert len(analysed) == 2
+
+    # Display-only settings do not change the key; a new height does.
+    moved_camera = Config(**{**first[0].__dict__, "center_xyz": (1.0, 2.0, 3.0)})
+    results = scenarios.run_scenarios([moved_camera, _cfg(50, 0, height=9.0)], path, year=2025)
+    assert len(analysed) == 3 and analysed[-1].house_height == 9.0
+    assert len(results["key"]) == 3
+    assert scenarios.scenario_key(moved_camera, 2025) == scenarios.scenario_key(first[0], 2025)
+    assert scenarios.scenario_key(first[0], 2025) != scenarios.scenario_key(first[0], 2026)
+
+
+def test_append_results_merges_profile_offsets(tmp_path):
+    cfgs = [_cfg(0, 0), _cfg(5, 0), _cfg(9, 0)]
+    path = tmp_path / "results.npz"
+    first = scenarios._result_columns(["a", "b"], cfgs[:2], [_fake_result(cfgs[0], 4), _fake_result(cfgs[1], 6)])
+    merged = scenarios._append_results(path, {}, first)
+    second = scenarios._result_columns(["c"], cfgs[2:], [_fake_result(cfgs[2], 3)])
+    merged = scenarios._append_results(path, merged, second)
+
+    stored = scenarios.read_results(path)
+    np.testing.assert_array_equal(stored["offsets"], [0, 4, 10, 13])
+    np.testing.assert_array_equal(stored["key"], ["a", "b", "c"])
+    np.testing.assert_array_equal(stored["viewpoint"][:, 0], [0, 5, 9])
+    # Rows offsets[i]:offsets[i + 1] belong to scenario i.
+    c = slice(stored["offsets"][2], stored["offsets"][3])
+    np.testing.assert_allclose(stored["azimuth"][c], [0, 120, 240])
+    assert stored["month_lost_hours"].shape == (3, 12)
+
+
+def test_group_scenarios_joins_overlapping_areas(monkeypatch):
+    monkeypatch.setattr(scenarios, "MAX_GROUP_SPAN", 500.0)
+    cfgs = [
+        _cfg(0, 0),
+        _cfg(150, 0),  # overlaps the first
+        _cfg(5000, 0),  # far away
+        _cfg(280, 0),  # overlaps the union of the first two
+        _cfg(450, 0),  # overlaps, but the union would span more than 500 m
+    ]
+    cfgs.append(Config(**{**cfgs[1].__dict__, "dtm_resolution": 2.0}))  # another source
+    groups = sorted(sorted(indices) for _, indices in scenarios._group_scenarios(cfgs))
+    assert groups == [[0, 1, 3], [2], [4], [5]]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+
+from horizon import compute_horizon_profile
+from session import AnalysisSession
+
+TRANSFORM = from_origin(0.0, 600.0, 2.0, 2.0)
+VIEWPOINT = (300.0, 300.0, 12.0)
+
+
+def _terrain() -> np.ndarray:
+    yy, xx = np.mgrid[0:300, 0:300] * 2.0
+    return (25 * np.exp(-((xx - 450) ** 2 + (yy - 150) ** 2) / 6000) + 0.01 * yy).astype(np.float32)
+
+
+def _house(dx, dy, size=12.0):
+    x, y = VIEWPOINT[0] + dx, VIEWPOINT[1] + dy
+    return [(x, y), (x + size, y), (x + size, y + size * 0.6), (x + size / 2, y + size), (x, y + size * 0.6)]
+
+
+def test_house_edits_equal_fresh_profiles():
+    dtm = _terrain()
+    session = AnalysisSession(dtm, TRANSFORM, VIEWPOINT, 0.5, 400.0)
+    edits = [
+        (_house(20, 15), 10.0, 6.0),
+        (_house(20, 15), 10.0, 14.0),  # raised
+        (_house(-40, 5), 10.0, 14.0),  # moved
+        (_house(-12, -30, size=25.0), 8.0, 4.0),  # moved, lowered and widened
+    ]
+    for polygon, base, height in edits:
+        obst = session.set_house(polygon, base, height)
+        fresh = compute_horizon_profile(
+            dtm, TRANSFORM, VIEWPOINT, 0.5, 400.0, house_polygon=polygon, house_base=base, house_height=height
+        )
+        np.testing.assert_array_equal(session.profile_with, fresh)
+        assert obst["max_delta_deg"] == pytest.approx(np.max(fresh[:, 1] - session.profile_without[:, 1]))
+
+    session.set_house(None)
+    np.testing.assert_array_equal(session.profile_with, session.profile_without)
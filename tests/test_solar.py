@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from config import tranoy_example
+from solar import _geographic, compute_sun_hours, sun_positions
+
+VIEWPOINT = tranoy_example().viewpoint
+# No obstruction: the sun counts as visible whenever it is up.
+OPEN_SKY = np.column_stack([np.arange(0, 360, 1.0), np.full(360, -90.0)])
+
+
+def _day(date: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    lon, lat, _ = _geographic(*VIEWPOINT, 25833)
+    times = np.datetime64(f"{date}T00:00", "m") + np.arange(1440)
+    return (times, *sun_positions(times, lat, lon))
+
+
+def test_solstice_noon_elevation():
+    lon, lat, _ = _geographic(*VIEWPOINT, 25833)
+    assert (lat, lon) == pytest.approx((68.183, 15.658), abs=1e-3)
+    times, azimuth, elevation = _day("2024-06-20")
+    noon = int(np.argmax(elevation))
+    # NOAA: declination 23.44 deg, so 90 - 68.18 + 23.44 plus about one
+    # arc-minute of refraction, due south at 10:59 UTC (solar noon at 15.66 E).
+    assert elevation[noon] == pytest.approx(90 - lat + 23.44 + 0.016, abs=0.03)
+    assert azimuth[noon] == pytest.approx(180.0, abs=0.5)
+    assert times[noon] == np.datetime64("2024-06-20T10:59")
+    # Midnight sun: lat + 23.44 - 90 at solar midnight, lifted by about
+    # 0.3 deg of refraction that close to the horizon.
+    assert elevation.min() == pytest.approx(lat + 23.44 - 90 + 0.31, abs=0.05)
+
+
+def test_polar_night_at_tranoy():
+    _, _, elevation = _day("2024-12-21")
+    assert elevation.max() == pytest.approx(90 - 68.18 - 23.44, abs=0.05)
+
+    sun = compute_sun_hours(OPEN_SKY, OPEN_SKY, VIEWPOINT, 2024)
+    dates = np.datetime64("2024-01-01") + np.arange(len(sun["day_without"]))
+    hours = dict(zip(dates.astype(str), sun["day_without"]))
+    # The sun stays below the horizon from early December into January and
+    # never sets from late May to mid July.
+    assert all(hours[f"2024-12-{d:02d}"] == 0 for d in range(8, 32))
+    assert all(hours[f"2024-01-{d:02d}"] == 0 for d in range(1, 6))
+    assert hours["2024-11-25"] > 0 and hours["2024-01-15"] > 0
+    assert hours["2024-06-21"] == 24.0
+    assert sun["month_without"][11] < sun["month_without"][10] and sun["lost_hours"] == 0.0
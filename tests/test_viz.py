@@ -0,0 +1,40 @@
+import numpy as np
+from rasterio.transform import from_origin
+
+from horizon import sample_terrain
+from viz import build_osm_buildings_mesh, build_terrain_tin
+
+# Terrain rising 1 m per metre eastwards, so a wrong base is easy to spot.
+TRANSFORM = from_origin(0.0, 100.0, 1.0, 1.0)
+DTM = np.tile(np.arange(100, dtype=np.float32) + 0.5, (100, 1))
+
+
+def test_degenerate_ring_does_not_shift_bases():
+    buildings = [
+        {"polygon": [(80, 80), (81, 81), (80, 80)], "height": 5.0},
+        {"polygon": [(10, 10), (20, 10), (20, 20), (10, 20), (10, 10)], "height": 6.0},
+    ]
+    mesh = build_osm_buildings_mesh(buildings, DTM, TRANSFORM)
+    assert set(np.unique(mesh.cell_data["building_id"])) == {1}
+    # The base is the terrain at the footprint's own centroid.
+    base = sample_terrain(DTM, TRANSFORM, 15.0, 15.0)
+    z = mesh.points[:, 2]
+    np.testing.assert_allclose([z.min(), z.max()], [base, base + 6.0], atol=1e-6)
+
+
+def test_tin_of_no_data_is_none():
+    assert build_terrain_tin(np.full((17, 17), np.nan, dtype=np.float32), TRANSFORM) is None
+    assert build_terrain_tin(DTM[:17, :17], TRANSFORM).n_cells > 0
+
+
+def test_self_intersecting_footprint_is_repaired():
+    buildings = [
+        {"polygon": [(30, 30), (40, 40), (40, 30), (30, 40), (30, 30)], "height": 5.0},
+        {"polygon": [(10, 10), (20, 10), (20, 20), (10, 20), (10, 10)], "height": 6.0},
+    ]
+    mesh = build_osm_buildings_mesh(buildings, DTM, TRANSFORM)
+    ids = mesh.cell_data["building_id"]
+    assert set(np.unique(ids)) == {0, 1}
+    # The bowtie becomes two triangles: 6 walls plus a roof and a floor each.
+    assert np.count_nonzero(ids == 0) == 10
+    assert mesh.points[:, 0].min() == 10.0 and mesh.points[:, 0].max() == 40.0
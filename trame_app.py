@@ -1,22 +1,52 @@
 import asyncio
+import dataclasses
+import os
 import sys
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 
 from trame.app import get_server
 from trame.ui.vuetify3 import SinglePageLayout
-from trame.widgets import vuetify3, vtk
+from trame.widgets import html, vuetify3, vtk
 
+import numpy as np
 import pyvista as pv
 from pyvista.trame.ui import plotter_ui
+from rasterio.transform import Affine
 
+import instrument
+from bundle import SceneBundle, load_bundle
 from config import Config, tranoy_example
-from dtm import fetch_dtm_raster, fetch_point_elevation
-from osm import fetch_osm_buildings, fetch_osm_roads
-from viz import (
-    build_house_mesh,
-    build_osm_buildings_mesh,
-    build_osm_roads_mesh,
-    build_terrain_mesh,
-)
+from dsm import SurfaceModel
+from horizon import build_max_pyramid, buildings_containing, sample_terrain
+from main import horizon_session, house_results
+from osm import fetch_osm_buildings
+from session import AnalysisSession
+from terrain_tiles import TerrainTileTree
+from viz import build_house_mesh
+
+ANALYSIS_WORKERS = 2
+# (azimuth step, DTM decimation) of each analysis pass, coarse first; the
+# last pass uses the configured azimuth step at full resolution.
+ANALYSIS_PASSES = ((4.0, 4), (1.0, 2), (None, 1))
+# Most recently used surface models and horizon sessions kept in memory.
+SURFACE_KEEP = int(os.environ.get("SURFACE_KEEP", 8))
+SESSION_KEEP = int(os.environ.get("SESSION_KEEP", 64))
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+# Surface models shared by every browser session, keyed by (bbox, decimation,
+# excluded buildings), plus the OSM buildings under (bbox, "buildings").
+_surfaces: OrderedDict[tuple, Any] = OrderedDict()
+# Terrain-only horizon sessions per viewpoint and surface, each with the lock
+# its house edits run under.
+_sessions: OrderedDict[tuple, tuple[AnalysisSession, threading.Lock]] = OrderedDict()
+# Guards the dicts only; each entry is built under its own lock, so a slow
+# fetch or build does not hold up jobs that need another entry.
+_surfaces_lock = threading.Lock()
+_surface_locks: dict[tuple, threading.Lock] = {}
 
 def _ensure_event_loop():
     try:
@@ -37,29 +67,16 @@ _ensure_event_loop()
 def create_plotter(cfg: Config):
     bbox_data = _bbox_from_config(cfg)
     
-    dtm, transform = fetch_dtm_raster(bbox_data, cfg.dtm_resolution)
-    [viewpoint_terrain_z] = fetch_point_elevation([cfg.viewpoint], cfg.koordsys)
-    eye_z = viewpoint_terrain_z + cfg.eye_height
-    viewpoint_xyz = (cfg.viewpoint[0], cfg.viewpoint[1], eye_z)
+    bundle = _ensure_event_loop().run_until_complete(load_bundle(cfg, bbox_data))
     
-    terrain_mesh = build_terrain_mesh(dtm, transform)
-    terrain_poly = terrain_mesh.extract_surface().triangulate().decimate(0.5)
-    house_mesh = build_house_mesh(
-        cfg.house_polygon, cfg.house_base_elevation, cfg.house_height
-    )
-    buildings = fetch_osm_buildings(bbox_data)
-    roads = fetch_osm_roads(bbox_data)
-    osm_buildings_mesh = build_osm_buildings_mesh(buildings, dtm, transform)
-    osm_roads_mesh = build_osm_roads_mesh(roads, dtm, transform)
+    with instrument.stage("terrain_tiles"):
+        tiles = TerrainTileTree(bundle.dtm, bundle.transform, bbox_data, max_error=cfg.terrain_max_error)
+        instrument.note(max_level=tiles.max_level)
+    house_mesh = bundle.house_mesh
+    osm_buildings_mesh = bundle.buildings_mesh
+    osm_roads_mesh = bundle.roads_mesh
     
     pl = pv.Plotter()
-    pl.add_mesh(
-        terrain_poly,
-        scalars=terrain_poly.points[:, 2],
-        cmap="terrain",
-        show_scalar_bar=True,
-        name="terrain"
-    )
     if osm_buildings_mesh is not None:
         pl.add_mesh(osm_buildings_mesh, color="gray", opacity=0.8, name="osm_buildings")
     if osm_roads_mesh is not None:
@@ -74,8 +91,178 @@ def create_plotter(cfg: Config):
     pl.camera.focal_point = (vx, vy, vz)
     pl.camera.up = (0, 0, 1)
     pl.enable_terrain_style(mouse_wheel_zooms=True, shift_pans=True)
+    update_terrain_tiles(pl, tiles, pl.camera.position)
     
-    return pl
+    return pl, tiles, bundle
+
+
+def _shared(cache: OrderedDict, keep: int, key: tuple, build) -> Any:
+    """Return ``cache[key]``, calling ``build`` once under the key's own lock if missing.
+
+    Only the ``keep`` most recently used entries stay in ``cache``; jobs still
+    holding an evicted value keep using it.
+    """
+    lock_key = (id(cache), key)
+    with _surfaces_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        lock = _surface_locks.setdefault(lock_key, threading.Lock())
+    with lock:
+        with _surfaces_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with _surfaces_lock:
+            cache[key] = value
+            while len(cache) > keep:
+                cache.popitem(last=False)
+            _surface_locks.pop(lock_key, None)
+        return value
+
+
+def _excluded_buildings(
+    bbox: tuple[float, float, float, float], viewpoint_xy: tuple[float, float]
+) -> tuple[list[dict], tuple[int, ...]]:
+    buildings = _shared(_surfaces, SURFACE_KEEP, (bbox, "buildings"), lambda: fetch_osm_buildings(bbox))
+    return buildings, tuple(np.flatnonzero(buildings_containing(buildings, viewpoint_xy)).tolist())
+
+
+def _analysis_surface(
+    bundle: SceneBundle, bbox: tuple[float, float, float, float], factor: int, viewpoint_xy: tuple[float, float]
+) -> tuple[np.ndarray, Affine, list[np.ndarray]]:
+    """DSM (without the house), transform and max pyramid at 1/``factor`` resolution.
+
+    Buildings containing ``viewpoint_xy`` are left out of the DSM. Built once
+    per process on first use and then shared, so later jobs and other
+    sessions start warm; viewpoints outside every building share one DSM.
+    """
+    buildings, excluded = _excluded_buildings(bbox, viewpoint_xy)
+
+    def build() -> tuple[np.ndarray, Affine, list[np.ndarray]]:
+        # Coarse pixel centres must land on the centres of the sampled pixels.
+        shift = -(factor - 1) / 2
+        transform = bundle.transform * Affine.translation(shift, shift) * Affine.scale(factor)
+        dsm = SurfaceModel(bundle.dtm[::factor, ::factor], transform, buildings, exclude_xy=viewpoint_xy).dsm
+        return dsm, transform, build_max_pyramid(dsm)
+
+    return _shared(_surfaces, SURFACE_KEEP, (bbox, factor, excluded), build)
+
+
+def _analysis_session(
+    bundle: SceneBundle,
+    cfg: Config,
+    bbox: tuple[float, float, float, float],
+    factor: int,
+) -> tuple[AnalysisSession, threading.Lock]:
+    """Terrain-only horizon session of ``cfg``'s viewpoint on the 1/``factor`` surface.
+
+    Shared like the surfaces, so a house edit at the same viewpoint only
+    updates the azimuths crossing the old or the new footprint.
+    """
+    vx, vy = cfg.viewpoint
+    eye = (vx, vy, sample_terrain(bundle.dtm, bundle.transform, vx, vy) + cfg.eye_height)
+    _, excluded = _excluded_buildings(bbox, cfg.viewpoint)
+
+    def build() -> tuple[AnalysisSession, threading.Lock]:
+        dsm, transform, pyramid = _analysis_surface(bundle, bbox, factor, cfg.viewpoint)
+        return horizon_session(dsm, transform, eye, cfg, pyramid), threading.Lock()
+
+    key = (bbox, factor, excluded, eye, cfg.azimuth_step, cfg.analysis_radius)
+    return _shared(_sessions, SESSION_KEEP, key, build)
+
+
+def _analysis_pass(
+    bundle: SceneBundle,
+    cfg: Config,
+    bbox: tuple[float, float, float, float],
+    azimuth_step: float,
+    factor: int,
+) -> dict:
+    with instrument.stage("analysis_pass", azimuth_step=azimuth_step, factor=factor):
+        try:
+            pass_cfg = dataclasses.replace(cfg, azimuth_step=azimuth_step, azimuth_tolerance=None)
+            session, lock = _analysis_session(bundle, pass_cfg, bbox, factor)
+            with lock:
+                return house_results(session, pass_cfg)
+        except Exception as exc:
+            instrument.note(error=repr(exc))
+            raise
+
+
+async def run_analysis(
+    bundle: SceneBundle,
+    cfg: Config,
+    bbox: tuple[float, float, float, float],
+    publish,
+    fail,
+) -> None:
+    """Analyse ``cfg`` on the background executor, calling ``publish`` after each pass.
+
+    Passes go from coarse (few azimuths, decimated DTM) to the configured
+    resolution, so the client sees a first answer quickly. Cancelling the
+    task drops the remaining passes; a pass already running finishes on its
+    worker thread but is never published. A pass that raises stops the
+    analysis and is reported with ``fail(exc)``.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        for i, (step, factor) in enumerate(ANALYSIS_PASSES):
+            result = await loop.run_in_executor(
+                _executor, _analysis_pass, bundle, cfg, bbox, step or cfg.azimuth_step, factor
+            )
+            publish(result, final=i == len(ANALYSIS_PASSES) - 1)
+    except Exception as exc:
+        # Cancellation is not an Exception and still propagates; anything else
+        # would otherwise end the task silently.
+        traceback.print_exc()
+        fail(exc)
+
+
+def update_terrain_tiles(pl: pv.Plotter, tiles: TerrainTileTree, camera_position) -> bool:
+    """Swap the terrain tiles shown in ``pl`` for those ``tiles`` selects at ``camera_position``.
+
+    Returns whether anything changed, i.e. whether the client needs an update.
+    """
+    with instrument.stage("tile_update"):
+        shown = {name for name in pl.actors if name.startswith("terrain_")}
+        wanted = {f"terrain_{level}_{tx}_{ty}": (level, tx, ty) for level, tx, ty in tiles.select(camera_position)}
+        removed = shown - wanted.keys()
+        for name in removed:
+            pl.remove_actor(name, render=False)
+        added = 0
+        for name in wanted.keys() - shown:
+            mesh = tiles.tile_mesh(wanted[name])
+            # Tiles entirely in no-data have no mesh.
+            if mesh is None:
+                continue
+            pl.add_mesh(
+                mesh,
+                scalars="elevation",
+                cmap="terrain",
+                clim=tiles.z_range,
+                show_scalar_bar=False,
+                name=name,
+                render=False,
+            )
+            added += 1
+        instrument.note(shown=len(wanted), added=added)
+    return bool(removed) or added > 0
+
+
+def _metrics_rows() -> list[dict]:
+    """Latest record per stage, formatted for the debug panel."""
+    latest = {r["stage"]: r for r in instrument.records()}
+    return [
+        {
+            "stage": r["stage"],
+            "seconds": f"{r['seconds']:.3f}",
+            "download": f"{r['downloaded_mb']:.2f} MB",
+            "rss": "-" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f} MB",
+        }
+        for r in latest.values()
+    ]
 
 
 def _bbox_from_config(cfg: Config) -> tuple[float, float, float, float]:
@@ -99,19 +286,121 @@ def main():
     state.trame__title = "Tranøy Map 3D Viewer"
     
     print("Loading terrain data...")
-    pl = create_plotter(cfg)
+    pl, tiles, bundle = create_plotter(cfg)
+    bbox = _bbox_from_config(cfg)
+
+    state.show_metrics = False
+    state.metrics_rows = _metrics_rows()
+    state.house_height = cfg.house_height
+    state.viewpoint_x = cfg.viewpoint[0]
+    state.viewpoint_y = cfg.viewpoint[1]
+    state.analysis_status = ""
+    state.analysis_lines = []
+    analysis: asyncio.Task | None = None
+
+    def publish(result, final):
+        obst, sun = result["obstruction"], result["sun"]
+        with state:
+            n = len(result["profile_without"])
+            state.analysis_status = f"{n} azimuths" + ("" if final else ", refining...")
+            state.analysis_lines = [
+                f"Max horizon angle increase: {obst['max_delta_deg']:.2f}°",
+                f"Mean horizon angle increase: {obst['mean_delta_deg']:.2f}°",
+                f"Blocked solid angle: {obst['blocked_solid_angle_sr']:.6f} sr",
+                f"Direct sun lost in {result['year']}: {sun['lost_hours']:.1f} h",
+            ]
+            if instrument.ENABLED:
+                state.metrics_rows = _metrics_rows()
+
+    def fail(exc):
+        with state:
+            state.analysis_status = f"Analysis failed: {exc}"
+            state.analysis_lines = []
+            if instrument.ENABLED:
+                state.metrics_rows = _metrics_rows()
+
+    def start_analysis(**kwargs):
+        nonlocal analysis
+        try:
+            height = float(state.house_height)
+            vx = min(max(float(state.viewpoint_x), bbox[0]), bbox[2])
+            vy = min(max(float(state.viewpoint_y), bbox[1]), bbox[3])
+        except (TypeError, ValueError):
+            return
+        # Stale passes are dropped; queued executor work is cancelled with them.
+        if analysis is not None:
+            analysis.cancel()
+        scenario = dataclasses.replace(cfg, house_height=height, viewpoint=(vx, vy))
+        house = build_house_mesh(scenario.house_polygon, scenario.house_base_elevation, height)
+        if house is not None:
+            pl.add_mesh(house, color="tan", opacity=0.9, name="house", render=False)
+        eye_z = sample_terrain(bundle.dtm, bundle.transform, vx, vy) + cfg.eye_height
+        pl.add_mesh(pv.Sphere(radius=1, center=(vx, vy, eye_z)), color="blue", name="eye", render=False)
+        ctrl.view_update()
+        state.analysis_status = "Analysing..."
+        analysis = _ensure_event_loop().create_task(run_analysis(bundle, scenario, bbox, publish, fail))
+
+    state.change("house_height", "viewpoint_x", "viewpoint_y")(start_analysis)
+    ctrl.on_server_ready.add(start_analysis)
+
+    def on_camera_end(position):
+        if update_terrain_tiles(pl, tiles, tuple(position)):
+            ctrl.view_update()
+        if instrument.ENABLED:
+            state.metrics_rows = _metrics_rows()
     
     with SinglePageLayout(server) as layout:
         layout.title.set_text("Tranøy Map 3D Viewer")
         
         with layout.toolbar:
             vuetify3.VSpacer()
+            if instrument.ENABLED:
+                vuetify3.VBtn("Metrics", click="show_metrics = !show_metrics")
             vuetify3.VBtn("Reset Camera", click=ctrl.view_reset_camera)
         
+        if instrument.ENABLED:
+            with vuetify3.VNavigationDrawer(v_model=("show_metrics",), location="right", width=420):
+                vuetify3.VDataTable(
+                    headers=(
+                        "metrics_headers",
+                        [
+                            {"title": "Stage", "key": "stage"},
+                            {"title": "Seconds", "key": "seconds"},
+                            {"title": "Download", "key": "download"},
+                            {"title": "Peak RSS", "key": "rss"},
+                        ],
+                    ),
+                    items=("metrics_rows",),
+                    density="compact",
+                    items_per_page=-1,
+                )
+
+        with vuetify3.VNavigationDrawer(location="left", width=300, permanent=True):
+            with vuetify3.VContainer():
+                vuetify3.VSlider(
+                    v_model=("house_height",),
+                    label="House height (m)",
+                    min=1,
+                    max=20,
+                    step=0.5,
+                    thumb_label=True,
+                )
+                vuetify3.VTextField(v_model=("viewpoint_x",), label="Viewpoint easting", type="number", density="compact")
+                vuetify3.VTextField(v_model=("viewpoint_y",), label="Viewpoint northing", type="number", density="compact")
+                html.Div("{{ analysis_status }}", classes="text-caption mb-2")
+                html.Div("{{ line }}", v_for="line in analysis_lines", classes="text-body-2")
+
         with layout.content:
             with vuetify3.VContainer(fluid=True, classes="pa-0 fill-height"):
-                view = plotter_ui(pl, mode="client")
+                # Re-select terrain tiles whenever the camera comes to rest.
+                view = plotter_ui(
+                    pl,
+                    mode="client",
+                    interactor_events=("events", ["EndAnimation"]),
+                    EndAnimation=(on_camera_end, "[$event.pokedRenderer.getActiveCamera().getPosition()]"),
+                )
                 ctrl.view_reset_camera = view.reset_camera
+                ctrl.view_update = view.update
     
     server.start(
         port=7860,
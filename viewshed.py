@@ -0,0 +1,306 @@
+import argparse
+import math
+from collections.abc import Iterator
+from functools import partial
+from typing import Any
+
+import numpy as np
+import rasterio
+import scipy.ndimage
+from rasterio.features import geometry_mask
+from rasterio.transform import Affine
+from shapely.geometry import Polygon
+
+from batch import map_shared
+from config import Config, tranoy_example
+from dsm import SurfaceModel
+from dtm import fetch_dtm_raster
+from horizon import sample_terrain_many
+from osm import fetch_osm_buildings
+
+def _region_window(
+    transform: Affine,
+    shape: tuple[int, int],
+    bbox: tuple[float, float, float, float],
+) -> tuple[int, int, int, int]:
+    xmin, ymin, xmax, ymax = bbox
+    cols, rows = ~transform * (np.array([xmin, xmax, xmin, xmax]), np.array([ymin, ymin, ymax, ymax]))
+    r0 = min(max(math.floor(rows.min()), 0), shape[0])
+    r1 = min(max(math.ceil(rows.max()), 0), shape[0])
+    c0 = min(max(math.floor(cols.min()), 0), shape[1])
+    c1 = min(max(math.ceil(cols.max()), 0), shape[1])
+    return r0, r1, c0, c1
+
+
+def _max_slopes(z: np.ndarray, z_obs: np.ndarray, first: int, max_k: int, step: float) -> np.ndarray:
+    # Column first + n of z is observer n; z[:, first + n + k] lies k steps
+    # ahead of it, so one shifted slice per distance serves every observer
+    # on the line at once.
+    n_obs = z_obs.shape[1]
+    best = np.full(z_obs.shape, -np.inf)
+    for k in range(1, max_k + 1):
+        ahead = z[:, first + k : first + k + n_obs]
+        m = ahead.shape[1]
+        if m == 0:
+            break
+        np.fmax(best[:, :m], (ahead - z_obs[:, :m]) / (k * step), out=best[:, :m])
+    return best
+
+
+def _slope_angles(slopes: np.ndarray) -> np.ndarray:
+    angles = np.degrees(np.arctan(slopes))
+    angles[np.isneginf(slopes)] = -90.0
+    return angles
+
+
+class _RotatedFrame:
+    """Sample grid aligned with one azimuth: axis ``i`` runs along the ray
+    direction ``u``, axis ``j`` across it along ``v``."""
+
+    def __init__(
+        self,
+        azimuth: float,
+        cell_xy: tuple[np.ndarray, np.ndarray],
+        step: float,
+        max_k: int,
+    ):
+        az = math.radians(azimuth)
+        self.u = np.array([math.sin(az), math.cos(az)])
+        self.v = np.array([math.cos(az), -math.sin(az)])
+        self.step = step
+        xs, ys = cell_xy
+        a = xs * self.u[0] + ys * self.u[1]
+        b = xs * self.v[0] + ys * self.v[1]
+        self.i0 = math.floor(a.min() / step) - 1
+        self.j0 = math.floor(b.min() / step) - 1
+        self.n_obs = math.ceil(a.max() / step) + 2 - self.i0
+        self.n_j = math.ceil(b.max() / step) + 2 - self.j0
+        self.n_i = self.n_obs + max_k
+
+    def project(self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        i = (xs * self.u[0] + ys * self.u[1]) / self.step - self.i0
+        j = (xs * self.v[0] + ys * self.v[1]) / self.step - self.j0
+        return i, j
+
+    def sample(self, surface: np.ndarray, transform: Affine, rows: np.ndarray) -> np.ndarray:
+        i = (self.i0 + np.arange(self.n_i)) * self.step
+        j = (self.j0 + rows) * self.step
+        xs = np.outer(np.ones_like(j), i * self.u[0]) + (j * self.v[0])[:, None]
+        ys = np.outer(np.ones_like(j), i * self.u[1]) + (j * self.v[1])[:, None]
+        return sample_terrain_many(surface, transform, xs, ys)
+
+
+def _resample(grid: np.ndarray, i: np.ndarray, j: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    return scipy.ndimage.map_coordinates(grid, [j - rows[0], i], order=1, mode="nearest")
+
+
+def _tile_obstruction(
+    without: np.ndarray,
+    with_house: np.ndarray,
+    transform: Affine,
+    window: tuple[int, int, int, int],
+    house_xy: np.ndarray,
+    max_distance: float,
+    azimuth_step: float,
+    eye_height: float,
+    svf_directions: int,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    r0, r1, c0, c1 = window
+    step = math.hypot(transform.a, transform.d)
+    max_k = int(max_distance / step)
+    cols, rows = np.meshgrid(np.arange(c0, c1) + 0.5, np.arange(r0, r1) + 0.5)
+    xs, ys = transform * (cols, rows)
+
+    blocked = np.zeros(xs.shape)
+    svf = None
+    if svf_directions:
+        svf = np.zeros(xs.shape)
+        for azimuth in np.arange(svf_directions) * (360.0 / svf_directions):
+            frame = _RotatedFrame(azimuth, (xs, ys), step, max_k)
+            j_rows = np.arange(frame.n_j)
+            z = frame.sample(without, transform, j_rows)
+            angles = _slope_angles(_max_slopes(z, z[:, : frame.n_obs] + eye_height, 0, max_k, step))
+            i, j = frame.project(xs, ys)
+            svf += np.sin(np.radians(np.maximum(_resample(angles, i, j, j_rows), 0.0)))
+        svf = 1.0 - svf / svf_directions
+
+    gap_x = max(house_xy[:, 0].min() - xs.max(), xs.min() - house_xy[:, 0].max(), 0.0)
+    gap_y = max(house_xy[:, 1].min() - ys.max(), ys.min() - house_xy[:, 1].max(), 0.0)
+    azimuths = np.arange(0, 360, azimuth_step) if math.hypot(gap_x, gap_y) <= max_distance + step else []
+
+    # Only lines that cross the house footprint can be obstructed by it, and
+    # only observers at most max_distance in front of it along the line.
+    for azimuth in azimuths:
+        frame = _RotatedFrame(azimuth, (xs, ys), step, max_k)
+        hi, hj = frame.project(house_xy[:, 0], house_xy[:, 1])
+        j_lo = max(math.floor(hj.min()) - 1, 0)
+        j_hi = min(math.ceil(hj.max()) + 2, frame.n_j)
+        c_lo = max(math.floor(hi.min()) - 1, 0)
+        c_hi = min(math.ceil(hi.max()) + 2, frame.n_i)
+        i_lo = max(c_lo - max_k, 0)
+        i_hi = min(c_hi, frame.n_obs)
+        if j_lo >= j_hi or i_lo >= i_hi:
+            continue
+        j_rows = np.arange(j_lo, j_hi)
+        z_without = frame.sample(without, transform, j_rows)
+        z_with = frame.sample(with_house, transform, j_rows)
+        z_obs = z_without[:, i_lo:i_hi] + eye_height
+        slopes_without = _max_slopes(z_without, z_obs, i_lo, max_k, step)
+        # The house only raises the surface, so the horizon with it is the
+        # terrain horizon or a slope to one of the house columns.
+        slopes_with = slopes_without.copy()
+        observers = np.arange(i_lo, i_hi)
+        for c in range(c_lo, c_hi):
+            k = c - observers
+            valid = (k >= 1) & (k <= max_k)
+            if np.any(valid):
+                house_slopes = (z_with[:, c, None] - z_obs[:, valid]) / (k[valid] * step)
+                np.fmax(slopes_with[:, valid], house_slopes, out=house_slopes)
+                slopes_with[:, valid] = house_slopes
+        delta = np.zeros((len(j_rows), frame.n_obs))
+        delta[:, i_lo:i_hi] = np.maximum(0.0, _slope_angles(slopes_with) - _slope_angles(slopes_without))
+        i, j = frame.project(xs, ys)
+        inside = (j >= j_lo) & (j <= j_hi - 1) & (i >= i_lo - 1) & (i <= i_hi)
+        if np.any(inside):
+            blocked[inside] += _resample(delta, i[inside], j[inside], j_rows)
+    blocked *= (np.pi / 180) ** 2 * azimuth_step
+    return blocked, svf
+
+
+def _tile_context(without: np.ndarray, with_house: np.ndarray, args: dict[str, Any]) -> dict[str, Any]:
+    return dict(args, without=without, with_house=with_house)
+
+
+def _tile_task(
+    context: dict[str, Any], window: tuple[int, int, int, int]
+) -> tuple[tuple[int, int, int, int], np.ndarray, np.ndarray | None]:
+    return (window, *_tile_obstruction(window=window, **context))
+
+
+def _tiles(window: tuple[int, int, int, int], tile_size: int) -> Iterator[tuple[int, int, int, int]]:
+    r0, r1, c0, c1 = window
+    for tr in range(r0, r1, tile_size):
+        for tc in range(c0, c1, tile_size):
+            yield tr, min(tr + tile_size, r1), tc, min(tc + tile_size, c1)
+
+
+def compute_obstruction_grid(
+    surface: SurfaceModel,
+    region_bbox: tuple[float, float, float, float],
+    house_polygon: list[tuple[float, float]],
+    max_distance: float,
+    azimuth_step: float,
+    eye_height: float = 1.6,
+    sky_view_factor: bool = False,
+    svf_directions: int = 32,
+    tile_size: int = 256,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """Blocked solid angle (and optionally sky-view factor) for every cell in a region.
+
+    ``surface.without_house()`` is the scene without the proposed house and
+    ``surface.dsm`` the scene with it. For each azimuth the surface is
+    resampled onto lines along the ray direction, and one shifted slice per
+    distance gives every observer on a line its horizon at once. Tiles of the
+    region run on a process pool that maps both surfaces from shared memory.
+    The blocked solid angle uses the same per-azimuth sum as
+    ``compute_obstruction``; cells inside the house are NaN.
+    """
+    without = np.ascontiguousarray(surface.without_house(), dtype=np.float32)
+    with_house = np.ascontiguousarray(surface.dsm, dtype=np.float32)
+    transform = surface.transform
+    window = _region_window(transform, without.shape, region_bbox)
+    r0, r1, c0, c1 = window
+    blocked = np.full((r1 - r0, c1 - c0), np.nan)
+    svf = np.full((r1 - r0, c1 - c0), np.nan) if sky_view_factor else None
+    args = {
+        "transform": transform,
+        "house_xy": np.asarray(house_polygon, dtype=np.float64)[:, :2],
+        "max_distance": max_distance,
+        "azimuth_step": azimuth_step,
+        "eye_height": eye_height,
+        "svf_directions": svf_directions if sky_view_factor else 0,
+    }
+
+    tiles = list(_tiles(window, tile_size))
+    setup = partial(_tile_context, args=args)
+    for _, result in map_shared(_tile_task, tiles, [without, with_house], setup=setup, max_workers=max_workers):
+        (tr0, tr1, tc0, tc1), tile_blocked, tile_svf = result
+        blocked[tr0 - r0 : tr1 - r0, tc0 - c0 : tc1 - c0] = tile_blocked
+        if svf is not None:
+            svf[tr0 - r0 : tr1 - r0, tc0 - c0 : tc1 - c0] = tile_svf
+
+    region_transform = transform * Affine.translation(c0, r0)
+    house_cells = ~geometry_mask([Polygon(house_polygon)], blocked.shape, region_transform)
+    blocked[house_cells] = np.nan
+    if svf is not None:
+        svf[house_cells] = np.nan
+    return {
+        "blocked_solid_angle_sr": blocked,
+        "sky_view_factor": svf,
+        "transform": region_transform,
+    }
+
+
+def write_obstruction_geotiff(path: str, result: dict[str, Any], crs: int = 25833) -> None:
+    bands = [("blocked_solid_angle_sr", result["blocked_solid_angle_sr"])]
+    if result.get("sky_view_factor") is not None:
+        bands.append(("sky_view_factor", result["sky_view_factor"]))
+    height, width = bands[0][1].shape
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=width,
+        height=height,
+        count=len(bands),
+        dtype="float32",
+        crs=f"EPSG:{crs}",
+        transform=result["transform"],
+        nodata=np.nan,
+        compress="deflate",
+        tiled=True,
+    ) as dst:
+        for band, (name, data) in enumerate(bands, start=1):
+            dst.write(data.astype(np.float32), band)
+            dst.set_band_description(band, name)
+
+
+def run_viewshed(
+    cfg: Config,
+    out_path: str,
+    region_size: float = 2000.0,
+    sky_view_factor: bool = False,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    cx, cy = np.mean(np.asarray(cfg.house_polygon), axis=0)
+    half = region_size / 2
+    region = (cx - half, cy - half, cx + half, cy + half)
+    r = cfg.analysis_radius
+    bbox = (region[0] - r, region[1] - r, region[2] + r, region[3] + r)
+
+    dtm, transform = fetch_dtm_raster(bbox, cfg.dtm_resolution)
+    surface = SurfaceModel(dtm, transform, fetch_osm_buildings(bbox))
+    surface.set_house(cfg.house_polygon, cfg.house_base_elevation, cfg.house_height)
+    result = compute_obstruction_grid(
+        surface,
+        region,
+        cfg.house_polygon,
+        cfg.analysis_radius,
+        cfg.azimuth_step,
+        eye_height=cfg.eye_height,
+        sky_view_factor=sky_view_factor,
+        max_workers=max_workers,
+    )
+    write_obstruction_geotiff(out_path, result, cfg.koordsys)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write per-cell obstruction of the proposed house as a GeoTIFF.")
+    parser.add_argument("output", help="GeoTIFF path to write")
+    parser.add_argument("--region-size", type=float, default=2000.0, help="side of the square region in metres")
+    parser.add_argument("--svf", action="store_true", help="also write a sky-view factor band")
+    parser.add_argument("--workers", type=int, default=None)
+    opts = parser.parse_args()
+    run_viewshed(tranoy_example(), opts.output, opts.region_size, opts.svf, opts.workers)
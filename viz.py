@@ -3,23 +3,68 @@ from typing import Any
 import matplotlib.pyplot as plt
 import numpy as np
 import pyvista as pv
-from rasterio.transform import Affine
+import shapely
 
-from horizon import sample_terrain
+from horizon import sample_terrain_many
+from rtin import rtin_mesh
 
+# Ribbon widths in metres by OSM ``highway`` tag.
+ROAD_WIDTHS = {
+    "motorway": 20.0,
+    "trunk": 12.0,
+    "primary": 10.0,
+    "secondary": 8.0,
+    "tertiary": 7.0,
+    "unclassified": 5.0,
+    "residential": 5.0,
+    "living_street": 5.0,
+    "service": 4.0,
+    "track": 3.0,
+    "cycleway": 2.5,
+    "footway": 2.0,
+    "path": 1.5,
+    "steps": 1.5,
+}
+DEFAULT_ROAD_WIDTH = 4.0
 
-def build_terrain_mesh(dtm: np.ndarray, transform: Any) -> pv.StructuredGrid:
-    rows, cols = dtm.shape
-    col_idx = np.arange(cols, dtype=np.float64)
-    row_idx = np.arange(rows, dtype=np.float64)
-    col_mesh, row_mesh = np.meshgrid(col_idx, row_idx, indexing="xy")
-    if isinstance(transform, Affine):
-        xx = transform.c + transform.a * col_mesh + transform.b * row_mesh
-        yy = transform.f + transform.d * col_mesh + transform.e * row_mesh
-    else:
-        xx, yy = transform * (col_mesh, row_mesh)
-    zz = np.where(np.isnan(dtm), 0.0, dtm).astype(np.float64)
-    return pv.StructuredGrid(xx, yy, zz)
+
+def build_terrain_tin(
+    dtm: np.ndarray,
+    transform: Any,
+    max_error: float = 0.5,
+) -> pv.PolyData | None:
+    """Mesh ``dtm`` as an RTIN within ``max_error`` metres, leaving NaN cells as holes."""
+    vertices, triangles = rtin_mesh(dtm, max_error)
+    if not len(triangles):
+        return None
+    rows, cols = vertices[:, 0].astype(np.float64), vertices[:, 1].astype(np.float64)
+    x = transform.c + transform.a * cols + transform.b * rows
+    y = transform.f + transform.d * cols + transform.e * rows
+    z = np.asarray(dtm)[vertices[:, 0], vertices[:, 1]].astype(np.float64)
+    faces = np.column_stack([np.full(len(triangles), 3), triangles]).ravel()
+    return pv.PolyData(np.column_stack([x, y, z]), faces)
+
+
+def _repair_rings(rings: list[np.ndarray], ids: list[int]) -> tuple[list[np.ndarray], list[int]]:
+    # OSM has self-intersecting footprints (bowties, doubled-back rings) that
+    # the triangulation rejects; split those into their valid polygonal parts,
+    # each keeping the building's id.
+    owner = np.repeat(np.arange(len(rings)), [len(r) for r in rings])
+    polygons = shapely.polygons(shapely.linearrings(np.concatenate(rings), indices=owner))
+    invalid = set(np.flatnonzero(~shapely.is_valid(polygons)).tolist())
+    if not invalid:
+        return rings, ids
+    repaired_rings, repaired_ids = [], []
+    for r, (ring, i) in enumerate(zip(rings, ids)):
+        if r not in invalid:
+            repaired_rings.append(ring)
+            repaired_ids.append(i)
+            continue
+        parts = shapely.get_parts(shapely.get_parts(shapely.make_valid(polygons[r])))
+        for part in parts[(shapely.get_type_id(parts) == 3) & (shapely.area(parts) > 0)]:
+            repaired_rings.append(shapely.get_coordinates(part.exterior)[:-1])
+            repaired_ids.append(i)
+    return repaired_rings, repaired_ids
 
 
 def build_osm_buildings_mesh(
@@ -27,47 +72,151 @@ def build_osm_buildings_mesh(
     dtm: np.ndarray,
     transform: Any,
 ) -> pv.PolyData | None:
-    if not buildings:
-        return None
-    meshes = []
-    for b in buildings:
-        poly = b["polygon"]
+    rings = []
+    ids = []
+    for i, b in enumerate(buildings):
+        poly = np.asarray(b["polygon"], dtype=np.float64)[:, :2]
         if len(poly) < 3:
             continue
-        cx = sum(p[0] for p in poly) / len(poly)
-        cy = sum(p[1] for p in poly) / len(poly)
-        base_z = sample_terrain(dtm, transform, cx, cy)
-        if np.isnan(base_z):
-            base_z = 0.0
-        mesh = build_house_mesh(poly, base_z, b["height"])
-        meshes.append(mesh)
-    return pv.merge(meshes) if meshes else None
+        if np.array_equal(poly[0], poly[-1]):
+            poly = poly[:-1]
+        if len(poly) < 3:
+            continue
+        rings.append(poly)
+        ids.append(i)
+    if rings:
+        rings, ids = _repair_rings(rings, ids)
+    if not rings:
+        return None
+    heights = [buildings[i]["height"] for i in ids]
+
+    # Flat ring vertex arrays: ring r owns coords[offsets[r]:offsets[r + 1]].
+    counts = np.array([len(r) for r in rings])
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    coords = np.concatenate(rings)
+    owner = np.repeat(np.arange(len(rings)), counts)
+    centroids = np.array([r.mean(axis=0) for r in rings])
+    base = sample_terrain_many(dtm, transform, centroids[:, 0], centroids[:, 1])
+    base = np.where(np.isnan(base), 0.0, base)
+    top = base + np.array(heights, dtype=np.float64)
+    building_id = np.array(ids)
+
+    n = len(coords)
+    points = [
+        np.column_stack([coords, base[owner]]),
+        np.column_stack([coords, top[owner]]),
+    ]
+    idx = np.arange(n)
+    nxt = idx + 1
+    nxt[offsets[1:] - 1] = offsets[:-1]
+    # Wind every wall outwards: swap the edge ends on clockwise rings.
+    cross = coords[:, 0] * coords[nxt, 1] - coords[nxt, 0] * coords[:, 1]
+    clockwise = (np.add.reduceat(cross, offsets[:-1]) < 0)[owner]
+    a = np.where(clockwise, nxt, idx)
+    b = np.where(clockwise, idx, nxt)
+    walls = np.column_stack([np.full(n, 4), a, b, b + n, a + n])
+    faces = [walls.ravel()]
+    cell_ids = [building_id[owner]]
+
+    triangles = shapely.constrained_delaunay_triangles(
+        shapely.polygons(shapely.linearrings(coords, indices=owner))
+    )
+    parts, part_owner = shapely.get_parts(triangles, return_index=True)
+    if len(parts):
+        tri = shapely.get_coordinates(parts).reshape(-1, 4, 2)[:, :3]
+        # Roofs face up (counter-clockwise), floors face down (clockwise).
+        d1 = tri[:, 1] - tri[:, 0]
+        d2 = tri[:, 2] - tri[:, 0]
+        ccw = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0] > 0
+        tri[~ccw] = tri[~ccw][:, ::-1]
+        tri_xy = tri.reshape(-1, 2)
+        tri_owner = np.repeat(part_owner, 3)
+        n_tri = len(parts)
+        for z, order in ((base, [2, 1, 0]), (top, [0, 1, 2])):
+            start = sum(len(p) for p in points)
+            points.append(np.column_stack([tri_xy, z[tri_owner]]))
+            conn = start + np.arange(3 * n_tri).reshape(-1, 3)[:, order]
+            faces.append(np.column_stack([np.full(n_tri, 3), conn]).ravel())
+            cell_ids.append(building_id[part_owner])
+
+    mesh = pv.PolyData(np.concatenate(points), np.concatenate(faces))
+    mesh.cell_data["building_id"] = np.concatenate(cell_ids)
+    return mesh
 
 
 def build_osm_roads_mesh(
     roads: list[dict],
     dtm: np.ndarray,
     transform: Any,
-    tube_radius: float = 1.0,
     height_offset: float = 0.5,
+    simplify_tolerance: float = 0.0,
+    widths: dict[str, float] | None = None,
 ) -> pv.PolyData | None:
-    if not roads:
+    """Drape every road onto the terrain as one flat ribbon mesh.
+
+    Ribbon width comes from the ``highway`` tag via ``widths`` (default
+    ``ROAD_WIDTHS``). A positive ``simplify_tolerance`` (metres) thins the
+    centrelines first, which is the level-of-detail knob for the web viewer.
+    """
+    widths = ROAD_WIDTHS if widths is None else widths
+    lines = [np.asarray(r["coords"], dtype=np.float64)[:, :2] for r in roads if len(r["coords"]) >= 2]
+    if not lines:
         return None
-    meshes = []
-    for r in roads:
-        coords = r["coords"]
-        if len(coords) < 2:
-            continue
-        pts = []
-        for x, y in coords:
-            z = sample_terrain(dtm, transform, x, y)
-            z = height_offset if np.isnan(z) else z + height_offset
-            pts.append([x, y, z])
-        arr = np.array(pts, dtype=np.float64)
-        line = pv.lines_from_points(arr)
-        tube = line.tube(radius=tube_radius, n_sides=6)
-        meshes.append(tube)
-    return pv.merge(meshes) if meshes else None
+    road_ids = np.array([i for i, r in enumerate(roads) if len(r["coords"]) >= 2])
+    counts = np.array([len(line) for line in lines])
+    coords = np.concatenate(lines)
+    owner = np.repeat(np.arange(len(lines)), counts)
+    if simplify_tolerance > 0:
+        simplified = shapely.simplify(shapely.linestrings(coords, indices=owner), simplify_tolerance)
+        coords, owner = shapely.get_coordinates(simplified, return_index=True)
+
+    # Drop repeated vertices so every remaining segment has a direction.
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = (owner[1:] != owner[:-1]) | np.any(coords[1:] != coords[:-1], axis=1)
+    coords, owner = coords[keep], owner[keep]
+    counts = np.bincount(owner, minlength=len(lines))
+    keep = counts[owner] >= 2
+    coords, owner = coords[keep], owner[keep]
+    if not len(coords):
+        return None
+
+    first = np.ones(len(coords), dtype=bool)
+    first[1:] = owner[1:] != owner[:-1]
+    last = np.roll(first, -1)
+    seg = np.diff(coords, axis=0)
+    seg /= np.maximum(np.linalg.norm(seg, axis=1), 1e-12)[:, None]
+    # Per vertex: unit direction of the incoming and outgoing segment, using
+    # the single neighbouring segment at road ends.
+    incoming = np.vstack([seg[:1], seg])
+    outgoing = np.vstack([seg, seg[-1:]])
+    incoming[first] = outgoing[first]
+    outgoing[last] = incoming[last]
+    tangent = incoming + outgoing
+    norm = np.linalg.norm(tangent, axis=1)
+    # A full U-turn has no tangent; fall back to the incoming direction.
+    tangent = np.where(norm[:, None] > 1e-9, tangent / np.maximum(norm, 1e-9)[:, None], incoming)
+    # Miter join: widen at bends so the ribbon keeps its width, capped at 2x.
+    miter = 1.0 / np.maximum(np.sum(tangent * outgoing, axis=1), 0.5)
+    left = np.column_stack([-tangent[:, 1], tangent[:, 0]])
+
+    highway = [roads[i].get("highway", "unknown") for i in road_ids]
+    half_width = 0.5 * np.array([widths.get(h, DEFAULT_ROAD_WIDTH) for h in highway])[owner]
+    z = sample_terrain_many(dtm, transform, coords[:, 0], coords[:, 1])
+    z = np.where(np.isnan(z), 0.0, z) + height_offset
+    offset = left * (half_width * miter)[:, None]
+    n = len(coords)
+    points = np.vstack(
+        [
+            np.column_stack([coords + offset, z]),
+            np.column_stack([coords - offset, z]),
+        ]
+    )
+
+    i = np.flatnonzero(~last)
+    faces = np.column_stack([np.full(len(i), 4), i, i + n, i + 1 + n, i + 1])
+    mesh = pv.PolyData(points, faces.ravel())
+    mesh.cell_data["road_id"] = road_ids[owner[i]]
+    return mesh
 
 
 def build_house_mesh(
@@ -84,14 +233,15 @@ def build_house_mesh(
 
 
 def show_3d_scene(
-    terrain_mesh: pv.StructuredGrid,
+    terrain_mesh: pv.DataSet | None,
     house_mesh: pv.PolyData | None,
     center_xyz: tuple[float, float, float],
     osm_buildings_mesh: pv.PolyData | None = None,
     osm_roads_mesh: pv.PolyData | None = None,
 ) -> None:
     pl = pv.Plotter()
-    pl.add_mesh(terrain_mesh, scalars=terrain_mesh.points[:, 2], cmap="terrain", show_scalar_bar=True)
+    if terrain_mesh is not None:
+        pl.add_mesh(terrain_mesh, scalars=terrain_mesh.points[:, 2], cmap="terrain", show_scalar_bar=True)
     if osm_buildings_mesh is not None:
         pl.add_mesh(osm_buildings_mesh, color="gray", opacity=0.8)
     if osm_roads_mesh is not None: